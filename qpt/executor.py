@@ -4,33 +4,121 @@
 # Please indicate the source for reprinting.
 
 import os
+import gc
 import sys
+import json
+import runpy
 import shutil
 import base64
+import codecs
+import hashlib
 import datetime
 import tempfile
+import traceback
+import threading
+import subprocess
+from collections import deque
 
 from typing import List
 
 import qpt
 from qpt.memory import QPT_MEMORY
 from qpt.version import version as qpt_v
-from qpt.modules.base import SubModule
-from qpt.modules.python_env import BasePythonEnv, AutoPythonEnv
+from qpt.modules.base import SubModule, DEFAULT_PACK_LIMITS, PACK_RESOURCE_DISK, ARTIFACT_RESOURCES, \
+    ARTIFACT_SITE_PACKAGES, ARTIFACT_PARENTS, ARTIFACT_PYTHON, ARTIFACT_PACKAGES, ARTIFACT_CUDA, \
+    ARTIFACT_RELATIVE_PATHS
+from qpt.modules.python_env import BasePythonEnv, AutoPythonEnv, PythonEnvVolume, make_online_release, \
+    PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST, PYTHON_ENV_MODE_ONLINE_INSTALLATION, PYTHON_VOLUME_RELATIVE_PATH, \
+    ONLINE_RELATIVE_PATH
 from qpt.modules.package import QPTDependencyPackage, QPTGUIDependencyPackage, \
     DEFAULT_DEPLOY_MODE, \
     set_default_deploy_mode, BatchInstallation
 from qpt.modules.auto_requirements import AutoRequirementsPackage
+from qpt.modules.site_zip import ZipPurePackages
+from qpt.modules.bytecode import CompileBytecode
+from qpt.modules.trim import TrimPackages, TRIM_NONE
 
-from qpt.kernel.qlog import Logging, TProgressBar, set_logger_file
-from qpt.kernel.qos import clean_qpt_cache, copytree, check_warning_char, StdOutLoggerWrapper, warning_msg_box
-from qpt.kernel.qterminal import PTerminal, RunTerminalCallback
+from qpt.kernel.qlog import Logging, TProgressBar, set_logger_file, clean_old_logs
+from qpt.kernel.qos import clean_qpt_cache, copytree, check_warning_char, StdOutLoggerWrapper, warning_msg_box, \
+    rmtree_background, clean_trash_dirs, set_default_incremental_copy
+from qpt.kernel.qignore import get_default_matcher, QPT_IGNORE_FILE
+from qpt.kernel.qzip import get_site_zip_paths
+from qpt.kernel.qboot import make_boot, load_boot, load_configs, apply_boot_env, BOOT_FILE_NAME, \
+    LEGACY_CONFIG_FILE_NAME
+from qpt.kernel.qmanifest import make_manifest, verify_manifest, MANIFEST_FILE_NAME, \
+    VERIFY_NONE, VERIFY_QUICK, VERIFY_FULL, MISMATCH_MISSING, MISMATCH_SIZE
+from qpt.kernel.qimport import shake_site_packages, IMPORT_TRACE_ENV, IMPORT_TRACE_SCRIPT_ENV, SHAKE_REPORT_NAME
+from qpt.kernel.qterminal import PTerminal
+from qpt.kernel.qdag import DAGNode, run_dag, DEFAULT_DAG_WORKERS
+from qpt.kernel.qtrace import span, instant, enable_trace, dump_trace, TRACE_ENV
+from qpt.kernel.qevent import phase, set_event_output
+from qpt.kernel.qcache import ActionCache, RemoteCache, set_default_action_cache, get_opt_key, REMOTE_CACHE_ENV
+from qpt.kernel.qpreload import make_preload_profile, load_preload_profile, start_readahead, \
+    start_preload_imports, PRELOAD_FILE_NAME
 from qpt.smart_opt import set_default_pip_lib
 from qpt.memory import QPT_MODE, check_all, get_env_vars, CheckRun
 from qpt.kernel.qpe import make_icon
 from qpt.gui.tk_progressbar import get_func_bind_progressbar
 
-__all__ = ["CreateExecutableModule", "RunExecutableModule"]
+__all__ = ["CreateExecutableModule", "RunExecutableModule", "LAUNCH_MODE_SUBPROCESS", "LAUNCH_MODE_INPROCESS"]
+
+# Debug目录的生成方式
+DEBUG_OUTPUT_COPY = "copy"  # 完整复制Release目录
+DEBUG_OUTPUT_HARDLINK = "hardlink"  # 使用硬链接复用Release目录中的文件，仅启动器与配置文件为独立副本，不支持时自动退化为复制
+
+# Release目录下由启动器相关流程生成的文件
+RELEASE_LAUNCHER_FILES = ["启动程序.exe", "使用兼容模式运行.cmd", "Main.exe", "compatibility_mode.cmd"]
+
+# Debug目录中由compatibility_mode.cmd重命名得到的文件
+DEBUG_COMPATIBILITY_MODE_FILE = "使用兼容模式运行.cmd"
+
+# 增量模式下记录全部Pack OP的指纹，依赖发生变化时重新生成Python环境与依赖包目录
+PACK_STATE_NAME = "pack_state.json"
+PACK_STATE_ARTIFACTS = [ARTIFACT_PYTHON, ARTIFACT_PACKAGES, ARTIFACT_CUDA]
+
+# 首次成功运行后生成的就绪标记，与当前完整性清单一致时跳过终端创建与OP加载，直接启动主程序
+READY_STAMP_NAME = "ready.stamp"
+# 主程序异常退出时日志中保留的最后输出行数
+APP_OUTPUT_CACHE_LINES = 200
+# 转发主程序输出时单次读取的最大字节数
+APP_OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# 主程序的启动方式，运行时可通过环境变量QPT_LAUNCH_MODE临时指定
+LAUNCH_MODE_SUBPROCESS = "subprocess"  # 在新的Python进程中执行主程序
+LAUNCH_MODE_INPROCESS = "inprocess"  # 卸载QPT的部署模块后使用runpy在当前进程中执行主程序，减少启动耗时与内存占用
+# 进程内启动前需卸载的模块，仅在首次部署时使用
+INPROCESS_UNLOAD_MODULES = ["qpt.modules", "qpt.gui", "qpt.smart_opt", "qpt.kernel.qinterpreter", "qpt.kernel.qcode",
+                            "qpt.kernel.qfetch", "qpt.kernel.qdag", "qpt.kernel.qterminal", "pip", "ttkbootstrap",
+                            "tkinter", "setuptools", "pkg_resources", "distutils", "_distutils_hack"]
+
+
+class _PackStep:
+    def __init__(self, name, func, module=None, inputs=None, outputs=None, resources=None, depends=None):
+        """
+        打包依赖图中的步骤
+        :param name: 步骤名
+        :param func: 执行函数，无参数
+        :param module: 所属的Module名
+        :param inputs: 读取的产物标记，与outputs任一为None时视为读写全部产物
+        :param outputs: 写入的产物标记
+        :param resources: 资源标记
+        :param depends: 需先执行完毕的Module名
+        """
+        self.name = name
+        self.func = func
+        self.module = module
+        self.inputs = None
+        self.outputs = None
+        if inputs is not None and outputs is not None:
+            self.inputs = self._expand(inputs)
+            self.outputs = self._expand(outputs)
+        self.resources = list(resources) if resources else list()
+        self.depends = list(depends) if depends else list()
+
+    @staticmethod
+    def _expand(tags):
+        tags = set(tags)
+        return tags | set(ARTIFACT_PARENTS[tag] for tag in tags if tag in ARTIFACT_PARENTS)
 
 
 class CreateExecutableModule:
@@ -45,8 +133,36 @@ class CreateExecutableModule:
                  sub_modules: List[SubModule] = None,
                  interpreter_module: BasePythonEnv = None,
                  hidden_terminal: bool = False,
-                 with_debug: bool = False):
+                 with_debug: bool = False,
+                 incremental: bool = False,
+                 incremental_check_hash: bool = False,
+                 use_gitignore: bool = False,
+                 debug_output_mode=DEBUG_OUTPUT_COPY,
+                 verify_mode=VERIFY_QUICK,
+                 zip_pure_packages: bool = False,
+                 precompile: bool = False,
+                 precompile_sourceless: bool = False,
+                 trim_profile=TRIM_NONE,
+                 tree_shaking: bool = False,
+                 smoke_script=None,
+                 smoke_timeout=600,
+                 tree_shaking_keep: List[str] = None,
+                 online_base_url: str = None,
+                 unpack_workers: int = DEFAULT_DAG_WORKERS,
+                 launch_mode=LAUNCH_MODE_SUBPROCESS,
+                 preload: bool = False,
+                 preload_exclude: List[str] = None,
+                 preload_imports: bool = False,
+                 event_output: str = None,
+                 pack_workers: int = DEFAULT_DAG_WORKERS,
+                 action_cache: bool = None,
+                 remote_cache: str = None):
         self.with_debug = with_debug
+        # 构建事件 - 未设置时使用QPT_BUILD_EVENTS环境变量
+        if event_output:
+            set_event_output(event_output)
+        # 增量模式 - 保留上次生成的Release/Debug目录，仅同步发生变化的文件（大小+修改时间，可选哈希值）
+        self.incremental = incremental
 
         # 初始化路径成员变量
         self.launcher_py_path = os.path.relpath(launcher_py_path, work_dir)
@@ -69,70 +185,98 @@ class CreateExecutableModule:
         self.module_path = os.path.join(save_path, "Release")
         self.debug_path = os.path.join(save_path, "Debug")
         self.interpreter_path = os.path.join(self.module_path, "Python")
-        if ignore_dirs is None:
-            self.ignore_dirs = list()
+        self.ignore_dirs = list(ignore_dirs) if ignore_dirs is not None else list()
+        # 输出目录可能位于待打包目录中，需避免将其复制进resources
+        self.ignore_dirs.append(self.module_path)
+        self.ignore_dirs.append(self.debug_path)
 
         self.icon_path = icon
 
         # 创建基本环境目录
-        if os.path.exists(self.save_path):
+        clean_trash_dirs(self.save_path)
+        set_default_incremental_copy(self.incremental, check_hash=incremental_check_hash)
+        # 动作缓存 - 复用参数与输入文件未发生变化的Pack OP的输出，未设置时与增量模式保持一致
+        # 远程缓存 - 多台机器共享动作缓存，未设置时使用QPT_REMOTE_CACHE环境变量
+        remote_cache = remote_cache if remote_cache else os.getenv(REMOTE_CACHE_ENV)
+        if action_cache is None:
+            action_cache = self.incremental or bool(remote_cache)
+        if action_cache:
+            remote = RemoteCache(remote_cache) if remote_cache else None
+            set_default_action_cache(ActionCache(remote=remote))
+        else:
+            set_default_action_cache(None)
+        if self.incremental:
+            if os.path.exists(self.module_path):
+                Logging.info(f"当前为增量模式，将复用{os.path.abspath(self.module_path)}中未发生变化的文件")
+                self._clean_stale_files()
+        else:
             if os.path.exists(self.module_path):
                 Logging.warning(f"{os.path.abspath(self.module_path)}已存在，已清空该目录")
-                self.ignore_dirs.append(self.module_path)
-                shutil.rmtree(self.module_path)
+                rmtree_background(self.module_path)
             if os.path.exists(self.debug_path):
                 Logging.warning(f"{os.path.abspath(self.debug_path)}已存在，已清空该目录")
-                self.ignore_dirs.append(self.debug_path)
-                shutil.rmtree(self.debug_path)
-        else:
-            os.makedirs(self.save_path, exist_ok=True)
+                rmtree_background(self.debug_path)
 
         # 配置操作参数
         set_default_deploy_mode(deploy_mode)
         set_default_pip_lib(self.interpreter_path)
         self.with_debug = with_debug
         self.hidden_terminal = hidden_terminal
+        assert debug_output_mode in [DEBUG_OUTPUT_COPY, DEBUG_OUTPUT_HARDLINK], \
+            f"debug_output_mode需为DEBUG_OUTPUT_COPY或DEBUG_OUTPUT_HARDLINK，当前为{debug_output_mode}"
+        self.debug_output_mode = debug_output_mode
+        assert verify_mode in [VERIFY_NONE, VERIFY_QUICK, VERIFY_FULL], \
+            f"verify_mode需为VERIFY_NONE、VERIFY_QUICK或VERIFY_FULL，当前为{verify_mode}"
 
         # 新建配置信息
         self.configs = dict()
         self.configs["launcher_py_path"] = self.launcher_py_path
         self.configs["hidden_terminal"] = hidden_terminal
+        self.configs["verify_mode"] = verify_mode
+
+        # 动态裁剪 - 在Debug目录中执行冒烟测试并记录被加载的模块，删除Release中未被使用的子模块与数据文件
+        self.tree_shaking = tree_shaking
+        if smoke_script is not None:
+            smoke_script = os.path.relpath(smoke_script, work_dir)
+            assert os.path.exists(os.path.join(self.work_dir, smoke_script)), \
+                f"请检查{smoke_script}文件是否存在{self.work_dir}目录"
+        self.smoke_script = smoke_script
+        self.smoke_timeout = smoke_timeout
+        self.tree_shaking_keep = tree_shaking_keep
+        # 预加载 - 根据冒烟测试的导入记录，运行时在后台预读模块文件
+        self.preload = preload or preload_imports
+        self.preload_exclude = preload_exclude
+        # 提前导入 - 需单独开启，耗时较长的包会在主程序的顶层代码执行前被导入，
+        # 主程序在导入前设置的环境变量（如CUDA_VISIBLE_DEVICES、FLAGS_*）或matplotlib.use()将不会对其生效
+        self.preload_imports = preload_imports
+        if preload_imports and launch_mode != LAUNCH_MODE_INPROCESS:
+            Logging.warning("preload_imports仅在launch_mode为inprocess时生效")
         self.configs["lazy_module"] = list()
         self.configs["sub_module"] = list()
+        # 运行时的部署依赖，格式{Module名: {"depends": 依赖的Module名列表或None, "resources": 资源标记列表}}
+        self.configs["module_graph"] = dict()
+        self.configs["unpack_workers"] = unpack_workers
+        assert launch_mode in [LAUNCH_MODE_SUBPROCESS, LAUNCH_MODE_INPROCESS], \
+            f"launch_mode需为LAUNCH_MODE_SUBPROCESS或LAUNCH_MODE_INPROCESS，当前为{launch_mode}"
+        self.configs["launch_mode"] = launch_mode
         self.configs["local_uid"] = base64.b64encode((os.path.abspath(sys.executable) + "|" +
                                                       os.path.abspath(qpt.__file__) + "|" +
-                                                      os.path.abspath(self.module_path)).encode('utf-8'))
+                                                      os.path.abspath(self.module_path)).encode('utf-8')).decode("utf-8")
 
         # 额外的成员变量
         self.resources_path = os.path.join(self.module_path, "resources")
         self.config_path = os.path.join(self.module_path, "configs")
-        self.config_file_path = os.path.join(self.config_path, "configs.txt")
-        self.lib_package_path = os.path.join(self.interpreter_path,
-                                             QPT_MEMORY.site_packages_path)
+        self.config_file_path = os.path.join(self.config_path, BOOT_FILE_NAME)
+        # QPT_MEMORY.site_packages_path为当前解释器的绝对路径，不可与Release目录拼接
+        self.lib_package_path = os.path.join(self.interpreter_path, "Lib", "site-packages")
 
         # 设置全局下载的Python包默认解释器版本号 - 更换兼容性方案
         # set_default_package_for_python_version(interpreter_module.python_version)
 
-        # 避免打包虚拟环境等
-        # ToDo 后续用fnmatch来判断
-        venv_dir = "-%NONE-FLAG%-"
-        for root, dirs, files in os.walk(self.work_dir):
-            if "pyvenv.cfg" in files:
-                venv_dir = root
-                self.ignore_dirs.append(root)
-                Logging.warning(f"检测到pyvenv.cfg，推测出{os.path.abspath(root)}为Python虚拟环境主目录，在打包时会忽略该目录")
-                continue
-            if ".github" in dirs:
-                self.ignore_dirs.append(os.path.join(root, ".github"))
-                Logging.warning(f"检测到.github，推测出{os.path.abspath(root)}为.github目录，在打包时会忽略该目录")
-            if ".git" in dirs:
-                self.ignore_dirs.append(os.path.join(root, ".git"))
-                Logging.warning(f"检测到.git，推测出{os.path.abspath(root)}为.git目录，在打包时会忽略该目录")
-            if ".idea" in dirs:
-                self.ignore_dirs.append(os.path.join(root, ".idea"))
-                Logging.warning(f"检测到.idea，推测出{os.path.abspath(root)}为.idea目录，在打包时会忽略该目录")
-            if "__pycache__" in dirs and not (venv_dir in root and root.index(venv_dir) == 0):
-                self.ignore_dirs.append(os.path.join(root, "__pycache__"))
+        # 避免打包虚拟环境等 - 使用gitignore风格的规则，扫描时不会进入被忽略的目录
+        self.ignore_matcher = get_default_matcher(use_gitignore=use_gitignore)
+        if os.path.exists(os.path.join(self.work_dir, QPT_IGNORE_FILE)):
+            Logging.info(f"检测到{QPT_IGNORE_FILE}，在打包时会忽略该文件中所匹配的文件")
 
         # Module相关
         # 初始化解释器Module
@@ -145,9 +289,33 @@ class CreateExecutableModule:
 
         # 放入增强包
         # self.add_sub_module(BatchInstallation())
-        # 放入增强包
+        # 放入增强包 - GUI依赖在部署SubModule时就需要使用，故作为lazy module
         if self.hidden_terminal:
-            self.add_sub_module(QPTGUIDependencyPackage())
+            self.add_sub_module(QPTGUIDependencyPackage(), lazy=True)
+
+        # 裁剪运行时不会被使用的文件
+        if trim_profile != TRIM_NONE:
+            self.add_sub_module(TrimPackages(profile=trim_profile, keep_tkinter=self.hidden_terminal))
+
+        # 将纯Python包压缩为zip以减少文件数量
+        if zip_pure_packages:
+            self.add_sub_module(ZipPurePackages())
+
+        # 预编译字节码
+        if precompile or precompile_sourceless:
+            self.add_sub_module(CompileBytecode(sourceless=precompile_sourceless,
+                                                launcher_py_path=self.launcher_py_path))
+
+        # 压缩Python环境 - 需在全部SubModule执行完毕后压缩，并在用户使用时最先解压
+        self.volume_module = None
+        if getattr(interpreter_module, "mode", None) == PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST:
+            self.volume_module = PythonEnvVolume()
+
+        # 在线模式 - Release中仅保留清单，Python环境与依赖包需上传至online_base_url
+        self.online_base_url = None
+        if getattr(interpreter_module, "mode", None) == PYTHON_ENV_MODE_ONLINE_INSTALLATION:
+            assert online_base_url, "PYTHON_ENV_MODE_ONLINE_INSTALLATION模式下需设置online_base_url"
+            self.online_base_url = online_base_url
 
         # 解析依赖
         if requirements_file == "auto":
@@ -161,6 +329,73 @@ class CreateExecutableModule:
         # 初始化终端 - 占位 待lazy_module执行完毕后生成终端（依赖Qt lazy module）
         # ToDo 此处可能需要发生改动，新版QPT没有依赖lazy module在runtime
         self.terminal = None
+        self._terminal_lock = threading.Lock()
+
+        # 打包调度 - 无依赖关系的Pack OP并行执行的最大数量，设置为1时按优先级依次执行
+        self.pack_workers = pack_workers
+        self._runtime_entries = list()
+
+    def _clean_stale_files(self):
+        """
+        增量模式下清理上次打包生成、且本次会重新生成的文件
+        OP序列化文件与启动器文件数量较少，重新生成即可，同时可避免旧文件被同步至Debug目录
+        """
+        opt_path = os.path.join(self.module_path, "opt")
+        if os.path.exists(opt_path):
+            for root, dirs, files in os.walk(opt_path):
+                for file in files:
+                    if os.path.splitext(file)[-1] in [".op", ".inactive"]:
+                        os.remove(os.path.join(root, file))
+        config_path = os.path.join(self.module_path, "configs")
+        if os.path.exists(config_path):
+            shutil.rmtree(config_path)
+        for file in RELEASE_LAUNCHER_FILES:
+            file_path = os.path.join(self.module_path, file)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def _get_pack_fingerprint(self):
+        """
+        计算全部Pack OP的指纹，OP参数、requirements等输入文件或当前Python环境变化时指纹随之变化
+        输入文件仅比对大小与修改时间，避免每次打包时计算CUDA等大目录的哈希值
+        """
+        def _stat_file(path):
+            stat = os.stat(path)
+            return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+        fingerprint = hashlib.sha256()
+        for sub in self.lazy_modules + self.sub_modules:
+            for opt in sub.pack_opts:
+                key = get_opt_key(opt, opt.get_cache_inputs(), hash_file=_stat_file)
+                fingerprint.update(f"{sub.name}-{opt.name}:{key if key else ''};".encode("utf-8"))
+        return fingerprint.hexdigest()
+
+    def _check_pack_state(self):
+        """
+        增量模式下依赖发生变化时清空Python环境与已下载的依赖包，避免已移除的包残留在Release中
+        :return: 本次的指纹，打包完成后需写入PACK_STATE_NAME
+        """
+        fingerprint = self._get_pack_fingerprint()
+        state_path = os.path.join(self.save_path, PACK_STATE_NAME)
+        last_fingerprint = None
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    last_fingerprint = json.load(f).get("fingerprint")
+            except (OSError, ValueError):
+                last_fingerprint = None
+        if last_fingerprint != fingerprint:
+            for tag in PACK_STATE_ARTIFACTS:
+                path = os.path.join(self.module_path, ARTIFACT_RELATIVE_PATHS[tag])
+                if os.path.exists(path):
+                    Logging.info(f"依赖或Python环境已发生变化，将重新生成{os.path.abspath(path)}")
+                    shutil.rmtree(path)
+        return fingerprint
+
+    def _save_pack_state(self, fingerprint):
+        state_path = os.path.join(self.save_path, PACK_STATE_NAME)
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint}, f)
 
     def add_sub_module(self, sub_module: SubModule, lazy=False):
         """
@@ -184,47 +419,214 @@ class CreateExecutableModule:
             Logging.info(module.name + f"优先级{module.level}" + f"\t{module.details}")
         Logging.info("------------------------------------")
 
-    def _solve_module(self, lazy=False):
-        if lazy:
-            modules = self.lazy_modules
-            # lazy mode 不支持terminal
-            terminal = None
-        else:
-            self.terminal = PTerminal()
-            modules = self.sub_modules
-            terminal = self.terminal.shell_func()
+    def _pack_shell(self, shell):
+        # 终端在首次被Pack OP使用时才启动
+        with self._terminal_lock:
+            if self.terminal is None:
+                self.terminal = PTerminal()
+        self.terminal.shell_func()(shell)
+
+    def _prepare_module(self, sub, lazy=False):
+        # ToDO设置序列化路径
+        sub._module_path = self.module_path
+        # 需对每个module设置save_dir和终端，lazy mode 不支持terminal
+        sub.prepare(work_dir=self.work_dir,
+                    interpreter_path=os.path.join(self.module_path, "Python"),
+                    module_path=self.module_path,
+                    terminal=None if lazy else self._pack_shell)
+
+    def _register_module(self, sub, lazy=False):
+        # 保护用户侧接触不到的模块不被泄漏模块名
+        if len(sub.unpack_opts) != 0:
+            if lazy:
+                self.configs["lazy_module"].append(sub.name)
+            else:
+                self.configs["sub_module"].append(sub.name)
+                self.configs["module_graph"][sub.name] = {"depends": sub.depends,
+                                                          "resources": sub.get_resources()}
+
+    def _solve_module(self, lazy=False, modules=None):
+        if modules is None:
+            modules = self.lazy_modules if lazy else self.sub_modules
         for sub in modules:
-            # ToDO设置序列化路径
-            sub._module_path = self.module_path
-            # 需对每个module设置save_dir和终端
-            sub.prepare(work_dir=self.work_dir,
-                        interpreter_path=os.path.join(self.module_path, "Python"),
-                        module_path=self.module_path,
-                        terminal=terminal)
+            self._prepare_module(sub, lazy=lazy)
             sub.pack()
+            self._register_module(sub, lazy=lazy)
+
+    def _copy_resources(self):
+        Logging.info("正在复制相关文件，可能会耗时较长")
+        with phase("copy_resources"):
+            copytree(self.work_dir,
+                     self.resources_path,
+                     ignore_dirs=self.ignore_dirs,
+                     delete_orphans=self.incremental,
+                     ignore_matcher=self.ignore_matcher)
+
+    def _take_snapshot(self):
+        # QPT运行时所需的包在lazy module中安装，不参与动态裁剪
+        # 增量模式下该快照会包含上次安装的全部包，此时裁剪范围会相应缩小
+        self._runtime_entries = os.listdir(self.lib_package_path) if os.path.exists(self.lib_package_path) else list()
+        if self.volume_module:
+            self.volume_module.take_snapshot(self.module_path)
+
+    @staticmethod
+    def _is_custom_pack(sub) -> bool:
+        """
+        重写了pack方法的SubModule无法拆分为单个OP，需整体作为一个步骤执行，且由其自身负责封装Unpack OP
+        """
+        return type(sub).pack is not SubModule.pack
 
-            # 保护用户侧接触不到的模块不被泄漏模块名
-            if len(sub.unpack_opts) != 0:
-                if lazy:
-                    self.configs["lazy_module"].append(sub.name)
-                else:
-                    self.configs["sub_module"].append(sub.name)
+    def _get_pack_steps(self, modules, lazy=False) -> list:
+        steps = list()
+        for sub in modules:
+            self._prepare_module(sub, lazy=lazy)
+            if self._is_custom_pack(sub):
+                # 未声明读写产物，视为屏障，需等待之前的全部步骤
+                steps.append(_PackStep(f"{sub.name}-pack",
+                                       func=sub.pack,
+                                       module=sub.name,
+                                       depends=sub.pack_depends))
+                continue
+            for opt in sub.pack_opts:
+                steps.append(_PackStep(f"{sub.name}-{opt.name}",
+                                       func=lambda s=sub, o=opt: s.run_pack_opt(o),
+                                       module=sub.name,
+                                       inputs=opt.pack_inputs,
+                                       outputs=opt.pack_outputs,
+                                       resources=opt.pack_resources,
+                                       depends=sub.pack_depends))
+        return steps
+
+    @staticmethod
+    def _get_pack_nodes(steps) -> List[DAGNode]:
+        """
+        根据Pack OP声明的读写产物生成依赖图，以下情况中后者需等待前者执行完毕，其余OP可并行执行：
+        1. 属于同一Module或后者的pack_depends中包含前者所属的Module
+        2. 后者写入前者读写的产物，或后者读取前者写入的产物
+        3. 任一方未声明读写产物
+        :param steps: _PackStep列表，列表顺序即优先级顺序
+        """
+        nodes = list()
+        for step_id, step in enumerate(steps):
+            depends = list()
+            for prev in steps[:step_id]:
+                if step.inputs is None or prev.inputs is None \
+                        or (step.module is not None and step.module == prev.module) \
+                        or prev.module in step.depends \
+                        or step.outputs & (prev.inputs | prev.outputs) \
+                        or step.inputs & prev.outputs:
+                    depends.append(prev.name)
+            nodes.append(DAGNode(step.name, step.func, depends=depends, resources=step.resources))
+        return nodes
+
+    def _pack_modules(self):
+        """
+        按依赖图执行resources复制与全部Module的Pack OP，Unpack OP的封装与Module的登记仍按优先级顺序进行，
+        故生成的文件与配置信息不受执行顺序影响
+        """
+        # 预编译等SubModule需处理resources目录，其Pack OP未声明读写产物，会等待复制完毕
+        steps = [_PackStep("copy_resources", self._copy_resources,
+                           inputs=list(), outputs=[ARTIFACT_RESOURCES], resources=[PACK_RESOURCE_DISK])]
+        steps += self._get_pack_steps(self.lazy_modules, lazy=True)
+        # 分卷模式下快照需记录Python目录中的全部文件，需等待之前的全部OP
+        steps.append(_PackStep("snapshot", self._take_snapshot,
+                               inputs=None if self.volume_module else [ARTIFACT_SITE_PACKAGES],
+                               outputs=list()))
+        steps += self._get_pack_steps(self.sub_modules)
+        # 保证步骤名唯一
+        names = dict()
+        for step in steps:
+            names[step.name] = names.get(step.name, 0) + 1
+            if names[step.name] > 1:
+                step.name += f"#{names[step.name]}"
+
+        workers = int(os.getenv("QPT_PACK_WORKERS", self.pack_workers))
+
+        def on_start(name, in_flight):
+            if len(in_flight) > 1:
+                Logging.debug("正在并行执行：%s", "、".join(in_flight))
+
+        run_dag(self._get_pack_nodes(steps), workers=workers, limits=DEFAULT_PACK_LIMITS, on_start=on_start)
+
+        for sub in self.lazy_modules:
+            if not self._is_custom_pack(sub):
+                sub.serialize_unpack_opts()
+            self._register_module(sub, lazy=True)
+        for sub in self.sub_modules:
+            if not self._is_custom_pack(sub):
+                sub.serialize_unpack_opts()
+            self._register_module(sub)
+
+    def _smoke_run(self):
+        """
+        在Debug目录中以导入记录模式执行程序或冒烟测试脚本
+        :return: 导入记录文件路径，未生成记录时返回None
+        """
+        trace_path = os.path.join(self.save_path, "import_trace.json")
+        if os.path.exists(trace_path):
+            os.remove(trace_path)
+        env = os.environ.copy()
+        env.update({"QPT_MODE": "Debug",
+                    "QPT_COLOR": "False",
+                    "PYTHONIOENCODING": "utf-8",
+                    "PYTHONPATH": "Python/Lib/site-packages;Python/Lib;Python",
+                    IMPORT_TRACE_ENV: os.path.abspath(trace_path)})
+        if self.smoke_script:
+            env[IMPORT_TRACE_SCRIPT_ENV] = self.smoke_script
+        Logging.info(f"正在Debug目录中执行{self.smoke_script or self.launcher_py_path}以记录被加载的模块，"
+                     f"最长等待{self.smoke_timeout}秒")
+        cmd = [os.path.join(self.debug_path, "Python", "python.exe"),
+               "-c",
+               "import sys;sys.path.append('./Python');sys.path.append('./Python/Lib');"
+               "sys.path.append('./Python/Lib/site-packages');sys.path.append('./Python/Scripts');"
+               "import qpt.run as run"]
+        process = subprocess.Popen(cmd, cwd=self.debug_path, env=env, stdin=subprocess.DEVNULL)
+        try:
+            process.wait(timeout=self.smoke_timeout)
+        except subprocess.TimeoutExpired:
+            Logging.warning(f"冒烟测试超过{self.smoke_timeout}秒仍未结束，已强制结束，将使用已记录的模块进行裁剪")
+            # 主程序运行于子进程中，需结束整个进程树
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            process.wait()
+        if not os.path.exists(trace_path):
+            Logging.warning("冒烟测试未生成导入记录，请在Debug目录中确认程序可以正常运行")
+            return None
+        return trace_path
+
+    def _tree_shaking(self, trace_path, runtime_entries):
+        """
+        根据导入记录裁剪Release目录中的site-packages
+        :param trace_path: 导入记录文件路径
+        :param runtime_entries: 不参与裁剪的site-packages顶层文件或目录名
+        """
+        shake_site_packages(self.lib_package_path,
+                            os.path.join(self.debug_path, "Python", "Lib", "site-packages"),
+                            trace_path,
+                            keep_entries=runtime_entries,
+                            keep_patterns=self.tree_shaking_keep,
+                            report_path=os.path.join(self.save_path, SHAKE_REPORT_NAME))
 
     def make(self):
+        with phase("make", save_path=os.path.abspath(self.module_path)):
+            self._make()
+
+    def _make(self):
         # 打印sub module信息
         # 依靠优先级进行排序
         self.lazy_modules.sort(key=lambda m: m.level, reverse=True)
         self.sub_modules.sort(key=lambda m: m.level, reverse=True)
         self.print_details()
 
-        # 解析子模块
-        self._solve_module(lazy=True)
-        self._solve_module()
-
-        # 复制资源文件
+        # 复制资源文件并解析子模块 - 无依赖关系的Pack OP并行执行
         assert os.path.exists(self.work_dir), f"{os.path.abspath(self.work_dir)}不存在，请检查该路径是否正确"
-        Logging.info("正在复制相关文件，可能会耗时较长")
-        copytree(self.work_dir, self.resources_path, ignore_dirs=self.ignore_dirs)
+        fingerprint = self._check_pack_state() if self.incremental else self._get_pack_fingerprint()
+        with phase("pack_modules"):
+            self._pack_modules()
+        self._save_pack_state(fingerprint)
+        if self.volume_module:
+            # 作为lazy module注册，使其在用户使用时先于其它SubModule解压
+            self._solve_module(lazy=True, modules=[self.volume_module])
 
         # QPT的dev模式
         if self.with_debug:
@@ -245,18 +647,29 @@ class CreateExecutableModule:
         #             lf_codes[lf_code_id] = lf_code[:lf_code.index("if ")] + "if 'qpt':\n"
         #             new_lf.writelines(lf_codes)
 
-        # 创建配置文件
+        # 创建启动配置 - 分卷模式下Python环境在首次运行时才解压，纯Python包的压缩包需在运行时获取
         os.makedirs(self.config_path, exist_ok=True)
-        with open(self.config_file_path, "w", encoding="utf-8") as config_file:
-            config_file.write(str(self.configs))
+        site_zip = None if self.volume_module else \
+            [os.path.basename(path) for path in get_site_zip_paths(os.path.join(self.interpreter_path, "Lib"))]
+        make_boot(self.config_path, self.configs, site_zip=site_zip)
 
         # 启动器相关
         launcher_entry_path = os.path.join(os.path.split(qpt.__file__)[0], "ext/launcher_entry")
         # 复制Debug所需文件
         Logging.info("正在复制相关文件，可能会耗时较长")
         debug_ext_dir = os.path.join(os.path.split(qpt.__file__)[0], "ext/launcher_debug")
-        copytree(debug_ext_dir, dst=self.debug_path)
-        copytree(self.module_path, dst=self.debug_path)
+        # Debug目录独有的文件，增量模式下不作为孤立文件删除
+        debug_files = [DEBUG_COMPATIBILITY_MODE_FILE, "configs/entry.cmd", "configs/unlock.cache"]
+        for root, _, names in os.walk(debug_ext_dir):
+            debug_files += [os.path.relpath(os.path.join(root, name), debug_ext_dir) for name in names]
+        with phase("debug_copy"):
+            copytree(self.module_path,
+                     dst=self.debug_path,
+                     delete_orphans=self.incremental,
+                     link=self.debug_output_mode == DEBUG_OUTPUT_HARDLINK,
+                     link_ignore_dirs=["configs"],
+                     keep_files=debug_files)
+            copytree(debug_ext_dir, dst=self.debug_path)
         shutil.copy(src=os.path.join(launcher_entry_path, "entry_debug.cmd"),
                     dst=os.path.join(self.debug_path, "configs/entry.cmd"))
         # 生成Debug标识符
@@ -266,8 +679,48 @@ class CreateExecutableModule:
         # 重命名兼容模式文件
         compatibility_mode_file = os.path.join(self.debug_path, "compatibility_mode.cmd")
         if os.path.exists(compatibility_mode_file):
-            os.rename(compatibility_mode_file,
-                      os.path.join(self.debug_path, "使用兼容模式运行.cmd"))
+            os.replace(compatibility_mode_file,
+                       os.path.join(self.debug_path, DEBUG_COMPATIBILITY_MODE_FILE))
+
+        # 动态裁剪与预加载 - 需在Debug目录生成后、完整性清单生成前执行
+        if self.tree_shaking or self.preload:
+            trace_path = None
+            if self.volume_module:
+                Logging.warning("当前Python环境已被压缩为分卷，已跳过动态裁剪与预加载清单的生成")
+            else:
+                with phase("smoke_run"):
+                    trace_path = self._smoke_run()
+            if trace_path and self.tree_shaking:
+                with phase("tree_shaking"):
+                    self._tree_shaking(trace_path, self._runtime_entries)
+            if trace_path and self.preload:
+                preload_path = os.path.join(self.config_path, PRELOAD_FILE_NAME)
+                make_preload_profile(trace_path,
+                                     traced_root=self.debug_path,
+                                     module_path=self.module_path,
+                                     save_path=preload_path,
+                                     exclude=self.preload_exclude,
+                                     with_imports=self.preload_imports)
+                shutil.copy(src=preload_path, dst=os.path.join(self.debug_path, "configs", PRELOAD_FILE_NAME))
+
+        # 在线模式 - Debug目录保留完整环境以便本地测试，Release中的Python环境与依赖包移至Online目录
+        if self.online_base_url:
+            with phase("online_release"):
+                make_online_release(self.module_path,
+                                    os.path.join(self.save_path, ONLINE_RELATIVE_PATH),
+                                    self.online_base_url)
+            shutil.copy(src=os.path.join(launcher_entry_path, "bootstrap.ps1"),
+                        dst=os.path.join(self.config_path, "bootstrap.ps1"))
+
+        # 生成完整性清单 - 供运行时校验文件是否缺失或损坏
+        if self.configs["verify_mode"] != VERIFY_NONE:
+            # Python环境分卷在首次运行解压后会被删除，其完整性由zip的CRC校验保证
+            manifest_path = os.path.join(self.config_path, MANIFEST_FILE_NAME)
+            with phase("manifest"):
+                make_manifest(self.module_path,
+                              manifest_path,
+                              ignore_patterns=["/" + PYTHON_VOLUME_RELATIVE_PATH + "/"])
+            shutil.copy(src=manifest_path, dst=os.path.join(self.debug_path, "configs", MANIFEST_FILE_NAME))
 
         # 复制Release启动器文件
         launcher_ext_dir = os.path.join(os.path.split(qpt.__file__)[0], "ext/launcher")
@@ -341,7 +794,7 @@ class RunExecutableModule:
         # 初始化Module信息
         self.base_dir = os.path.abspath(module_path)
         self.config_path = os.path.join(self.base_dir, "configs")
-        self.config_file_path = os.path.join(self.base_dir, "configs", "configs.txt")
+        self.config_file_path = os.path.join(self.base_dir, "configs", BOOT_FILE_NAME)
         self.work_dir = os.path.join(self.base_dir, "resources")
         self.interpreter_path = os.path.join(self.base_dir, "Python")
 
@@ -352,8 +805,12 @@ class RunExecutableModule:
             os.mkdir(os.path.join(self.config_path, "logs"))
         if QPT_MODE == "Debug":
             log_name = "#Debug#" + log_name
+        clean_old_logs(os.path.join(self.config_path, "logs"))
         set_logger_file(os.path.join(self.config_path, "logs", "QPT-" + log_name))
         sys.stdout = StdOutLoggerWrapper(os.path.join(self.config_path, "logs", "APP-" + log_name))
+        # 耗时记录 - 首次运行时始终保存，之后可通过环境变量QPT_TRACE=1开启
+        if os.getenv(TRACE_ENV) == "1" or not os.path.exists(os.path.join(self.config_path, "run_act.lock")):
+            enable_trace(os.path.join(self.config_path, "logs"))
 
         # 软件信息
         Logging.info(f"QPT Runtime版本号为{qpt_v}，若无法使用该程序，可向程序发布者或GitHub: QPT-Family/QPT提交issue寻求帮助")
@@ -389,10 +846,10 @@ class RunExecutableModule:
             exit(1)
 
         try:
-            with open(self.config_file_path, "r", encoding="utf-8") as config_file:
-                self.configs = eval(config_file.read())
+            with span("config.load"):
+                self.configs = load_configs(self.config_path)
         except Exception as e:
-            Logging.error("请检查杀毒软件、防火墙等限制策略，当前程序无法正常访问Config.gt文件，完整报错如下：\n" + str(e))
+            Logging.error("请检查杀毒软件、防火墙等限制策略，当前程序无法正常访问启动配置文件，完整报错如下：\n" + str(e))
 
         # 获取GUI选项
         self.hidden_terminal = self.configs["hidden_terminal"]
@@ -401,37 +858,289 @@ class RunExecutableModule:
         self.lazy_module = self.configs["lazy_module"]
         self.sub_module = self.configs["sub_module"]
 
-        # 实例化终端
-        self.auto_terminal = PTerminal()
+        # 终端 - 仅在OP实际执行终端命令时才启动PowerShell，并行部署时需依次执行终端命令
+        self._auto_terminal = None
+        self._terminal_lock = threading.Lock()
+
+    @property
+    def auto_terminal(self):
+        if self._auto_terminal is None:
+            with span("terminal.start"):
+                self._auto_terminal = PTerminal()
+        return self._auto_terminal
+
+    def _lazy_shell(self, shell):
+        with self._terminal_lock:
+            self.auto_terminal.shell_func()(shell)
+
+    def _get_unpack_nodes(self, unpack_func) -> List[DAGNode]:
+        """
+        根据打包时记录的部署依赖生成依赖图，未声明依赖的Module需等待其之前的全部Module，即按优先级依次部署
+        :param unpack_func: 部署函数，参数为Module名
+        """
+        module_graph = self.configs.get("module_graph", dict())
+        nodes = list()
+        for sub_id, sub_name in enumerate(self.sub_module):
+            info = module_graph.get(sub_name, dict())
+            depends = info.get("depends")
+            if depends is None:
+                depends = self.sub_module[:sub_id]
+            nodes.append(DAGNode(sub_name,
+                                 func=lambda name=sub_name: unpack_func(name),
+                                 depends=depends,
+                                 resources=info.get("resources")))
+        return nodes
 
     def _solve_module(self):
         modules = self.lazy_module + self.sub_module
+        workers = int(os.getenv("QPT_UNPACK_WORKERS", self.configs.get("unpack_workers", DEFAULT_DAG_WORKERS)))
+
+        def unpack(sub_name):
+            with span(sub_name, cat="module"):
+                sub_module = SubModule(sub_name)
+                sub_module.prepare(work_dir=self.work_dir,
+                                   interpreter_path=self.interpreter_path,
+                                   module_path=self.base_dir,
+                                   terminal=self._lazy_shell)
+                sub_module.unpack()
 
         def render(arg=None):
             Logging.info("初次使用将会适应本地环境，可能需要几分钟时间，请耐心等待...")
-            terminal = self.auto_terminal.shell_func()
             tp = TProgressBar("初始化进度", max_len=len(modules) + 2)
-            for sub_module_id, sub_name in enumerate(modules):
+            # 解释器与QPT依赖需依次部署，其余Module按依赖图并行部署
+            for sub_name in self.lazy_module:
                 tp.step(add_end_info=f"{sub_name}部署中...")
                 if arg:
                     arg.step(text="正在适配" + sub_name)
-                sub_module = SubModule(sub_name)
-                sub_module.prepare(work_dir=self.work_dir,
-                                   interpreter_path=self.interpreter_path,
-                                   module_path=self.base_dir,
-                                   terminal=terminal)
-                sub_module.unpack()
+                unpack(sub_name)
+
+            def on_start(name, in_flight):
+                Logging.debug("%s开始部署，当前正在部署：%s", name, ", ".join(in_flight))
+
+            def on_done(name, in_flight):
+                info = f"{'、'.join(in_flight)}部署中..." if in_flight else f"{name}部署完毕"
+                tp.step(add_end_info=info)
+                if arg:
+                    arg.step(text="正在适配" + ("、".join(in_flight) if in_flight else name))
+
+            run_dag(self._get_unpack_nodes(unpack), workers=workers, on_start=on_start, on_done=on_done)
             tp.step(add_end_info=f"初始化完毕")
 
-        if self.hidden_terminal:
-            get_func_bind_progressbar(bind_fuc=render, max_step=len(modules))
-        else:
-            render()
+        with span("unpack", ui="tk" if self.hidden_terminal else "terminal"):
+            if self.hidden_terminal:
+                get_func_bind_progressbar(bind_fuc=render, max_step=len(modules))
+            else:
+                render()
+
+    def verify(self):
+        """
+        根据打包时生成的完整性清单校验当前目录，可通过环境变量QPT_VERIFY临时指定校验等级，例如QPT_VERIFY=full
+        """
+        mode = os.getenv("QPT_VERIFY", self.configs.get("verify_mode", VERIFY_NONE)).lower()
+        manifest_path = os.path.join(self.config_path, MANIFEST_FILE_NAME)
+        if mode == VERIFY_NONE or not os.path.exists(manifest_path):
+            return
+        try:
+            mismatches = verify_manifest(self.base_dir, manifest_path, mode=mode)
+        except Exception as e:
+            Logging.warning(f"完整性校验失败，已跳过校验，完整报错如下：\n{e}")
+            return
+        if not mismatches:
+            return
+
+        damaged = [rel_path for rel_path, reason in mismatches if reason in [MISMATCH_MISSING, MISMATCH_SIZE]]
+        Logging.warning(f"完整性校验发现{len(mismatches)}个文件与打包时不一致：\n" +
+                        "\n".join([f"{reason}\t{rel_path}" for rel_path, reason in mismatches[:50]]))
+        # 仅修改时间不一致时通常为解压软件导致，仅在缺失或大小不一致时提示用户
+        if damaged and not CheckRun.check_run_file(self.config_path):
+            warning_msg_box(text=f"检测到{len(damaged)}个文件缺失或已损坏，例如：\n" +
+                                 "\n".join(damaged[:5]) + "\n"
+                                 f"---------------------------------------\n"
+                                 f"该情况可能由解压不完整或杀毒软件拦截导致，可能会造成程序无法正常运行，\n"
+                                 f"建议重新解压完整的压缩包后再运行本程序。")
+
+    def _get_ready_key(self):
+        """
+        就绪标记的校验值，由完整性清单（不存在时为启动配置）、程序位置、QPT与解释器版本共同决定
+        """
+        file_hash = hashlib.blake2b(digest_size=16)
+        for name in [MANIFEST_FILE_NAME, BOOT_FILE_NAME, LEGACY_CONFIG_FILE_NAME]:
+            file_path = os.path.join(self.config_path, name)
+            if os.path.exists(file_path):
+                with open(file_path, "rb") as f:
+                    file_hash.update(f.read())
+                break
+        file_hash.update("|".join([self.base_dir, qpt_v, sys.version]).encode("utf-8"))
+        return file_hash.hexdigest()
+
+    def load_ready_stamp(self) -> bool:
+        """
+        读取就绪标记，匹配时在当前环境变量的基础上重新应用首次运行时OP所做的修改，并恢复sys.path
+        :return: 是否可以跳过OP加载
+        """
+        stamp_path = os.path.join(self.config_path, READY_STAMP_NAME)
+        if not os.path.exists(stamp_path):
+            return False
+        try:
+            with open(stamp_path, "r", encoding="utf-8") as f:
+                stamp = json.load(f)
+            if stamp["key"] != self._get_ready_key():
+                return False
+            self._apply_environ(stamp["environ_patch"])
+            for path in stamp["sys_path"]:
+                if path not in sys.path:
+                    sys.path.append(path)
+        except Exception as e:
+            Logging.debug(f"就绪标记无效，将重新加载OP：{e}")
+            return False
+        return True
+
+    @staticmethod
+    def _diff_environ(ori_environ: dict, environ: dict) -> dict:
+        """
+        获取OP对环境变量的修改，在PATH等列表型变量的原值前后追加路径时仅记录追加的部分
+        :param ori_environ: OP加载前的环境变量
+        :param environ: OP加载后的环境变量
+        :return: 格式{变量名: {"prefix": 前缀, "suffix": 后缀}或{"value": 完整值}}
+        """
+        patch = dict()
+        for k, v in environ.items():
+            ori = ori_environ.get(k)
+            if ori == v:
+                continue
+            index = v.rfind(ori) if ori else -1
+            prefix, suffix = (v[:index], v[index + len(ori):]) if index != -1 else (None, None)
+            # 仅对以路径分隔符连接的列表型变量记录前后缀
+            if index != -1 and prefix[-1:] in ["", os.pathsep] and suffix[:1] in ["", os.pathsep]:
+                patch[k] = {"prefix": prefix, "suffix": suffix}
+            else:
+                patch[k] = {"value": v}
+        return patch
+
+    @staticmethod
+    def _apply_environ(patch: dict):
+        """
+        将OP对环境变量的修改应用至当前值，使首次运行后系统中PATH等变量的变化（如驱动更新）不会被覆盖
+        :param patch: _diff_environ的返回值
+        """
+        for k, item in patch.items():
+            if "value" in item:
+                os.environ[k] = item["value"]
+                continue
+            current = os.environ.get(k, "")
+            if current:
+                os.environ[k] = item["prefix"] + current + item["suffix"]
+            else:
+                os.environ[k] = (item["prefix"] + item["suffix"]).strip(os.pathsep)
+
+    def make_ready_stamp(self, ori_environ: dict, ori_sys_path: list):
+        """
+        记录OP加载前后环境变量与sys.path的差异，下次启动时在当前环境的基础上重新应用
+        :param ori_environ: OP加载前的环境变量
+        :param ori_sys_path: OP加载前的sys.path
+        """
+        stamp = {"key": self._get_ready_key(),
+                 "environ_patch": self._diff_environ(ori_environ, dict(os.environ)),
+                 "sys_path": [path for path in sys.path if path not in ori_sys_path]}
+        stamp_path = os.path.join(self.config_path, READY_STAMP_NAME)
+        try:
+            with open(stamp_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(stamp, f, ensure_ascii=False)
+            os.replace(stamp_path + ".tmp", stamp_path)
+        except OSError as e:
+            Logging.debug(f"就绪标记写入失败，下次启动时将重新加载OP：{e}")
+
+    def _launch(self, args: list):
+        """
+        直接启动主程序，输出按块原样转发至sys.stdout并写入APP日志
+        不按行读取，避免\r刷新的进度条与不换行的input提示在遇到换行前无法显示
+        :param args: python.exe的参数
+        """
+        env = os.environ.copy()
+        env.setdefault("PYTHONIOENCODING", "utf-8")
+        env["PYTHONUNBUFFERED"] = "1"
+        Logging.debug("正在启动主程序：%s", args)
+        instant("app.start", mode=LAUNCH_MODE_SUBPROCESS)
+        dump_trace()
+        process = subprocess.Popen([os.path.join(self.interpreter_path, "python.exe")] + args,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   cwd=self.work_dir,
+                                   env=env)
+        cache = deque(maxlen=APP_OUTPUT_CACHE_LINES)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        pending = ""
+        with span("app", pid=process.pid):
+            for chunk in iter(lambda: process.stdout.read1(APP_OUTPUT_CHUNK_SIZE), b""):
+                text = decoder.decode(chunk)
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                lines = (pending + text).split("\n")
+                pending = lines.pop()
+                # 进度条等以\r刷新的内容仅保留最后一次的输出
+                cache.extend(line.rstrip("\r").rsplit("\r", 1)[-1] for line in lines)
+            return_code = process.wait()
+        if pending:
+            cache.append(pending.rstrip("\r").rsplit("\r", 1)[-1])
+        if return_code != 0:
+            Logging.error(f"程序异常退出，返回值为{return_code}，最后的输出如下：\n" + "\n".join(cache))
+
+    def _prepare_inprocess(self, launcher_path):
+        """
+        为在当前进程中执行主程序准备环境，使其与python.exe 主程序.py一致
+        :param launcher_path: 主程序的绝对路径
+        """
+        if self._auto_terminal is not None:
+            self._auto_terminal.close_terminal()
+            self._auto_terminal = None
+        for name in list(sys.modules):
+            if any(name == m or name.startswith(m + ".") for m in INPROCESS_UNLOAD_MODULES):
+                del sys.modules[name]
+        gc.collect()
+
+        # Python3.8起扩展模块所依赖的DLL不再从PATH中查找
+        if hasattr(os, "add_dll_directory"):
+            for dll_dir in [self.interpreter_path,
+                            os.path.join(self.interpreter_path, "DLLs"),
+                            os.path.join(self.base_dir, "opt", "CUDA")]:
+                if os.path.isdir(dll_dir):
+                    os.add_dll_directory(dll_dir)
+
+        os.chdir(self.work_dir)
+        sys.argv = [launcher_path] + sys.argv[1:]
+        sys.path.insert(0, os.path.dirname(launcher_path))
+
+    def _launch_inprocess(self, launcher_path):
+        """
+        使用runpy在当前进程中执行主程序，需先调用_prepare_inprocess
+        :param launcher_path: 主程序的绝对路径
+        """
+        Logging.debug("正在当前进程中启动主程序：%s", launcher_path)
+        instant("app.start", mode=LAUNCH_MODE_INPROCESS)
+        dump_trace()
+        try:
+            runpy.run_path(launcher_path, run_name="__main__")
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except Exception:
+            # 与subprocess模式中stderr合并至stdout一致，报错写入被包装的sys.stdout，从而进入APP日志
+            traceback.print_exc(file=sys.stdout)
+            sys.stdout.flush()
+            Logging.error("程序异常退出，完整报错见上方输出")
+            raise SystemExit(1)
 
     def solve_work_dir(self):
+        # 启动配置中已包含预先计算的sys.path与环境变量模板
+        boot = load_boot(self.base_dir)
+        if boot is not None:
+            sys.path.extend(boot["sys_path"])
+            apply_boot_env(boot)
+            return
+
         # Set Sys ENV
         sys.path.append(self.work_dir)
         sys.path.append(os.path.abspath("./Python/Lib/site-packages"))
+        sys.path.extend(get_site_zip_paths(os.path.abspath("./Python/Lib")))
         sys.path.append(os.path.abspath("./Python/Lib/ext"))
         sys.path.append(os.path.abspath("./Python/Lib"))
         sys.path.append(os.path.abspath("./Python"))
@@ -446,7 +1155,13 @@ class RunExecutableModule:
 
     def run(self):
         # 设置工作目录
-        self.solve_work_dir()
+        with span("solve_work_dir"):
+            self.solve_work_dir()
+
+        # 预加载 - 在后台预读主程序会用到的文件，与后续的初始化流程同时进行
+        preload_profile = load_preload_profile(self.config_path)
+        if preload_profile:
+            start_readahead(self.base_dir, preload_profile)
 
         # 获取启动信息 - 避免在Release下进行Debug
         env_warning_flag = False
@@ -470,28 +1185,45 @@ class RunExecutableModule:
             if not msg:
                 Logging.info("程序已停止")
                 exit(1)
-        # prepare module - GUI组件需要在此之后才能进行
-        self._solve_module()
+        # 热启动 - 就绪标记与当前清单一致时跳过校验、终端创建、OP加载与进度界面
+        with span("ready_stamp.load"):
+            warm_start = not os.getenv("QPT_VERIFY") and self.load_ready_stamp()
+        if warm_start:
+            Logging.debug("就绪标记匹配，跳过初始化")
+        else:
+            # 校验文件完整性
+            with span("verify"):
+                self.verify()
 
-        if Logging.final():
-            msg = warning_msg_box(title="ERROR 发生异常 -GitHub: QPT-Family/QPT",
-                                  text="检测到安装中出现问题，若您为未成功运行过本程序，请点击 取消 \n"
-                                       "若您已经成功运行了本程序，可点击 确定 来隐藏该窗口")
-            if msg:
+            # prepare module - GUI组件需要在此之后才能进行
+            ori_environ, ori_sys_path = os.environ.copy(), list(sys.path)
+            self._solve_module()
+
+            if Logging.final():
+                msg = warning_msg_box(title="ERROR 发生异常 -GitHub: QPT-Family/QPT",
+                                      text="检测到安装中出现问题，若您为未成功运行过本程序，请点击 取消 \n"
+                                           "若您已经成功运行了本程序，可点击 确定 来隐藏该窗口")
+                if msg:
+                    CheckRun.make_run_file(self.config_path)
+            else:
                 CheckRun.make_run_file(self.config_path)
-        else:
-            CheckRun.make_run_file(self.config_path)
+                self.make_ready_stamp(ori_environ, ori_sys_path)
 
         # 执行主程序
-        run_shell = f'cd "{self.work_dir}";' + './../Python/python.exe "' + \
-                    os.path.abspath(os.path.join(self.work_dir, self.configs["launcher_py_path"])) + '"'
-        # start -NoNewWindow 看看要不要从输入符号入手
-        self.auto_terminal.shell(run_shell, callback=RunTerminalCallback())
-        # main_lib_path = self.configs["launcher_py_path"].replace(".py", "")
-        # main_lib_path = main_lib_path. \
-        #     replace(".py", ""). \
-        #     replace(r"\\", "."). \
-        #     replace("\\", "."). \
-        #     replace("/", ".")
-        # lib = importlib.import_module(main_lib_path)
+        launcher_path = os.path.abspath(os.path.join(self.work_dir, self.configs["launcher_py_path"]))
+        launch_mode = os.getenv("QPT_LAUNCH_MODE", self.configs.get("launch_mode", LAUNCH_MODE_SUBPROCESS)).lower()
+        # 打包时的动态裁剪 - 在导入记录器下执行主程序或冒烟测试脚本，需使用新的进程以免记录QPT自身加载的模块
+        trace_path = os.getenv(IMPORT_TRACE_ENV)
+        if trace_path:
+            script_path = os.getenv(IMPORT_TRACE_SCRIPT_ENV, self.configs["launcher_py_path"])
+            self._launch(["-m", "qpt.kernel.qimport", trace_path,
+                          os.path.abspath(os.path.join(self.work_dir, script_path))])
+        elif launch_mode == LAUNCH_MODE_INPROCESS:
+            self._prepare_inprocess(launcher_path)
+            # 提前导入需在环境变量、工作目录与sys.argv均与主程序一致后进行，仅在打包时开启了preload_imports时存在
+            if preload_profile and preload_profile.get("imports"):
+                start_preload_imports(preload_profile)
+            self._launch_inprocess(launcher_path)
+        else:
+            self._launch([launcher_path])
         # input("QPT执行完毕，请按任意键退出")
@@ -0,0 +1,79 @@
+﻿# QPT在线模式引导脚本 - 首次运行时根据configs/online_manifest.json下载并解压Python环境
+# 分段并行下载，校验sha256后保存至共享缓存目录，与qpt/kernel/qfetch.py使用相同的缓存结构
+
+$ErrorActionPreference = "Stop"
+Set-Location (Split-Path -Parent $PSScriptRoot)
+Add-Type -AssemblyName System.Net.Http
+Add-Type -AssemblyName System.IO.Compression.FileSystem
+[System.Net.ServicePointManager]::SecurityProtocol = [System.Net.SecurityProtocolType]::Tls12
+[System.Net.ServicePointManager]::DefaultConnectionLimit = 16
+
+$SegmentSize = 4MB
+$Workers = 8
+
+$manifest = Get-Content "configs/online_manifest.json" -Raw -Encoding UTF8 | ConvertFrom-Json
+$baseUrl = if ($env:QPT_ONLINE_URL) { $env:QPT_ONLINE_URL } else { $manifest.base_url }
+$store = if ($env:QPT_STORE) { $env:QPT_STORE } else { Join-Path $env:LOCALAPPDATA "QPT/store" }
+$client = New-Object System.Net.Http.HttpClient
+
+function Request-Segment($url, $start, $end) {
+    $request = New-Object System.Net.Http.HttpRequestMessage([System.Net.Http.HttpMethod]::Get, $url)
+    $request.Headers.Range = New-Object System.Net.Http.Headers.RangeHeaderValue($start, $end)
+    return $client.SendAsync($request)
+}
+
+foreach ($item in $manifest.files) {
+    if (-not $item.bootstrap -or (Test-Path $item.check)) { continue }
+    $url = $baseUrl.TrimEnd("/") + "/" + $item.name
+    $sha = $item.sha256.ToLower()
+    $storeDir = Join-Path $store $sha.Substring(0, 2)
+    $storeFile = Join-Path $storeDir $sha
+    if (-not (Test-Path $storeFile) -or (Get-Item $storeFile).Length -ne $item.size) {
+        Write-Host "正在下载$($item.name)，共$([Math]::Round($item.size / 1MB, 2))MB"
+        New-Item -ItemType Directory -Force -Path $storeDir | Out-Null
+        $part = "$storeFile.$PID.part"
+        $stream = [System.IO.File]::Open($part, [System.IO.FileMode]::Create)
+        try {
+            $stream.SetLength($item.size)
+            $starts = @()
+            for ($start = 0; $start -lt $item.size; $start += $SegmentSize) { $starts += $start }
+            # 每批并行请求$Workers个分段，避免一次性将全部分段读入内存
+            for ($i = 0; $i -lt $starts.Count; $i += $Workers) {
+                $batch = $starts[$i..([Math]::Min($i + $Workers, $starts.Count) - 1)]
+                $tasks = @()
+                foreach ($start in $batch) {
+                    $tasks += Request-Segment $url $start ([Math]::Min($start + $SegmentSize, $item.size) - 1)
+                }
+                for ($j = 0; $j -lt $tasks.Count; $j++) {
+                    $response = $tasks[$j].Result
+                    $response.EnsureSuccessStatusCode() | Out-Null
+                    $bytes = $response.Content.ReadAsByteArrayAsync().Result
+                    if ($response.StatusCode -ne [System.Net.HttpStatusCode]::PartialContent) {
+                        # 服务端不支持Range请求时返回完整文件
+                        $stream.Position = 0
+                        $stream.Write($bytes, 0, $bytes.Length)
+                        $i = $starts.Count
+                        break
+                    }
+                    $stream.Position = $batch[$j]
+                    $stream.Write($bytes, 0, $bytes.Length)
+                }
+                Write-Host "下载进度$([Math]::Min($i + $Workers, $starts.Count))/$($starts.Count)"
+            }
+        } finally {
+            $stream.Close()
+        }
+        $hash = (Get-FileHash $part -Algorithm SHA256).Hash.ToLower()
+        if ($hash -ne $sha) {
+            Remove-Item $part -Force
+            throw "$($item.name)校验失败，期望的sha256为$sha，实际为$hash"
+        }
+        Move-Item $part $storeFile -Force
+    }
+    # 解压至临时目录后再移动，避免中断后残留不完整的Python环境
+    $tmp = ".qpt_bootstrap"
+    if (Test-Path $tmp) { Remove-Item $tmp -Recurse -Force }
+    [System.IO.Compression.ZipFile]::ExtractToDirectory($storeFile, $tmp)
+    Get-ChildItem $tmp | ForEach-Object { Move-Item $_.FullName (Join-Path $item.dst $_.Name) -Force }
+    Remove-Item $tmp -Recurse -Force
+}
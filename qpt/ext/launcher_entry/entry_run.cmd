@@ -8,5 +8,6 @@ set PYTHONIOENCODING=utf-8
 set PYTHONPATH=Python/Lib/site-packages;Python/Lib;Python
 set PATH=Python/Lib/site-package;Python/Lib;Python/Scripts;Python;%PATH%
 cls
+if not exist "Python\python.exe" if exist "configs\bootstrap.ps1" powershell -NoProfile -ExecutionPolicy Bypass -File "configs\bootstrap.ps1" || (pause & exit /b 1)
 "./Python/python.exe" -c "import sys;sys.path.append('./Python');sys.path.append('./Python/Lib');sys.path.append('./Python/Lib/site-packages');sys.path.append('./Python/Scripts');import qpt.run as run"
 pause
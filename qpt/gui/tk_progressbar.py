@@ -2,9 +2,15 @@
 # Datetime:2021/10/8 
 # Copyright belongs to the author.
 # Please indicate the source for reprinting.
+import os
 import threading
 import traceback
 
+from qpt.kernel.qprogress import ProgressBus, ProgressRenderer, NDJSONRenderer, PROGRESS_FILE_ENV
+
+# 界面刷新间隔（毫秒），工作线程仅更新计数，由主线程按该间隔读取并刷新控件
+TK_POLL_INTERVAL = 100
+
 
 def get_func_bind_progressbar(bind_fuc,
                               max_step: int,
@@ -31,8 +37,15 @@ class ProgressbarFrame:
         from tkinter import ttk
         from tkinter.messagebox import showerror
 
-        self.scale = 1. / (max_step + 1)
         self.count = 0
+        self._pending = None
+        self._error = None
+        self._closing = False
+        # 进度由总线合并后交给主线程刷新，避免在工作线程中直接操作tkinter控件
+        self.bus = ProgressBus(interval=TK_POLL_INTERVAL / 1000)
+        if os.getenv(PROGRESS_FILE_ENV):
+            self.bus.add_renderer(NDJSONRenderer(os.getenv(PROGRESS_FILE_ENV)))
+        self.task = self.bus.open_task(title, max_step + 1, info=default_text, renderers=[_TkRenderer(self)])
         # 窗体构建
         self.root = tkinter.Tk()
         self.root.geometry("666x25")
@@ -77,18 +90,31 @@ class ProgressbarFrame:
                     pbf_obj.step("加载完毕")
                 except Exception as e:
                     msg = traceback.format_exc()
-                    showerror(title="发生异常 - QPT提示", message=f"简略异常说明:\n{e}\n\n完整报错信息如下：\n{msg}")
+                    self._error = f"简略异常说明:\n{e}\n\n完整报错信息如下：\n{msg}"
                 finally:
-                    self.root.withdraw()
-                    self.close()
-                    exit(0)
-                return func
+                    self._closing = True
 
             self.thread = threading.Thread(target=func, args=(self,))
             self.thread.setDaemon(True)
             self.thread.start()
 
+        def poll():
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                text, value = pending
+                if text:
+                    self.label_var.set(text)
+                self.progressbar_var.set(value)
+            if self._closing:
+                self.root.withdraw()
+                if self._error is not None:
+                    showerror(title="发生异常 - QPT提示", message=self._error)
+                self.close()
+                return
+            self.root.after(ms=TK_POLL_INTERVAL, func=poll)
+
         self.root.after(ms=32, func=render)
+        self.root.after(ms=TK_POLL_INTERVAL, func=poll)
 
         self.root.mainloop()
 
@@ -101,10 +127,20 @@ class ProgressbarFrame:
         self.root.destroy()
 
     def step(self, text: str = None):
-        if text:
-            self.label_var.set(text)
-        self.progressbar_var.set(self.scale * (self.count + 1) * 100)
+        """
+        可在工作线程中调用，仅累加计数，控件由主线程刷新
+        :param text: 显示的文字
+        """
         self.count += 1
+        self.task.update(info=text)
+
+
+class _TkRenderer(ProgressRenderer):
+    def __init__(self, frame: ProgressbarFrame):
+        self.frame = frame
+
+    def render(self, snapshot: dict):
+        self.frame._pending = (snapshot["info"], snapshot["done"] / snapshot["total"] * 100)
 
 
 if __name__ == '__main__':
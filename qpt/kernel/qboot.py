@@ -0,0 +1,142 @@
+"""
+启动配置 - 打包时将Module列表、主程序路径、各项开关以及sys.path与环境变量模板写入configs/boot.json
+运行时仅需读取一次即可完成初始化，无需eval配置文件与重复扫描目录
+"""
+
+import os
+import ast
+import json
+
+# 启动配置文件名，保存于configs目录
+BOOT_FILE_NAME = "boot.json"
+# 旧版本的配置文件名，仅在启动配置不存在时读取
+LEGACY_CONFIG_FILE_NAME = "configs.txt"
+BOOT_VERSION = 1
+
+# 与qpt.memory.get_env_vars保持一致，用户PATH中包含以下字段的路径会被忽略，避免加载本机的其它Python环境
+IGNORE_ENV_FIELD = ["conda", "Conda", "Python", "python"]
+
+# 相对于程序根目录的sys.path，"{site_zip}"会被替换为纯Python包的压缩包
+BOOT_SYS_PATH = ["resources",
+                 "Python/Lib/site-packages",
+                 "{site_zip}",
+                 "Python/Lib/ext",
+                 "Python/Lib",
+                 "Python",
+                 "Python/Scripts"]
+BOOT_PATH_PREFIX = ["Python/Lib/site-packages",
+                    "Python/Lib",
+                    "Python/Lib/ext",
+                    "Python",
+                    "Python/Scripts"]
+BOOT_PATH_SUFFIX = ["%SYSTEMROOT%/System32/WindowsPowerShell/v1.0",
+                    "C:/Windows/System32/WindowsPowerShell/v1.0",
+                    "%ProgramFiles%/WindowsPowerShell/Modules",
+                    "%SystemRoot%/system32/WindowsPowerShell/v1.0/Modules",
+                    "opt/CUDA"]
+BOOT_PYTHONPATH = ["Python/Lib/site-packages",
+                   "{site_zip}",
+                   ".",
+                   "Python"]
+
+_BOOT_CACHE = dict()
+
+
+def make_boot(config_path, configs: dict, site_zip: list = None):
+    """
+    生成启动配置
+    :param config_path: configs目录
+    :param configs: 配置信息，需可被JSON序列化
+    :param site_zip: Python/Lib中纯Python包的压缩包文件名，为None时运行时扫描目录获取
+    """
+    boot = {"version": BOOT_VERSION,
+            "configs": configs,
+            "site_zip": site_zip,
+            "sys_path": BOOT_SYS_PATH,
+            "path_prefix": BOOT_PATH_PREFIX,
+            "path_suffix": BOOT_PATH_SUFFIX,
+            "pythonpath": BOOT_PYTHONPATH}
+    with open(os.path.join(config_path, BOOT_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(boot, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def _expand(base_dir, rel_paths, site_zip):
+    paths = list()
+    for rel_path in rel_paths:
+        if rel_path == "{site_zip}":
+            paths.extend(os.path.join(base_dir, "Python", "Lib", name) for name in site_zip)
+        elif "%" in rel_path or ":" in rel_path:
+            paths.append(rel_path)
+        else:
+            paths.append(os.path.normpath(os.path.join(base_dir, rel_path)))
+    return paths
+
+
+def load_boot(base_dir):
+    """
+    读取启动配置，同一进程中只读取一次
+    :param base_dir: 程序根目录
+    :return: 启动配置，其中的sys.path与环境变量已展开为绝对路径；不存在时返回None
+    """
+    base_dir = os.path.abspath(base_dir)
+    if base_dir in _BOOT_CACHE:
+        return _BOOT_CACHE[base_dir]
+    boot_path = os.path.join(base_dir, "configs", BOOT_FILE_NAME)
+    if not os.path.exists(boot_path):
+        return None
+    with open(boot_path, "r", encoding="utf-8") as f:
+        boot = json.load(f)
+    site_zip = boot["site_zip"]
+    if site_zip is None:
+        lib_path = os.path.join(base_dir, "Python", "Lib")
+        site_zip = [name for name in sorted(os.listdir(lib_path))
+                    if name.startswith("site-packages-") and name.endswith(".zip")] \
+            if os.path.exists(lib_path) else list()
+    boot["sys_path"] = _expand(base_dir, boot["sys_path"], site_zip)
+    boot["path_prefix"] = _expand(base_dir, boot["path_prefix"], site_zip)
+    boot["path_suffix"] = _expand(base_dir, boot["path_suffix"], site_zip)
+    boot["pythonpath"] = _expand(base_dir, boot["pythonpath"], site_zip)
+    _BOOT_CACHE[base_dir] = boot
+    return boot
+
+
+def get_boot_env_vars(boot: dict, environ=None) -> dict:
+    """
+    根据启动配置中的模板生成环境变量，与qpt.memory.get_env_vars的结果一致
+    :param boot: load_boot的返回值
+    :param environ: 当前环境变量，为None时使用os.environ
+    """
+    environ = os.environ if environ is None else environ
+    user_path = [pe for pe in environ.get("PATH", "").split(";")
+                 if pe and not any(ief in pe for ief in IGNORE_ENV_FIELD)]
+    env_vars = environ.copy()
+    env_vars["PATH"] = "".join(path + ";" for path in boot["path_prefix"] + user_path + boot["path_suffix"])
+    env_vars["PYTHONPATH"] = ";".join(boot["pythonpath"])
+    return env_vars
+
+
+def apply_boot_env(boot: dict):
+    """
+    将启动配置中的环境变量写入os.environ，同一进程中只写入一次，并同步至QPT_MEMORY供终端使用
+    :param boot: load_boot的返回值
+    """
+    from qpt.memory import QPT_MEMORY
+    if not boot.get("env_applied"):
+        os.environ.update(get_boot_env_vars(boot))
+        boot["env_applied"] = True
+    QPT_MEMORY.set_mem(name="get_env_vars", variable=os.environ.copy())
+
+
+def load_configs(config_path) -> dict:
+    """
+    读取配置信息，优先使用启动配置，旧版本的configs.txt使用ast.literal_eval安全解析
+    :param config_path: configs目录
+    """
+    boot = load_boot(os.path.dirname(os.path.abspath(config_path)))
+    if boot is not None:
+        return boot["configs"]
+    with open(os.path.join(config_path, LEGACY_CONFIG_FILE_NAME), "r", encoding="utf-8") as config_file:
+        configs = ast.literal_eval(config_file.read())
+    if isinstance(configs.get("local_uid"), bytes):
+        configs["local_uid"] = configs["local_uid"].decode("utf-8")
+    return configs
@@ -0,0 +1,556 @@
+"""
+动作缓存 - 以Pack OP的类名、参数、当前Python环境与输入文件的哈希值作为缓存键，OP输出的文件按内容哈希值存储
+命中缓存时直接将文件复制至Release目录并校验，无需再次执行OP
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import pickle
+import hashlib
+import platform
+import tempfile
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+from qpt.kernel.qlog import Logging
+from qpt.kernel.qos import get_qpt_tmp_path, get_file_hash
+from qpt.kernel.qevent import emit
+from qpt.kernel.qcache_server import CACHE_TOKEN_ENV
+from qpt.version import version as qpt_version
+
+# 设置为0后不使用动作缓存
+ACTION_CACHE_ENV = "QPT_ACTION_CACHE"
+# 远程缓存地址，例如http://192.168.1.2:8765，服务端可使用qpt.kernel.qcache_server
+REMOTE_CACHE_ENV = "QPT_REMOTE_CACHE"
+DEFAULT_REMOTE_WORKERS = 4
+REMOTE_TIMEOUT = 30
+ACTION_CACHE_DIR_NAME = "ActionCache"
+ACTION_CACHE_VERSION = 1
+CACHE_HASH_ALGORITHM = "sha256"
+HASH_INDEX_NAME = "hash_index.json"
+# 不参与缓存键计算的OP成员变量，均为prepare时设置的路径与终端
+CACHE_IGNORE_ATTRS = ["_interpreter_path", "_module_path", "_terminal", "_work_dir"]
+DEFAULT_CACHE_WORKERS = 4
+
+_DEFAULT_ACTION_CACHE = None
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# 远程缓存不可用时的异常，均视为未命中
+_REMOTE_ERRORS = (OSError, HTTPException, ValueError)
+
+
+def set_default_action_cache(cache):
+    """
+    设置打包时使用的动作缓存
+    :param cache: ActionCache对象，为None时不使用动作缓存
+    """
+    global _DEFAULT_ACTION_CACHE
+    _DEFAULT_ACTION_CACHE = cache
+
+
+def get_default_action_cache():
+    if os.getenv(ACTION_CACHE_ENV) == "0":
+        return None
+    return _DEFAULT_ACTION_CACHE
+
+
+def _place_file(src_file, dst_file, link=True):
+    """
+    以硬链接或复制的方式放置文件，先写入临时文件再替换，避免修改已存在文件所链接的源文件
+    :return: 后续文件是否继续尝试使用硬链接
+    """
+    tmp_file = dst_file + ".qpt_tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    if link:
+        try:
+            os.link(src_file, tmp_file)
+        except (OSError, NotImplementedError) as e:
+            Logging.debug("当前文件系统无法创建硬链接，已退化为复制：%s", e)
+            link = False
+    if not link:
+        shutil.copy2(src_file, tmp_file)
+    os.replace(tmp_file, dst_file)
+    return link
+
+
+def get_opt_key(opt, inputs: list = None, hash_file=None, workers=DEFAULT_CACHE_WORKERS):
+    """
+    计算OP的缓存键，由OP的类名、参数、当前Python环境与输入文件的哈希值决定
+    :param opt: SubModuleOpt对象
+    :param inputs: 输入文件或目录，目录中的文件会被递归计算
+    :param hash_file: 计算文件哈希值的函数，为None时直接计算
+    :param workers: 计算哈希值的线程数
+    :return: 缓存键，OP参数无法被序列化时返回None
+    """
+    if hash_file is None:
+        hash_file = partial(get_file_hash, algorithm=CACHE_HASH_ALGORITHM)
+    state = {k: v for k, v in opt.__dict__.items() if k not in CACHE_IGNORE_ATTRS}
+    try:
+        state_data = pickle.dumps(state, protocol=4)
+    except Exception as e:
+        Logging.debug("%s的参数无法被序列化，已跳过动作缓存：%s", opt.name, e)
+        return None
+    key = hashlib.sha256()
+    key.update(f"{ACTION_CACHE_VERSION}|{opt.__class__.__module__}.{opt.__class__.__qualname__}|"
+               f"{qpt_version}|{sys.version}|{platform.system()}|{platform.machine()}\n".encode("utf-8"))
+    key.update(state_data)
+    for path in inputs if inputs else list():
+        key.update(f"\n{path}|".encode("utf-8"))
+        if os.path.isfile(path):
+            key.update(hash_file(path).encode("utf-8"))
+        elif os.path.isdir(path):
+            files = list()
+            for root, dirs, names in os.walk(path):
+                files += [os.path.join(root, name) for name in names]
+            files.sort()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                hashes = list(pool.map(hash_file, files))
+            for file, file_hash in zip(files, hashes):
+                key.update(f"{os.path.relpath(file, path)}:{file_hash};".encode("utf-8"))
+        else:
+            key.update(b"missing")
+    return key.hexdigest()
+
+
+def _get_dist_name(dist_info_name):
+    """
+    获取.dist-info目录对应的包名，例如Foo_Bar-1.0.dist-info为foo-bar
+    """
+    return dist_info_name.split("-")[0].lower().replace("_", "-").replace(".", "-")
+
+
+def _is_valid_record(record) -> bool:
+    """
+    检查动作记录的格式，避免远程缓存中的记录将文件写入Module目录之外
+    """
+    if not isinstance(record, dict) or not isinstance(record.get("files"), list) \
+            or not isinstance(record.get("dirs"), list):
+        return False
+
+    def _is_safe(rel_path):
+        if not isinstance(rel_path, str) or not rel_path or os.path.isabs(rel_path) or ":" in rel_path:
+            return False
+        return ".." not in rel_path.replace("\\", "/").split("/")
+
+    for item in record["files"]:
+        if not (isinstance(item, list) and len(item) == 3 and isinstance(item[0], str) and _is_safe(item[0])
+                and isinstance(item[1], str) and _HASH_PATTERN.match(item[1]) and isinstance(item[2], int)):
+            return False
+    return all(_is_safe(rel_path) for rel_path in record["dirs"])
+
+
+class RemoteCache:
+    def __init__(self, base_url, workers=DEFAULT_REMOTE_WORKERS, timeout=REMOTE_TIMEOUT, upload=True, token=None):
+        """
+        使用HTTP GET/PUT访问的远程动作缓存，对象位于{base_url}/cas/<sha256>，动作记录位于{base_url}/ac/<缓存键>
+        :param base_url: 远程缓存地址
+        :param workers: 同时传输的最大文件数，多个OP同时访问时共用该限制
+        :param timeout: 单次请求的超时时间（秒）
+        :param upload: 是否上传本机生成的缓存，为False时仅下载
+        :param token: 共享口令，为None时读取QPT_REMOTE_CACHE_TOKEN环境变量
+        """
+        self.base_url = base_url.rstrip("/")
+        self.token = token if token else os.getenv(CACHE_TOKEN_ENV)
+        self.workers = workers
+        self.timeout = timeout
+        self.upload = upload
+        # 无法连接时不再访问远程缓存，避免每个OP都等待超时
+        self.available = True
+        self._semaphore = threading.BoundedSemaphore(max(1, workers))
+
+    def _request(self, method, path, data=None, headers=None):
+        headers = dict(headers) if headers else dict()
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = Request(self.base_url + path, data=data, method=method, headers=headers)
+        return urlopen(request, timeout=self.timeout)
+
+    def get_action(self, key):
+        """
+        :return: 动作记录，不存在或格式错误时返回None
+        """
+        try:
+            with self._semaphore, self._request("GET", f"/ac/{key}") as response:
+                record = json.loads(response.read().decode("utf-8"))
+        except HTTPError as e:
+            if e.code in [401, 403]:
+                if self.available:
+                    Logging.warning(f"远程缓存{self.base_url}拒绝访问，请检查{CACHE_TOKEN_ENV}环境变量：{e}")
+                self.available = False
+            elif e.code != 404:
+                Logging.debug("远程缓存读取失败：%s", e)
+            return None
+        except _REMOTE_ERRORS as e:
+            if self.available:
+                Logging.warning(f"无法访问远程缓存{self.base_url}，本次打包将仅使用本地缓存：{e}")
+            self.available = False
+            return None
+        return record if _is_valid_record(record) else None
+
+    def put_action(self, key, record: dict):
+        data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        with self._semaphore, self._request("PUT", f"/ac/{key}", data=data,
+                                            headers={"Content-Type": "application/json"}):
+            pass
+
+    def has_object(self, file_hash) -> bool:
+        try:
+            with self._semaphore, self._request("HEAD", f"/cas/{file_hash}"):
+                return True
+        except HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+
+    def get_object(self, file_hash, size, save_path):
+        """
+        下载对象并校验大小与sha256，校验通过后才会写入save_path
+        """
+        tmp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.part"
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        try:
+            file_hash_obj = hashlib.sha256()
+            written = 0
+            with self._semaphore, self._request("GET", f"/cas/{file_hash}") as response, \
+                    open(tmp_path, "wb") as f:
+                chunk = response.read(1024 * 1024)
+                while chunk:
+                    file_hash_obj.update(chunk)
+                    f.write(chunk)
+                    written += len(chunk)
+                    chunk = response.read(1024 * 1024)
+            if written != size or file_hash_obj.hexdigest() != file_hash:
+                raise IOError(f"远程缓存中的对象{file_hash}校验失败")
+            os.replace(tmp_path, save_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written
+
+    def put_object(self, file_hash, file_path):
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f, self._semaphore, \
+                self._request("PUT", f"/cas/{file_hash}", data=f,
+                              headers={"Content-Length": str(size), "Content-Type": "application/octet-stream"}):
+            pass
+        return size
+
+
+class ActionCache:
+    def __init__(self, cache_dir=None, link=True, workers=DEFAULT_CACHE_WORKERS, remote: RemoteCache = None):
+        """
+        :param cache_dir: 缓存目录，为None时使用QPT的临时目录
+        :param link: 存入缓存时是否使用硬链接，文件系统不支持时自动退化为复制。OP的临时输出目录会在存入后删除，
+                     放置至目标目录时始终复制，避免修改Release中的文件时损坏缓存
+        :param workers: 计算哈希值的线程数
+        :param remote: 远程缓存，本地未命中时从远程下载，本地生成的缓存会上传至远程
+        """
+        self.cache_dir = cache_dir if cache_dir else get_qpt_tmp_path(ACTION_CACHE_DIR_NAME)
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        self.actions_dir = os.path.join(self.cache_dir, "actions")
+        self.tmp_dir = os.path.join(self.cache_dir, "tmp")
+        for path in [self.objects_dir, self.actions_dir, self.tmp_dir]:
+            os.makedirs(path, exist_ok=True)
+        self.link = link
+        self.workers = workers
+        self.remote = remote
+        self._lock = threading.Lock()
+        # 输入文件的哈希值索引，文件大小与修改时间未变化时不再重复计算
+        self._hash_index_path = os.path.join(self.cache_dir, HASH_INDEX_NAME)
+        self._hash_index = dict()
+        if os.path.exists(self._hash_index_path):
+            try:
+                with open(self._hash_index_path, "r", encoding="utf-8") as f:
+                    self._hash_index = json.load(f)
+            except (OSError, ValueError):
+                self._hash_index = dict()
+
+    def get_object_path(self, file_hash):
+        return os.path.join(self.objects_dir, file_hash[:2], file_hash)
+
+    def get_action_path(self, key):
+        return os.path.join(self.actions_dir, key[:2], key + ".json")
+
+    def hash_file(self, file_path):
+        """
+        计算输入文件的哈希值
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        mark = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            item = self._hash_index.get(file_path)
+        if item is not None and item[:2] == mark:
+            return item[2]
+        file_hash = get_file_hash(file_path, algorithm=CACHE_HASH_ALGORITHM)
+        with self._lock:
+            self._hash_index[file_path] = mark + [file_hash]
+        return file_hash
+
+    def _save_hash_index(self):
+        with self._lock:
+            data = json.dumps(self._hash_index, ensure_ascii=False)
+        tmp_path = self._hash_index_path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self._hash_index_path)
+
+    def get_key(self, opt, inputs: list = None):
+        """
+        计算缓存键，输入文件的哈希值会被记录，文件未变化时不再重复计算
+        """
+        return get_opt_key(opt, inputs, hash_file=self.hash_file, workers=self.workers)
+
+    def load_action(self, key):
+        action_path = self.get_action_path(key)
+        if not os.path.exists(action_path):
+            return None
+        try:
+            with open(action_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_action(self, key, record: dict):
+        action_path = self.get_action_path(key)
+        os.makedirs(os.path.dirname(action_path), exist_ok=True)
+        tmp_path = action_path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, action_path)
+
+    def has_object(self, file_hash, size):
+        object_path = self.get_object_path(file_hash)
+        return os.path.exists(object_path) and os.path.getsize(object_path) == size
+
+    def _copy_object(self, file_hash, dst_file):
+        """
+        将对象复制至dst_file并校验哈希值，损坏的对象会被删除
+        :return: 对象是否完好
+        """
+        object_path = self.get_object_path(file_hash)
+        file_hash_obj = hashlib.sha256()
+        with open(object_path, "rb") as src, open(dst_file, "wb") as dst:
+            chunk = src.read(1024 * 1024)
+            while chunk:
+                file_hash_obj.update(chunk)
+                dst.write(chunk)
+                chunk = src.read(1024 * 1024)
+        shutil.copystat(object_path, dst_file)
+        if file_hash_obj.hexdigest() == file_hash:
+            return True
+        Logging.warning(f"动作缓存中的对象{file_hash}已损坏，已删除该对象")
+        try:
+            os.remove(object_path)
+        except OSError:
+            pass
+        return False
+
+    def get_conflicts(self, record: dict, dst_dir) -> list:
+        """
+        检查目标目录中是否已存在同名但版本不同的Python包，例如多个OP使用pip --target安装的依赖存在重叠，
+        此时逐文件覆盖会产生同一个包的多个.dist-info目录
+        :return: 目标目录中冲突的.dist-info目录，相对于dst_dir
+        """
+        dist_infos = dict()
+        for rel_path in [item[0] for item in record["files"]] + record["dirs"]:
+            parts = rel_path.split("/")
+            for i, part in enumerate(parts):
+                if part.endswith(".dist-info"):
+                    dist_infos.setdefault("/".join(parts[:i]), set()).add(part)
+                    break
+        conflicts = list()
+        for parent, names in dist_infos.items():
+            parent_path = os.path.join(dst_dir, parent)
+            if not os.path.isdir(parent_path):
+                continue
+            dist_names = {_get_dist_name(name) for name in names}
+            for name in os.listdir(parent_path):
+                if name.endswith(".dist-info") and name not in names and _get_dist_name(name) in dist_names:
+                    conflicts.append(f"{parent}/{name}".strip("/"))
+        return conflicts
+
+    def store(self, src_dir) -> dict:
+        """
+        将目录中的文件按内容哈希值存入缓存
+        :param src_dir: OP的输出目录
+        :return: 文件记录，格式为{"files": [[相对路径, 哈希值, 大小], ...], "dirs": [空目录的相对路径, ...]}
+        """
+        files = list()
+        dirs = list()
+        for root, dir_names, names in os.walk(src_dir):
+            if not dir_names and not names and root != src_dir:
+                dirs.append(os.path.relpath(root, src_dir).replace("\\", "/"))
+            files += [os.path.join(root, name) for name in names]
+        files.sort()
+
+        def _store_file(file):
+            file_hash = get_file_hash(file, algorithm=CACHE_HASH_ALGORITHM)
+            size = os.path.getsize(file)
+            if not self.has_object(file_hash, size):
+                object_path = self.get_object_path(file_hash)
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                _place_file(file, object_path, link=self.link)
+            return [os.path.relpath(file, src_dir).replace("\\", "/"), file_hash, size]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            items = list(pool.map(_store_file, files))
+        return {"files": items, "dirs": sorted(dirs)}
+
+    def restore(self, record: dict, dst_dir, check_only=False) -> bool:
+        """
+        将缓存中的文件复制至目标目录，复制时校验哈希值
+        :param record: store返回的文件记录
+        :param dst_dir: 目标目录，通常为Release目录
+        :param check_only: 仅检查缓存中的文件是否完整，不放置文件
+        :return: 缓存中的文件是否完整，不完整或已损坏时不会修改目标目录中的文件
+        """
+        if not all(self.has_object(file_hash, size) for _, file_hash, size in record["files"]):
+            return False
+        if check_only:
+            return True
+        made_dirs = set()
+        for rel_path in record["dirs"]:
+            os.makedirs(os.path.join(dst_dir, rel_path), exist_ok=True)
+        for rel_path, _, _ in record["files"]:
+            parent = os.path.dirname(os.path.join(dst_dir, rel_path))
+            if parent not in made_dirs:
+                os.makedirs(parent, exist_ok=True)
+                made_dirs.add(parent)
+
+        # 先全部写入临时文件，校验通过后再替换
+        tmp_files = [os.path.join(dst_dir, rel_path) + ".qpt_tmp" for rel_path, _, _ in record["files"]]
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(self._copy_object, [item[1] for item in record["files"]], tmp_files))
+            if not all(results):
+                return False
+            for (rel_path, _, _), tmp_file in zip(record["files"], tmp_files):
+                os.replace(tmp_file, os.path.join(dst_dir, rel_path))
+        finally:
+            for tmp_file in tmp_files:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+        return True
+
+    def fetch_remote(self, key):
+        """
+        从远程缓存下载动作记录及本地缺少的对象，下载失败时视为未命中
+        :return: 动作记录，未命中时返回None
+        """
+        record = self.remote.get_action(key)
+        if record is None:
+            return None
+        missing = dict()
+        for _, file_hash, size in record["files"]:
+            if not self.has_object(file_hash, size):
+                missing[file_hash] = size
+        try:
+            with ThreadPoolExecutor(max_workers=self.remote.workers) as pool:
+                sizes = list(pool.map(lambda item: self.remote.get_object(item[0], item[1],
+                                                                          self.get_object_path(item[0])),
+                                      missing.items()))
+        except _REMOTE_ERRORS as e:
+            Logging.warning(f"远程缓存下载失败，将重新执行OP：{e}")
+            return None
+        emit("remote_fetch", key=key, files=len(sizes), bytes=sum(sizes))
+        self.save_action(key, record)
+        return record
+
+    def upload_remote(self, key, record: dict):
+        """
+        上传远程缓存中缺少的对象，全部上传成功后再上传动作记录，上传失败不影响打包
+        """
+        if not self.remote.upload:
+            return
+        try:
+            def _upload(item):
+                if self.remote.has_object(item[1]):
+                    return 0
+                return self.remote.put_object(item[1], self.get_object_path(item[1]))
+
+            unique_items = list({item[1]: item for item in record["files"]}.values())
+            with ThreadPoolExecutor(max_workers=self.remote.workers) as pool:
+                sizes = list(pool.map(_upload, unique_items))
+            self.remote.put_action(key, record)
+        except HTTPError as e:
+            if e.code in [401, 403]:
+                # 只读或口令错误的远程缓存，本次打包不再上传
+                self.remote.upload = False
+                Logging.warning(f"远程缓存拒绝上传，本次打包将仅从远程缓存下载：{e}")
+            else:
+                Logging.warning(f"上传远程缓存失败：{e}")
+            return
+        except _REMOTE_ERRORS as e:
+            Logging.warning(f"上传远程缓存失败：{e}")
+            return
+        emit("remote_upload", key=key, files=sum(1 for size in sizes if size), bytes=sum(sizes))
+
+    def _run_in_place(self, opt, run_func, dst_dir, key, record):
+        """
+        输出与目标目录中已有的包存在冲突时，直接在目标目录中执行OP，由OP自身处理已有文件
+        """
+        conflicts = self.get_conflicts(record, dst_dir)
+        Logging.debug("%s的输出与%s存在冲突，将直接在目标目录中执行", opt.name, ", ".join(conflicts))
+        emit("cache_skip", name=opt.name, key=key, conflicts=conflicts)
+        run_func(dst_dir)
+        self._save_hash_index()
+        return False
+
+    def run(self, opt, run_func, dst_dir, output_dirs: list = None, inputs: list = None) -> bool:
+        """
+        使用动作缓存执行OP，未命中时OP会在临时目录中执行，其输出存入缓存后再放置于目标目录
+        :param opt: SubModuleOpt对象
+        :param run_func: 执行OP的函数，参数为OP所使用的Module目录
+        :param dst_dir: 目标目录，通常为Release目录
+        :param output_dirs: 需在临时目录中预先创建的输出目录，相对于Module目录
+        :param inputs: 参与缓存键计算的输入文件或目录
+        :return: 是否命中缓存
+        """
+        key = self.get_key(opt, inputs)
+        if key is None:
+            run_func(dst_dir)
+            return False
+        record = self.load_action(key)
+        use_remote = self.remote is not None and self.remote.available
+        if (record is None or not self.restore(record, dst_dir, check_only=True)) and use_remote:
+            record = self.fetch_remote(key)
+        if record is not None and self.get_conflicts(record, dst_dir):
+            return self._run_in_place(opt, run_func, dst_dir, key, record)
+        if record is not None and self.restore(record, dst_dir):
+            size = sum(item[2] for item in record["files"])
+            Logging.info(f"{opt.name}命中动作缓存，已复用{len(record['files'])}个文件，共{size / 1024 / 1024:.2f}MB")
+            emit("cache_hit", name=opt.name, key=key, files=len(record["files"]), bytes=size)
+            self._save_hash_index()
+            return True
+
+        emit("cache_miss", name=opt.name, key=key)
+        staging_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        try:
+            for rel_path in output_dirs if output_dirs else list():
+                os.makedirs(os.path.join(staging_dir, rel_path), exist_ok=True)
+            run_func(staging_dir)
+            record = self.store(staging_dir)
+            record["op"] = f"{opt.__class__.__module__}.{opt.__class__.__qualname__}"
+            self.save_action(key, record)
+            conflict = bool(self.get_conflicts(record, dst_dir))
+            if not conflict and not self.restore(record, dst_dir):
+                # 缓存中已存在的同名对象已损坏并被删除，重新存入后再放置
+                self.store(staging_dir)
+                if not self.restore(record, dst_dir):
+                    raise IOError(f"{opt.name}的输出无法写入动作缓存，请检查{self.cache_dir}")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        if self.remote is not None and self.remote.available:
+            self.upload_remote(key, record)
+        if conflict:
+            return self._run_in_place(opt, run_func, dst_dir, key, record)
+        self._save_hash_index()
+        return False
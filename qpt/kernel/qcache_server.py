@@ -0,0 +1,143 @@
+"""
+远程动作缓存的参考服务端 - 以目录存储对象与动作记录，仅支持GET、HEAD与PUT，适用于局域网共享与测试
+    python -m qpt.kernel.qcache_server --dir D:/qpt_cache --port 8765
+对象：/cas/<sha256>，上传时校验内容的sha256；动作记录：/ac/<缓存键>
+动作记录决定了其它机器放置至Release中的文件，默认仅监听127.0.0.1。在局域网中共享时请通过--token或QPT_REMOTE_CACHE_TOKEN
+环境变量设置共享口令，客户端需设置相同的QPT_REMOTE_CACHE_TOKEN；仅供下载的节点可使用--read-only拒绝全部上传
+"""
+
+import os
+import re
+import hmac
+import hashlib
+import argparse
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_CACHE_SERVER_PORT = 8765
+# 共享口令，设置后全部请求均需携带Authorization: Bearer <口令>
+CACHE_TOKEN_ENV = "QPT_REMOTE_CACHE_TOKEN"
+# 单个请求体的最大大小
+MAX_UPLOAD_SIZE = 4 * 1024 * 1024 * 1024
+_PATH_PATTERN = re.compile(r"^/(cas|ac)/([0-9a-f]{64})$")
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    def __init__(self, *args, directory=None, token=None, read_only=False, **kwargs):
+        self.directory = os.path.abspath(directory)
+        self.token = token
+        self.read_only = read_only
+        super().__init__(*args, **kwargs)
+
+    def _check_token(self):
+        if not self.token:
+            return True
+        if hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            return True
+        self._send_empty(401)
+        return False
+
+    def _get_file(self):
+        match = _PATH_PATTERN.match(self.path)
+        if match is None:
+            return None, None
+        kind, name = match.groups()
+        return kind, os.path.join(self.directory, kind, name[:2], name)
+
+    def _send_empty(self, code):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_file(self, with_body):
+        _, file_path = self._get_file()
+        if file_path is None:
+            return self._send_empty(400)
+        if not os.path.isfile(file_path):
+            return self._send_empty(404)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(os.path.getsize(file_path)))
+        self.end_headers()
+        if with_body:
+            with open(file_path, "rb") as f:
+                chunk = f.read(1024 * 1024)
+                while chunk:
+                    self.wfile.write(chunk)
+                    chunk = f.read(1024 * 1024)
+
+    def do_GET(self):
+        if self._check_token():
+            self._send_file(with_body=True)
+
+    def do_HEAD(self):
+        if self._check_token():
+            self._send_file(with_body=False)
+
+    def do_PUT(self):
+        if not self._check_token():
+            return
+        if self.read_only:
+            return self._send_empty(403)
+        kind, file_path = self._get_file()
+        length = int(self.headers.get("Content-Length", -1))
+        if file_path is None or not 0 <= length <= MAX_UPLOAD_SIZE:
+            return self._send_empty(400)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        file_hash = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as f:
+                remain = length
+                while remain > 0:
+                    chunk = self.rfile.read(min(remain, 1024 * 1024))
+                    if not chunk:
+                        break
+                    file_hash.update(chunk)
+                    f.write(chunk)
+                    remain -= len(chunk)
+            # 对象需与其名称的sha256一致，动作记录允许被覆盖
+            if remain != 0 or (kind == "cas" and file_hash.hexdigest() != os.path.basename(file_path)):
+                return self._send_empty(400)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._send_empty(201)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_cache_server(directory,
+                      host="127.0.0.1",
+                      port=DEFAULT_CACHE_SERVER_PORT,
+                      token=None,
+                      read_only=False) -> ThreadingHTTPServer:
+    """
+    创建远程缓存服务，需调用serve_forever启动
+    :param directory: 存储目录
+    :param host: 监听地址，默认仅本机可访问
+    :param port: 监听端口，为0时自动分配
+    :param token: 共享口令，为None时不校验
+    :param read_only: 是否拒绝全部上传
+    """
+    os.makedirs(directory, exist_ok=True)
+    return ThreadingHTTPServer((host, port),
+                               partial(CacheRequestHandler, directory=directory, token=token, read_only=read_only))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="QPT远程动作缓存的参考服务端")
+    parser.add_argument("--dir", required=True, help="存储目录")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，局域网共享时可设置为0.0.0.0，此时请同时设置--token")
+    parser.add_argument("--port", type=int, default=DEFAULT_CACHE_SERVER_PORT, help="监听端口")
+    parser.add_argument("--token", default=os.getenv(CACHE_TOKEN_ENV), help=f"共享口令，默认读取{CACHE_TOKEN_ENV}环境变量")
+    parser.add_argument("--read-only", action="store_true", help="仅提供下载，拒绝全部上传")
+    args = parser.parse_args()
+    if args.host not in ["127.0.0.1", "localhost", "::1"] and not args.token and not args.read_only:
+        print("警告：当前未设置共享口令，网络中的任何设备均可写入动作记录，请使用--token或--read-only")
+    server = make_cache_server(args.dir, host=args.host, port=args.port, token=args.token, read_only=args.read_only)
+    print(f"远程缓存服务已启动：http://{args.host}:{server.server_port}，存储目录：{os.path.abspath(args.dir)}")
+    server.serve_forever()
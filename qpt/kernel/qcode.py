@@ -42,6 +42,7 @@ except ImportError:
 
 from qpt.memory import QPT_MEMORY, PYTHON_IGNORE_DIRS, IGNORE_PACKAGES
 from qpt.kernel.qlog import TProgressBar
+from qpt.kernel.qignore import get_default_matcher, scan_tree
 
 PACKAGE_FLAG = ".dist-info"
 
@@ -157,12 +158,11 @@ class PythonPackages:
         """
         import_modules = set()
         file_path_list = list()
-        for root, dirs, files in os.walk(path):
-            if not (os.path.basename(root) in PYTHON_IGNORE_DIRS or "site-packages" in root):
-                for file in files:
-                    if os.path.splitext(file)[-1] == ".py":
-                        file_path = os.path.join(root, file)
-                        file_path_list.append(file_path)
+        matcher = get_default_matcher()
+        matcher.add_patterns([ignore_dir + "/" for ignore_dir in PYTHON_IGNORE_DIRS] + ["site-packages/"])
+        for rel_path, entry in scan_tree(path, matcher):
+            if os.path.splitext(entry.name)[-1] == ".py":
+                file_path_list.append(entry.path)
 
         tpb = TProgressBar("正在搜索依赖", max_len=len(file_path_list))
         for file_path in file_path_list:
@@ -0,0 +1,104 @@
+"""
+依赖图调度器 - 依赖已完成且资源空闲的节点会被并行执行，同时满足条件时按节点的添加顺序执行
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List
+
+DEFAULT_DAG_WORKERS = 4
+
+
+class DAGNode:
+    def __init__(self, name, func: Callable, depends: List[str] = None, resources: List[str] = None):
+        """
+        :param name: 节点名，需唯一
+        :param func: 执行函数，无参数
+        :param depends: 需在该节点之前完成的节点名，不存在的节点名会被忽略
+        :param resources: 资源标记，使用相同标记的节点不会同时执行，除非在limits中为该标记设置了更高的并发数
+        """
+        self.name = name
+        self.func = func
+        self.depends = list(depends) if depends else list()
+        self.resources = list(resources) if resources else list()
+
+
+def run_dag(nodes: List[DAGNode],
+            workers: int = DEFAULT_DAG_WORKERS,
+            limits: Dict[str, int] = None,
+            on_start: Callable = None,
+            on_done: Callable = None):
+    """
+    执行依赖图，任一节点抛出异常时不再启动新的节点，等待执行中的节点结束后抛出该异常
+    :param nodes: 节点列表，列表顺序即同时满足执行条件时的优先顺序
+    :param workers: 最大并发数
+    :param limits: 各资源标记的最大并发数，未设置的标记为1
+    :param on_start: 节点开始执行时的回调，参数为节点名与执行中的节点名列表
+    :param on_done: 节点执行完毕时的回调，参数为节点名与执行中的节点名列表
+    """
+    limits = limits if limits else dict()
+    names = set(node.name for node in nodes)
+    assert len(names) == len(nodes), "依赖图中存在重名节点"
+    depends = {node.name: set(d for d in node.depends if d in names and d != node.name) for node in nodes}
+    _check_cycle(nodes, depends)
+
+    pending = list(nodes)
+    done = set()
+    running = dict()
+    used = dict()
+    lock = threading.Lock()
+    error = None
+
+    def _ready(node):
+        if not depends[node.name] <= done:
+            return False
+        return all(used.get(r, 0) < limits.get(r, 1) for r in node.resources)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            while error is None and len(running) < workers:
+                node = next((n for n in pending if _ready(n)), None)
+                if node is None:
+                    break
+                pending.remove(node)
+                for r in node.resources:
+                    used[r] = used.get(r, 0) + 1
+                with lock:
+                    running[pool.submit(node.func)] = node
+                    in_flight = [n.name for n in running.values()]
+                if on_start:
+                    on_start(node.name, in_flight)
+            if not running:
+                break
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                with lock:
+                    node = running.pop(future)
+                    in_flight = [n.name for n in running.values()]
+                for r in node.resources:
+                    used[r] -= 1
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                done.add(node.name)
+                if on_done:
+                    on_done(node.name, in_flight)
+    if error is not None:
+        raise error
+
+
+def _check_cycle(nodes, depends):
+    state = dict()
+
+    def _visit(name, chain):
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError("依赖图中存在循环依赖：" + " -> ".join(chain + [name]))
+        state[name] = 1
+        for d in depends[name]:
+            _visit(d, chain + [name])
+        state[name] = 2
+
+    for node in nodes:
+        _visit(node.name, list())
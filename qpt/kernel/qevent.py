@@ -0,0 +1,119 @@
+"""
+构建事件 - 打包过程中以NDJSON格式输出阶段起止、OP耗时、复制/下载字节数、缓存命中情况以及警告与错误，便于构建系统调度与分析
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+from qpt.kernel.qlog import logger
+
+# 设置后打包时将构建事件写入该位置，可为文件路径或“fd:3”形式的文件描述符
+BUILD_EVENT_ENV = "QPT_BUILD_EVENTS"
+
+_COLOR_PATTERN = re.compile(r"\033\[[0-9;]*m")
+_OUTPUT = None
+_LOCK = threading.Lock()
+
+
+class EventLogHandler(logging.Handler):
+    """
+    将警告与错误日志同步写入构建事件
+    """
+
+    def emit(self, record):
+        try:
+            msg = _COLOR_PATTERN.sub("", record.getMessage()).strip()
+        except Exception:
+            return
+        emit(record.levelname.lower(), msg=msg)
+
+
+_LOG_HANDLER = EventLogHandler(level=logging.WARNING)
+
+
+def set_event_output(target):
+    """
+    设置构建事件的输出位置
+    :param target: 文件路径、“fd:N”形式的文件描述符，为None或空字符串时关闭输出
+    """
+    global _OUTPUT
+    with _LOCK:
+        if _OUTPUT is not None:
+            _OUTPUT.close()
+            _OUTPUT = None
+        if target:
+            if str(target).startswith("fd:"):
+                _OUTPUT = os.fdopen(int(target[3:]), "w", encoding="utf-8", buffering=1, closefd=False)
+            else:
+                _OUTPUT = open(target, "a", encoding="utf-8", buffering=1)
+    if _OUTPUT is not None:
+        if _LOG_HANDLER not in logger.handlers:
+            logger.addHandler(_LOG_HANDLER)
+    elif _LOG_HANDLER in logger.handlers:
+        logger.removeHandler(_LOG_HANDLER)
+
+
+def is_event_enabled():
+    return _OUTPUT is not None
+
+
+def emit(event, **fields):
+    """
+    写入一条构建事件，未设置输出位置时不执行任何操作
+    :param event: 事件类型，如phase_start、op_end、copy、download、warning
+    :param fields: 事件内容，需可被JSON序列化
+    """
+    if _OUTPUT is None:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "pid": os.getpid()}
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _LOCK:
+        if _OUTPUT is not None:
+            _OUTPUT.write(line)
+
+
+class _Phase:
+    __slots__ = ("name", "kind", "fields", "start")
+
+    def __init__(self, name, kind, fields):
+        self.name = name
+        self.kind = kind
+        self.fields = fields
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        emit(self.kind + "_start", name=self.name, **self.fields)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        fields = dict(self.fields, dur=round(time.perf_counter() - self.start, 3))
+        if exc_type is None:
+            fields["status"] = "ok"
+        else:
+            fields["status"] = "error"
+            fields["error"] = f"{exc_type.__name__}: {exc_val}"
+        emit(self.kind + "_end", name=self.name, **fields)
+        return False
+
+
+def phase(name, kind="phase", **fields):
+    """
+    记录代码块的起止时间，结束事件中包含耗时（秒）与执行状态
+    Example:
+        with phase("manifest"):
+            ...
+    :param name: 名称
+    :param kind: 事件类型前缀，起止事件分别为{kind}_start与{kind}_end
+    :param fields: 额外信息
+    """
+    return _Phase(name, kind, fields)
+
+
+if os.getenv(BUILD_EVENT_ENV):
+    set_event_output(os.getenv(BUILD_EVENT_ENV))
@@ -0,0 +1,226 @@
+import os
+import json
+import shutil
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from urllib.error import URLError
+from typing import List
+
+from qpt.kernel.qlog import Logging
+from qpt.kernel.qos import get_file_hash
+
+# 在线模式下的清单文件名，保存于configs目录
+ONLINE_MANIFEST_NAME = "online_manifest.json"
+# 可通过环境变量临时替换清单中的下载地址，例如指向局域网内的镜像
+ONLINE_URL_ENV = "QPT_ONLINE_URL"
+# 可通过环境变量指定共享缓存目录，默认位于%LOCALAPPDATA%/QPT/store，同一用户的多个程序共用
+STORE_ENV = "QPT_STORE"
+
+# 单个分段的大小，各分段通过Range请求并行下载
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_FETCH_WORKERS = 8
+FETCH_RETRY = 3
+FETCH_TIMEOUT = 30
+# 需与PowerShell的Get-FileHash保持一致，故使用sha256
+HASH_ALGORITHM = "sha256"
+
+
+def get_store_path():
+    """
+    获取当前用户的共享缓存目录，文件以sha256命名，不同程序中相同的解释器与依赖包只需下载一次
+    """
+    store_path = os.getenv(STORE_ENV)
+    if not store_path:
+        base = os.getenv("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".qpt")
+        store_path = os.path.join(base, "QPT", "store")
+    os.makedirs(store_path, exist_ok=True)
+    return store_path
+
+
+def get_store_file(sha256, store_path=None):
+    store_path = store_path if store_path else get_store_path()
+    return os.path.join(store_path, sha256[:2], sha256)
+
+
+class FetchItem:
+    def __init__(self, url, sha256, size=None):
+        """
+        :param url: 下载地址
+        :param sha256: 文件的sha256，下载完毕后校验
+        :param size: 文件大小，为None时通过请求获取
+        """
+        self.url = url
+        self.sha256 = sha256.lower()
+        self.size = size
+        # 服务端是否支持Range请求，不支持时退化为单线程下载
+        self.ranges = True
+
+
+def _probe(item: FetchItem):
+    request = Request(item.url, headers={"Range": "bytes=0-0"})
+    with urlopen(request, timeout=FETCH_TIMEOUT) as response:
+        if response.status == 206:
+            size = int(response.headers["Content-Range"].rsplit("/", 1)[-1])
+        else:
+            item.ranges = False
+            size = int(response.headers["Content-Length"])
+    if item.size is not None and item.size != size:
+        raise IOError(f"{item.url}的大小为{size}，与清单中的{item.size}不一致")
+    item.size = size
+
+
+def _fetch_segment(item: FetchItem, part_path, start, end):
+    headers = {"Range": f"bytes={start}-{end}"} if item.ranges else dict()
+    error = None
+    for _ in range(FETCH_RETRY):
+        try:
+            written = 0
+            with urlopen(Request(item.url, headers=headers), timeout=FETCH_TIMEOUT) as response, \
+                    open(part_path, "r+b") as part_file:
+                part_file.seek(start)
+                chunk = response.read(64 * 1024)
+                while chunk:
+                    part_file.write(chunk)
+                    written += len(chunk)
+                    chunk = response.read(64 * 1024)
+            if written != end - start + 1:
+                raise IOError(f"分段{start}-{end}仅接收到{written}字节")
+            return written
+        except (URLError, OSError) as e:
+            error = e
+    raise IOError(f"{item.url}的分段{start}-{end}下载失败：{error}")
+
+
+def fetch_files(items: List[FetchItem],
+                store_path=None,
+                workers=DEFAULT_FETCH_WORKERS,
+                segment_size=DEFAULT_SEGMENT_SIZE,
+                callback=None) -> List[str]:
+    """
+    将文件下载至共享缓存，所有文件的分段共用一个线程池，已存在于缓存中的文件不会被重复下载
+    :param items: 待下载的文件
+    :param store_path: 共享缓存目录
+    :param workers: 线程数
+    :param segment_size: 分段大小
+    :param callback: 每下载完一个分段后调用，参数为已下载字节数与总字节数
+    :return: 与items一一对应的缓存文件路径
+    """
+    store_path = store_path if store_path else get_store_path()
+    store_files = [get_store_file(item.sha256, store_path) for item in items]
+    pending = dict()
+    for item, store_file in zip(items, store_files):
+        if item.sha256 in pending:
+            continue
+        if os.path.exists(store_file) and (item.size is None or os.path.getsize(store_file) == item.size):
+            continue
+        pending[item.sha256] = item
+    if not pending:
+        return store_files
+
+    lock = threading.Lock()
+    progress = [0, 0]
+
+    def _on_segment(future):
+        if future.exception() is None:
+            with lock:
+                progress[0] += future.result()
+                if callback:
+                    callback(progress[0], progress[1])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(_probe, item) for item in pending.values()]:
+            future.result()
+        progress[1] = sum(item.size for item in pending.values())
+
+        tasks = list()
+        for item in pending.values():
+            store_file = get_store_file(item.sha256, store_path)
+            os.makedirs(os.path.dirname(store_file), exist_ok=True)
+            part_path = f"{store_file}.{os.getpid()}.part"
+            with open(part_path, "wb") as part_file:
+                part_file.truncate(item.size)
+            step = segment_size if item.ranges else max(item.size, 1)
+            futures = list()
+            for start in range(0, item.size, step):
+                future = pool.submit(_fetch_segment, item, part_path, start, min(start + step, item.size) - 1)
+                future.add_done_callback(_on_segment)
+                futures.append(future)
+            tasks.append((item, part_path, store_file, futures))
+
+        try:
+            for item, part_path, store_file, futures in tasks:
+                for future in futures:
+                    future.result()
+                file_hash = get_file_hash(part_path, algorithm=HASH_ALGORITHM)
+                if file_hash != item.sha256:
+                    raise IOError(f"{item.url}校验失败，期望的sha256为{item.sha256}，实际为{file_hash}")
+                os.replace(part_path, store_file)
+        finally:
+            for item, part_path, store_file, futures in tasks:
+                for future in futures:
+                    future.cancel()
+                if os.path.exists(part_path):
+                    try:
+                        os.remove(part_path)
+                    except OSError:
+                        pass
+    return store_files
+
+
+def place_file(store_file, dst):
+    """
+    将缓存中的文件放置于目标位置，优先使用硬链接以避免占用双倍硬盘空间
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(store_file, dst)
+    except OSError:
+        shutil.copyfile(store_file, dst)
+
+
+def load_online_manifest(config_path):
+    """
+    读取在线模式的清单
+    :param config_path: configs目录
+    :return: 清单，若不存在则返回None
+    """
+    manifest_path = os.path.join(config_path, ONLINE_MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def fetch_online_release(module_path, base_url=None, workers=DEFAULT_FETCH_WORKERS, callback=None) -> int:
+    """
+    根据在线模式的清单下载缺失的文件，下载的文件会被放置或解压至Release目录
+    :param module_path: Release目录
+    :param base_url: 下载地址，为None时使用环境变量或清单中的地址
+    :param workers: 线程数
+    :param callback: 同fetch_files
+    :return: 本次放置的文件数量
+    """
+    manifest = load_online_manifest(os.path.join(module_path, "configs"))
+    if manifest is None:
+        return 0
+    base_url = (base_url or os.getenv(ONLINE_URL_ENV) or manifest["base_url"]).rstrip("/")
+    entries = [entry for entry in manifest["files"]
+               if not os.path.exists(os.path.join(module_path, entry["check"]))]
+    if not entries:
+        return 0
+    Logging.info(f"正在从{base_url}下载{len(entries)}个文件，"
+                 f"共{sum(entry['size'] for entry in entries) / 1024 / 1024:.2f}MB")
+    items = [FetchItem(base_url + "/" + entry["name"], entry["sha256"], entry["size"]) for entry in entries]
+    store_files = fetch_files(items, workers=workers, callback=callback)
+    for entry, store_file in zip(entries, store_files):
+        dst = os.path.join(module_path, entry["dst"])
+        if entry["extract"]:
+            with zipfile.ZipFile(store_file) as zip_obj:
+                zip_obj.extractall(dst)
+        else:
+            place_file(store_file, dst)
+    return len(entries)
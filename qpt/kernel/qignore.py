@@ -0,0 +1,246 @@
+import os
+import re
+from typing import List
+
+from qpt.kernel.qlog import Logging
+
+# 忽略规则文件名，规则语法与.gitignore一致
+QPT_IGNORE_FILE = ".qptignore"
+GIT_IGNORE_FILE = ".gitignore"
+
+# 默认忽略的目录
+DEFAULT_IGNORE_PATTERNS = [".git/",
+                           ".github/",
+                           ".idea/",
+                           "__pycache__/",
+                           "node_modules/",
+                           "*.qpt_trash_*/"]
+
+# 存在该文件的目录会被视为Python虚拟环境
+VENV_FLAG_FILE = "pyvenv.cfg"
+
+
+def _translate(pattern: str) -> str:
+    """
+    将单条gitignore风格的规则转换为正则表达式（不包含首尾锚点）
+    :param pattern: 已去除取反符号与结尾/的规则
+    :return: 正则表达式字符串
+    """
+    i, n = 0, len(pattern)
+    res = ""
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern[i:i + 3] == "**/":
+                # **/ 匹配零至多级目录
+                res += "(?:.*/)?"
+                i += 3
+                continue
+            if pattern[i:i + 2] == "**":
+                res += ".*"
+                i += 2
+                continue
+            res += "[^/]*"
+        elif c == "?":
+            res += "[^/]"
+        elif c == "[":
+            j = pattern.find("]", i + 1)
+            if j == -1:
+                res += re.escape(c)
+            else:
+                stuff = pattern[i + 1:j]
+                if stuff[:1] == "!":
+                    stuff = "^" + stuff[1:]
+                res += "[" + stuff.replace("\\", "\\\\") + "]"
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            res += re.escape(pattern[i])
+        else:
+            res += re.escape(c)
+        i += 1
+    return res
+
+
+class IgnoreRule:
+    def __init__(self, regex: str, negate=False, dir_only=False):
+        self.regex = regex
+        self.pattern = re.compile(regex)
+        self.negate = negate
+        self.dir_only = dir_only
+
+
+class IgnoreMatcher:
+    """
+    gitignore风格的忽略规则匹配器，所有路径均为相对于扫描根目录、以/分隔的相对路径
+
+    Example:
+        matcher = IgnoreMatcher(["*.log", "build/", "!keep.log"])
+        matcher.match("a/b.log", is_dir=False)
+        Out: True
+    """
+
+    def __init__(self, patterns: List[str] = None, ignore_file_names: List[str] = None):
+        """
+        :param patterns: 初始规则
+        :param ignore_file_names: 扫描时需要自动加载的规则文件名，例如[".qptignore"]
+        """
+        self.rules = list()
+        self.ignore_file_names = ignore_file_names if ignore_file_names else list()
+        self._compiled = None
+        if patterns:
+            self.add_patterns(patterns)
+
+    def add_patterns(self, patterns: List[str], base: str = ""):
+        """
+        添加gitignore风格的规则
+        :param patterns: 规则列表
+        :param base: 规则所在目录相对于扫描根目录的路径，根目录为空字符串
+        """
+        base = base.replace("\\", "/").strip("/")
+        base = "" if base == "." else base
+        prefix = re.escape(base + "/") if base else ""
+        for line in patterns:
+            line = line.rstrip("\n").rstrip("\r")
+            # 未被转义的结尾空格需要去除
+            while line.endswith(" ") and not line.endswith("\\ "):
+                line = line[:-1]
+            if not line or line.startswith("#"):
+                continue
+            negate = False
+            if line.startswith("!"):
+                negate = True
+                line = line[1:]
+            elif line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # 含有/的规则相对于规则文件所在目录，否则可匹配任意层级
+            if "/" in line:
+                regex = prefix + _translate(line.lstrip("/"))
+            else:
+                regex = prefix + "(?:.*/)?" + _translate(line)
+            # 目录被匹配后其内部文件同样被忽略
+            if dir_only:
+                self.rules.append(IgnoreRule("^" + regex + "/.+$", negate=negate))
+                self.rules.append(IgnoreRule("^" + regex + "$", negate=negate, dir_only=True))
+            else:
+                self.rules.append(IgnoreRule("^" + regex + "(?:/.*)?$", negate=negate))
+        self._compiled = None
+
+    def add_paths(self, rel_paths: List[str], dir_only=False):
+        """
+        添加按字面匹配的路径规则，适用于ignore_dirs等绝对路径转换而来的规则
+        :param rel_paths: 相对于扫描根目录的路径列表
+        :param dir_only: 是否只匹配文件夹
+        """
+        for rel_path in rel_paths:
+            rel_path = rel_path.replace("\\", "/").strip("/")
+            if not rel_path or rel_path == "." or rel_path.startswith(".."):
+                continue
+            if dir_only:
+                self.rules.append(IgnoreRule("^" + re.escape(rel_path) + "/.+$"))
+            self.rules.append(IgnoreRule("^" + re.escape(rel_path) + "$", dir_only=dir_only))
+        self._compiled = None
+
+    def load_file(self, file_path: str, base: str = ""):
+        """
+        读取规则文件
+        :param file_path: 规则文件路径
+        :param base: 规则文件所在目录相对于扫描根目录的路径
+        """
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            self.add_patterns(file.readlines(), base=base)
+
+    def copy(self):
+        matcher = IgnoreMatcher(ignore_file_names=list(self.ignore_file_names))
+        matcher.rules = list(self.rules)
+        return matcher
+
+    def _compile(self):
+        # 没有取反规则时可合并为单个正则表达式，避免逐条匹配
+        if any(rule.negate for rule in self.rules):
+            self._compiled = False
+        else:
+            file_rules = [rule.regex for rule in self.rules if not rule.dir_only]
+            all_rules = [rule.regex for rule in self.rules]
+            self._compiled = (re.compile("|".join(file_rules)) if file_rules else None,
+                              re.compile("|".join(all_rules)) if all_rules else None)
+
+    def match(self, rel_path: str, is_dir=False) -> bool:
+        """
+        判断路径是否需要被忽略
+        :param rel_path: 相对于扫描根目录的路径
+        :param is_dir: 该路径是否为文件夹
+        :return: 是否忽略
+        """
+        if self._compiled is None:
+            self._compile()
+        rel_path = rel_path.replace("\\", "/")
+        if self._compiled:
+            regex = self._compiled[1] if is_dir else self._compiled[0]
+            return bool(regex and regex.match(rel_path))
+        # 存在取反规则时，以最后一条匹配的规则为准
+        for rule in reversed(self.rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.pattern.match(rel_path):
+                return not rule.negate
+        return False
+
+
+def get_default_matcher(use_gitignore=False) -> IgnoreMatcher:
+    """
+    获取打包时默认使用的忽略规则
+    :param use_gitignore: 是否同时读取.gitignore中的规则
+    """
+    ignore_file_names = [GIT_IGNORE_FILE, QPT_IGNORE_FILE] if use_gitignore else [QPT_IGNORE_FILE]
+    return IgnoreMatcher(DEFAULT_IGNORE_PATTERNS, ignore_file_names=ignore_file_names)
+
+
+def scan_tree(src, matcher: IgnoreMatcher = None, skip_venv=True):
+    """
+    使用os.scandir遍历目录树，被忽略的目录不会被进入
+    :param src: 扫描的根目录
+    :param matcher: 忽略规则，扫描过程中会自动加载其ignore_file_names对应的规则文件
+    :param skip_venv: 是否跳过Python虚拟环境
+    :return: 生成器，元素为(相对路径, os.DirEntry)，只包含文件
+    """
+    if matcher is None:
+        matcher = IgnoreMatcher()
+    elif matcher.ignore_file_names:
+        # 加载规则文件时会修改规则列表，避免影响外部对象
+        matcher = matcher.copy()
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(src, rel_dir)) as it:
+                entries = list(it)
+        except OSError as e:
+            Logging.warning(f"无法读取{os.path.abspath(os.path.join(src, rel_dir))}，已跳过该目录：{e}")
+            continue
+        names = [entry.name for entry in entries]
+        if rel_dir and skip_venv and VENV_FLAG_FILE in names:
+            Logging.warning(f"检测到{VENV_FLAG_FILE}，推测出{os.path.abspath(os.path.join(src, rel_dir))}"
+                            f"为Python虚拟环境主目录，在打包时会忽略该目录")
+            continue
+        for ignore_file_name in matcher.ignore_file_names:
+            if ignore_file_name in names:
+                matcher.load_file(os.path.join(src, rel_dir, ignore_file_name), base=rel_dir)
+        sub_dirs = list()
+        for entry in entries:
+            rel_path = rel_dir + "/" + entry.name if rel_dir else entry.name
+            is_dir = entry.is_dir()
+            if matcher.match(rel_path, is_dir=is_dir):
+                if is_dir:
+                    Logging.debug(f"已忽略目录{rel_path}")
+                continue
+            if is_dir:
+                sub_dirs.append(rel_path)
+            else:
+                yield rel_path, entry
+        # 逆序入栈以保证按目录顺序遍历
+        stack.extend(reversed(sub_dirs))
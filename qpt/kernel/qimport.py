@@ -0,0 +1,203 @@
+"""
+导入记录器 - 记录程序运行期间加载的模块、扩展以及读取的文件，用于打包时的动态裁剪
+该文件会在用户程序的进程中被导入，请勿在顶层导入qpt.kernel.qlog以外的QPT模块
+用法：python -m qpt.kernel.qimport 记录文件保存路径 主程序.py [主程序参数]
+"""
+
+import os
+import sys
+import json
+import runpy
+import atexit
+import threading
+
+# 设置该环境变量后，RunExecutableModule会在导入记录器下启动主程序，值为记录文件保存路径
+IMPORT_TRACE_ENV = "QPT_TRACE_IMPORT"
+# 可选，设置后将执行该脚本（相对于resources目录）作为冒烟测试，而非主程序
+IMPORT_TRACE_SCRIPT_ENV = "QPT_TRACE_SCRIPT"
+
+# 被使用的包中以下类型的文件始终保留，例如由系统加载器隐式加载、无法被记录的动态链接库
+SHAKE_KEEP_EXTENSIONS = {".dll", ".so", ".pth", ".manifest"}
+SHAKE_REPORT_NAME = "tree_shaking_report.txt"
+
+
+class ImportRecorder:
+    """
+    sys.meta_path中的记录器，本身不负责查找模块，仅按顺序记录被导入的模块名
+    同时通过审计钩子记录open与ctypes.dlopen事件
+    """
+
+    def __init__(self, save_path, interval=2.):
+        self.save_path = save_path
+        self.interval = interval
+        self.modules = list()
+        self._module_set = set()
+        self.files = set()
+        self._lock = threading.Lock()
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in self._module_set:
+            self._module_set.add(fullname)
+            self.modules.append(fullname)
+        return None
+
+    def audit_hook(self, event, args):
+        if event == "open":
+            path = args[0]
+            if isinstance(path, str):
+                self.files.add(path)
+        elif event == "ctypes.dlopen":
+            if isinstance(args[0], str):
+                self.files.add(args[0])
+
+    def dump(self):
+        files = set(self.files)
+        for module in list(sys.modules.values()):
+            file = getattr(module, "__file__", None)
+            if isinstance(file, str):
+                files.add(file)
+        files = sorted(os.path.abspath(file) for file in files if os.path.isfile(file))
+        with self._lock:
+            tmp_path = self.save_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"modules": list(self.modules), "files": files}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.save_path)
+
+    def _loop(self):
+        # 冒烟测试可能在超时后被强制结束，故定时写入记录文件
+        event = threading.Event()
+        while not event.wait(self.interval):
+            self.dump()
+
+    def start(self):
+        sys.meta_path.insert(0, self)
+        if hasattr(sys, "addaudithook"):
+            sys.addaudithook(self.audit_hook)
+        atexit.register(self.dump)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+
+def load_trace(trace_path):
+    """
+    读取记录文件
+    :return: 按导入顺序排列的模块名列表，以及被加载或读取的文件绝对路径集合
+    """
+    with open(trace_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["modules"], set(data["files"])
+
+
+def _module_key(rel_path):
+    """
+    将源码、pyc与扩展模块统一为模块路径，例如a/__pycache__/b.cpython-38.pyc、a/b.py与a/b.cp38-win_amd64.pyd均为a/b
+    """
+    rel_dir, name = os.path.split(rel_path)
+    if os.path.basename(rel_dir) == "__pycache__":
+        rel_dir = os.path.dirname(rel_dir)
+    name = name.split(".")[0]
+    return (rel_dir + "/" + name).strip("/")
+
+
+def shake_site_packages(site_packages_path,
+                        traced_site_packages_path,
+                        trace_path,
+                        keep_entries=None,
+                        keep_patterns=None,
+                        report_path=None) -> dict:
+    """
+    根据导入记录删除site-packages中未被使用的子模块与数据文件
+    :param site_packages_path: 需要裁剪的site-packages目录，通常位于Release中
+    :param traced_site_packages_path: 冒烟测试时所使用的site-packages目录，通常位于Debug中
+    :param trace_path: 记录文件路径
+    :param keep_entries: 不参与裁剪的site-packages顶层文件或目录名，例如QPT运行时所需的包
+    :param keep_patterns: 额外需要保留的文件，gitignore风格的规则，路径相对于site-packages
+    :param report_path: 报告保存路径，报告中包含全部被删除的文件
+    :return: 各顶层包被删除的大小，格式{顶层名: 字节数}
+    """
+    from qpt.kernel.qignore import IgnoreMatcher
+    from qpt.kernel.qlog import Logging
+
+    _, files = load_trace(trace_path)
+    traced_root = os.path.normcase(os.path.abspath(traced_site_packages_path))
+    used_keys = set()
+    used_tops = set()
+    for file in files:
+        file = os.path.normcase(file)
+        if not file.startswith(traced_root + os.sep):
+            continue
+        rel_path = os.path.relpath(file, traced_root).replace("\\", "/")
+        # Windows下路径不区分大小写，统一使用小写比较
+        used_keys.add(_module_key(rel_path).lower())
+        used_tops.add(rel_path.split("/")[0].split(".")[0].lower())
+
+    keep_entries = set(os.path.normcase(e) for e in (keep_entries or list()))
+    candidates = list()
+    for entry in os.listdir(site_packages_path):
+        if os.path.normcase(entry) in keep_entries or entry.endswith(".dist-info") or entry.endswith(".egg-info"):
+            continue
+        entry_path = os.path.join(site_packages_path, entry)
+        if os.path.isfile(entry_path):
+            candidates.append(entry)
+            continue
+        for root, dirs, names in os.walk(entry_path):
+            for name in names:
+                candidates.append(os.path.relpath(os.path.join(root, name), site_packages_path).replace("\\", "/"))
+    # 被额外保留的文件所在的包同样视为被使用，以保留其__init__等文件
+    if keep_patterns:
+        matcher = IgnoreMatcher(keep_patterns)
+        for rel_path in candidates:
+            if matcher.match(rel_path):
+                used_keys.add(_module_key(rel_path).lower())
+                used_tops.add(rel_path.split("/")[0].split(".")[0].lower())
+
+    removed = dict()
+    removed_files = list()
+    for rel_path in candidates:
+        if _module_key(rel_path).lower() in used_keys:
+            continue
+        top = rel_path.split("/")[0].split(".")[0]
+        name = rel_path.split("/")[-1]
+        ext = os.path.splitext(name)[-1].lower()
+        # .pth文件位于site-packages顶层，在解释器启动时由site模块处理
+        if ext == ".pth" and "/" not in rel_path:
+            continue
+        if top.lower() in used_tops and (ext in SHAKE_KEEP_EXTENSIONS or name.startswith("__init__.")):
+            continue
+        file_path = os.path.join(site_packages_path, rel_path)
+        removed[top] = removed.get(top, 0) + os.path.getsize(file_path)
+        removed_files.append(rel_path)
+        os.remove(file_path)
+    # 由深至浅清理空目录
+    for root, dirs, names in os.walk(site_packages_path, topdown=False):
+        if root != site_packages_path and not os.listdir(root):
+            os.rmdir(root)
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(removed_files))
+    total = sum(removed.values())
+    Logging.info(f"动态裁剪完毕，共删除{len(removed_files)}个文件，减少{total / 1024 / 1024:.2f}MB，各包减少的大小如下：")
+    for top, size in sorted(removed.items(), key=lambda x: x[1], reverse=True):
+        Logging.info(f"{top.ljust(30)}\t{size / 1024:.1f}KB")
+    return removed
+
+
+def run_script(trace_path, script_path, argv=None):
+    """
+    在导入记录器下执行脚本
+    :param trace_path: 记录文件保存路径
+    :param script_path: 脚本路径
+    :param argv: 脚本参数
+    """
+    recorder = ImportRecorder(trace_path)
+    recorder.start()
+    sys.argv = [script_path] + (argv if argv else list())
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    finally:
+        recorder.dump()
+
+
+if __name__ == '__main__':
+    run_script(sys.argv[1], sys.argv[2], sys.argv[3:])
@@ -7,6 +7,7 @@ from collections import OrderedDict
 
 from qpt.kernel.qos import dynamic_load_package, get_qpt_tmp_path, ArgManager
 from qpt.kernel.qlog import clean_stout, Logging
+from qpt.kernel.qevent import emit, phase, is_event_enabled
 from qpt.kernel.qterminal import PTerminal, TerminalCallback, LoggingTerminalCallback
 from qpt.kernel.qcode import PythonPackages
 
@@ -28,6 +29,9 @@ DISPLAY_ONLINE_INSTALL = "online_install"  # 在线安装
 DISPLAY_LOCAL_INSTALL = "local_install"  # 本地下载后安装
 DISPLAY_SETUP_INSTALL = "setup_install"  # 直接安装
 
+# 裁剪时保留该包，可与上述指令同时使用，例如 numpy #$QPT_FLAG$ copy trim_keep=tests/,*.pyi
+TRIM_KEEP_FLAG = "trim_keep"
+
 
 class DisplayFlag(dict):
     def __init__(self):
@@ -46,7 +50,7 @@ class DisplayFlag(dict):
             return item
         else:
             for flag in self.keys():
-                if flag in item:
+                if flag is not None and flag in item:
                     return flag
             return None
 
@@ -68,7 +72,7 @@ class PIPTerminal(PTerminal):
             closure_shell = self.head + closure_shell
             if closure_shell[1:3] == ":\\":
                 closure_shell = f"cd {closure_shell[:2]} ;" + closure_shell
-            Logging.debug(f"SHELL: {closure_shell}")
+            Logging.debug("SHELL: %s", closure_shell)
             closure_shell = f'{closure_shell}; echo "---QPT OUTPUT STATUS CODE---" ;$? \n'
             # 发送指令
             try:
@@ -108,6 +112,30 @@ def analysis_requirement_line(name: str):
     return name, version, display
 
 
+def analysis_trim_keep(display):
+    """
+    从特殊操作指令中分离trim_keep指令
+    :param display: #$QPT_FLAG$之后的指令
+    :return: 剩余的指令（为空时返回None），以及需要保留的规则列表（未设置trim_keep时返回None）
+    """
+    if not display:
+        return display, None
+    trim_keep = None
+    others = list()
+    for token in display.split():
+        if token == TRIM_KEEP_FLAG or token.startswith(TRIM_KEEP_FLAG + "="):
+            trim_keep = [p for p in token.split("=", 1)[1].split(",") if p] if "=" in token else list()
+        else:
+            others.append(token)
+    return (" ".join(others) if others else None), trim_keep
+
+
+def _get_dir_files(path) -> dict:
+    if not os.path.isdir(path):
+        return dict()
+    return {entry.name: entry.stat().st_size for entry in os.scandir(path) if entry.is_file()}
+
+
 class PipTools:
     """
     Python解释器管理器
@@ -177,7 +205,8 @@ class PipTools:
         else:
             opts += ["-i", self.source]
 
-        self.pip_shell(str(opts))
+        with phase(act.split(" ")[0], kind="pip", package=package):
+            self.pip_shell(str(opts))
 
     def download_package(self,
                          package: str,
@@ -197,12 +226,22 @@ class PipTools:
 
         # pip download xxx -d ./test
         # pip install xxx -f ./test --no-deps
+        before = _get_dir_files(save_path) if is_event_enabled() else None
         self.pip_package_shell(package=package,
                                version=version,
                                act="download",
                                no_dependent=no_dependent,
                                find_links=find_links,
                                opts=opts)
+        if before is not None:
+            # 目录中已存在所需文件时pip不会重复下载，记为缓存命中
+            new_files = {k: v for k, v in _get_dir_files(save_path).items() if k not in before}
+            emit("download",
+                 package=package,
+                 version=version,
+                 files=len(new_files),
+                 bytes=sum(new_files.values()),
+                 cache_hit=not new_files)
 
     def install_local_package(self,
                               package: str,
@@ -291,9 +330,12 @@ class PipTools:
                     if "#" == line[0]:
                         continue
                     package, version, display = analysis_requirement_line(line)
+                    display, trim_keep = analysis_trim_keep(display)
                     requirements[package] = {"version": version,
                                              "display": display_flag.get_flag(display),
                                              "QPT_Flag": True if display else False}
+                    if trim_keep is not None:
+                        requirements[package]["trim_keep"] = trim_keep
         except Exception as e:
             raise Exception(f"{file_path}文件解析失败，文件可能被其他程序占用或格式异常\n"
                             f"报错信息如下：{e}")
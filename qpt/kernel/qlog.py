@@ -1,7 +1,11 @@
 import logging
 import os
+import queue
+import atexit
+import threading
 
-__all__ = ["Logging", "change_none_color", "clean_stout", "TProgressBar", "set_logger_file"]
+__all__ = ["Logging", "change_none_color", "clean_stout", "TProgressBar", "set_logger_file", "AsyncLogWriter",
+           "clean_old_logs", "SummaryBuffer"]
 
 formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
 logger = logging.getLogger("qpt_logger")
@@ -24,8 +28,128 @@ st_handler.terminator = ""
 logger.addHandler(st_handler)
 
 
+# 单个日志文件的大小上限，超出后的内容将被丢弃
+LOG_MAX_BYTES = 10 * 1024 * 1024
+# 保留最近的运行次数，首次运行的日志始终保留
+LOG_KEEP_RUNS = 20
+# 日志队列长度，队列已满时丢弃新的内容而非阻塞调用方
+LOG_QUEUE_SIZE = 10000
+# 后台线程单次最多合并写入的条数
+LOG_BATCH_SIZE = 512
+LOG_FLUSH_INTERVAL = 0.5
+
+
+class AsyncLogWriter:
+    """
+    后台线程批量写入的日志文件，write仅将内容放入队列，不会因磁盘写入阻塞调用方
+    """
+
+    def __init__(self, file_path, max_bytes=LOG_MAX_BYTES, queue_size=LOG_QUEUE_SIZE):
+        """
+        :param file_path: 日志文件路径
+        :param max_bytes: 文件大小上限，超出后的内容将被丢弃
+        :param queue_size: 队列长度
+        """
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        # 文件仅由写入线程使用，并在线程退出时关闭
+        self._file = open(file_path, "w", encoding="utf-8")
+        self._thread = threading.Thread(target=self._loop, name="QPTLogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text):
+        if not text or self._closed:
+            return
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        pass
+
+    def _write_batch(self, batch):
+        if self.dropped:
+            batch.insert(0, f"\n[日志队列已满，丢弃了{self.dropped}条内容]\n")
+            self.dropped = 0
+        data = "".join(batch)
+        # 按UTF-8编码后的字节数计算文件大小
+        size = len(data.encode("utf-8"))
+        if self.written + size > self.max_bytes:
+            if self.written >= self.max_bytes:
+                return
+            # 截断时丢弃不完整的多字节字符
+            data = data.encode("utf-8")[:self.max_bytes - self.written].decode("utf-8", errors="ignore")
+            data += f"\n[日志已超过{self.max_bytes / 1024 / 1024:.1f}MB，后续内容不再记录]\n"
+            size = len(data.encode("utf-8"))
+        self._file.write(data)
+        self._file.flush()
+        self.written += size
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            try:
+                batch = [self._queue.get(timeout=LOG_FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # None为close放入的结束标记
+            if None in batch:
+                stop = True
+                batch = batch[:batch.index(None)]
+            if batch:
+                self._write_batch(batch)
+        self._file.close()
+
+    def close(self):
+        """
+        通知写入线程写完队列中的内容后关闭文件，最多等待5秒，超时后文件由写入线程在退出时关闭
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=5)
+        except queue.Full:
+            return
+        self._thread.join(timeout=5)
+
+
+def clean_old_logs(log_dir, keep_runs=LOG_KEEP_RUNS):
+    """
+    删除较早的日志，同一次运行的QPT-与APP-日志视为一组，首次运行的日志始终保留
+    :param log_dir: 日志目录
+    :param keep_runs: 保留最近的运行次数
+    """
+    if not os.path.exists(log_dir):
+        return
+    runs = dict()
+    for name in os.listdir(log_dir):
+        if name[:4] in ["QPT-", "APP-"] and not name[4:].startswith("First-"):
+            mtime = os.path.getmtime(os.path.join(log_dir, name))
+            runs.setdefault(name[4:], [0, list()])
+            runs[name[4:]][0] = max(runs[name[4:]][0], mtime)
+            runs[name[4:]][1].append(name)
+    for _, names in sorted(runs.values(), reverse=True)[keep_runs:]:
+        for name in names:
+            try:
+                os.remove(os.path.join(log_dir, name))
+            except OSError:
+                pass
+
+
 def set_logger_file(file_path):
-    f_handler = logging.FileHandler(file_path, "w", encoding="utf-8")
+    f_handler = logging.StreamHandler(AsyncLogWriter(file_path))
     f_handler.setLevel(logging.DEBUG)
     f_handler.setFormatter(formatter)
     f_handler.terminator = ""
@@ -39,11 +163,69 @@ def clean_stout(name_list: list):
             logging.root.removeHandler(header)
 
 
-WARNING_SUMMARY = list()
-ERROR_SUMMARY = list()
+# 警告与报错摘要最多保留的条数与单条长度，超出的部分仅计数
+SUMMARY_MAX_ITEMS = 100
+SUMMARY_MAX_LEN = 2000
+
+
+class SummaryBuffer:
+    """
+    有上限的摘要缓存，len为收到的总条数，迭代时仅包含最早的SUMMARY_MAX_ITEMS条
+    """
+
+    def __init__(self, max_items=SUMMARY_MAX_ITEMS):
+        self.max_items = max_items
+        self.items = list()
+        self.count = 0
+
+    def append(self, msg):
+        self.count += 1
+        if len(self.items) < self.max_items:
+            if len(msg) > SUMMARY_MAX_LEN:
+                msg = msg[:SUMMARY_MAX_LEN] + "..."
+            self.items.append(msg)
+
+    def copy(self):
+        buffer = SummaryBuffer(self.max_items)
+        buffer.items = list(self.items)
+        buffer.count = self.count
+        return buffer
+
+    def clear(self):
+        self.items.clear()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+WARNING_SUMMARY = SummaryBuffer()
+ERROR_SUMMARY = SummaryBuffer()
+
+
+def _format(msg, args):
+    """
+    延迟格式化，仅在日志会被输出时执行
+    :param msg: 字符串，或返回字符串的无参函数
+    :param args: %格式化参数
+    """
+    if callable(msg):
+        msg = msg()
+    elif args:
+        msg = msg % args
+    return msg
 
 
 class BaseLogging:
+    # 各级别日志的颜色，为None时不添加颜色
+    INFO_COLOR = None
+    DEBUG_COLOR = None
+    WARNING_COLOR = None
+    ERROR_COLOR = None
+
     @staticmethod
     def final(clear=True):
         """
@@ -56,6 +238,8 @@ class BaseLogging:
         Logging.info("-" * 10 + "ERROR SUMMARY  ")
         for msg in ERROR_SUMMARY:
             Logging.info(msg)
+        if len(ERROR_SUMMARY) > ERROR_SUMMARY.max_items or len(WARNING_SUMMARY) > WARNING_SUMMARY.max_items:
+            Logging.info(f"仅展示前{SUMMARY_MAX_ITEMS}条，完整信息请查看日志")
         Logging.info("-" * 10 + f"生成状态WARNING:{len(WARNING_SUMMARY)} ERROR:{len(ERROR_SUMMARY)}")
         flag = ERROR_SUMMARY.copy()
         if clear:
@@ -70,65 +254,53 @@ class BaseLogging:
     def flush():
         st_handler.flush()
 
-
-class LoggingColor(BaseLogging):
-    @staticmethod
-    def info(msg: str, line_feed=True):
-        msg = "\033[34m" + msg + "\033[0m"
+    @classmethod
+    def _emit(cls, level, color, msg, args, line_feed, summary=None):
+        # 先判断级别再格式化，QPT_MODE=Run时debug日志几乎没有开销
+        if summary is None and not logger.isEnabledFor(level):
+            return
+        msg = _format(msg, args)
+        if color:
+            msg = color + msg + "\033[0m"
+        if summary is not None:
+            summary.append(f"{len(summary)}|{msg}")
         if line_feed:
             msg += "\n"
-        logger.info(msg)
+        logger.log(level, msg)
 
-    @staticmethod
-    def debug(msg: str, line_feed=True):
-        msg = "\033[35m" + msg + "\033[0m"
-        if line_feed:
-            msg += "\n"
-        logger.debug(msg)
+    @classmethod
+    def info(cls, msg, *args, line_feed=True):
+        """
+        :param msg: 日志内容，可为包含%占位符的字符串或返回字符串的无参函数，仅在需要输出时才会被格式化
+        :param args: %格式化参数
+        :param line_feed: 是否换行
+        """
+        cls._emit(logging.INFO, cls.INFO_COLOR, msg, args, line_feed)
 
-    @staticmethod
-    def warning(msg: str, line_feed=True):
-        msg = "\033[33m" + msg + "\033[0m"
-        WARNING_SUMMARY.append(f"{len(WARNING_SUMMARY)}|{msg}")
-        if line_feed:
-            msg += "\n"
-        logger.warning(msg)
+    @classmethod
+    def debug(cls, msg, *args, line_feed=True):
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        cls._emit(logging.DEBUG, cls.DEBUG_COLOR, msg, args, line_feed)
 
-    @staticmethod
-    def error(msg: str, line_feed=True):
-        msg = "\033[41m" + msg + "\033[0m"
-        ERROR_SUMMARY.append(f"{len(WARNING_SUMMARY)}|{msg}")
-        if line_feed:
-            msg += "\n"
-        logger.error(msg)
+    @classmethod
+    def warning(cls, msg, *args, line_feed=True):
+        cls._emit(logging.WARNING, cls.WARNING_COLOR, msg, args, line_feed, summary=WARNING_SUMMARY)
 
+    @classmethod
+    def error(cls, msg, *args, line_feed=True):
+        cls._emit(logging.ERROR, cls.ERROR_COLOR, msg, args, line_feed, summary=ERROR_SUMMARY)
 
-class LoggingNoneColor(BaseLogging):
-    @staticmethod
-    def info(msg: str, line_feed=True):
-        if line_feed:
-            msg += "\n"
-        logger.info(msg)
 
-    @staticmethod
-    def debug(msg: str, line_feed=True):
-        if line_feed:
-            msg += "\n"
-        logger.debug(msg)
+class LoggingColor(BaseLogging):
+    INFO_COLOR = "\033[34m"
+    DEBUG_COLOR = "\033[35m"
+    WARNING_COLOR = "\033[33m"
+    ERROR_COLOR = "\033[41m"
 
-    @staticmethod
-    def warning(msg: str, line_feed=True):
-        if line_feed:
-            msg += "\n"
-        logger.warning(msg)
-        WARNING_SUMMARY.append(f"{len(WARNING_SUMMARY)}|{msg}\n")
 
-    @staticmethod
-    def error(msg: str, line_feed=True):
-        if line_feed:
-            msg += "\n"
-        logger.error(msg)
-        ERROR_SUMMARY.append(f"{len(WARNING_SUMMARY)}|{msg}\n")
+class LoggingNoneColor(BaseLogging):
+    pass
 
 
 def change_none_color():
@@ -147,34 +319,30 @@ class TProgressBar:
     def __init__(self,
                  msg: str = "",
                  max_len: int = 100):
+        """
+        终端进度条，step仅累加计数，由qpt.kernel.qprogress中的进度总线按固定间隔合并输出
+        :param msg: 进度条标题
+        :param max_len: 步数+1
+        """
+        from qpt.kernel.qprogress import PROGRESS_BUS
         self.count = 0
         self.msg = msg
         self.max_len = max_len - 1
-        self.block = 20
-        self.with_logging = True
-        Logging.info("", line_feed=False)
-        Logging.flush()
+        self.task = PROGRESS_BUS.open_task(msg, self.max_len)
 
-    def step(self, add_start_info="", add_end_info=""):
-        self.count += 1
-        if self.max_len == 0:
-            block_str = "|" + "".join(['━'] * int(self.block)).ljust(self.block, " ") + "|"
-            Logging.info("\r" +
-                         self.msg +
-                         f"\r1/1 {add_start_info} {block_str} {100:.2f}% " +
-                         add_end_info,
-                         line_feed=False)
-        else:
-            rate = self.count / self.max_len
-
-            block_str = "|" + "".join(['━'] * int(rate * self.block)).ljust(self.block, " ") + "|"
-            block = f"{block_str}"
-            Logging.info("\r" +
-                         self.msg +
-                         f"\t{self.count}/{self.max_len} {add_start_info} {block} {rate * 100:.2f}% " +
-                         add_end_info,
-                         line_feed=False)
-        Logging.flush()
-        if self.count == self.max_len:
-            Logging.info("", line_feed=True)
-            Logging.flush()
+    def step(self, add_start_info="", add_end_info="", nbytes=0, n=1):
+        """
+        :param add_start_info: 附加信息
+        :param add_end_info: 附加信息
+        :param nbytes: 本步处理的字节数，用于计算MB/s
+        :param n: 本次完成的步数
+        """
+        self.count += n
+        info = f"{add_start_info} {add_end_info}".strip() if add_start_info or add_end_info else None
+        self.task.update(n=n, nbytes=nbytes, info=info)
+
+    def close(self):
+        """
+        提前结束进度条，未完成全部步数时调用以输出最终状态
+        """
+        self.task.close()
@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from qpt.kernel.qlog import Logging, TProgressBar
+from qpt.kernel.qos import get_file_hash
+from qpt.kernel.qignore import IgnoreMatcher, scan_tree
+
+# 清单文件保存在configs目录下
+MANIFEST_FILE_NAME = "manifest.txt"
+MANIFEST_HEAD = "# QPT Release Manifest V1 - hash size mtime path"
+
+# 清单中不记录的目录，configs目录中的日志等文件会在运行时发生变化
+MANIFEST_IGNORE_PATTERNS = ["/configs/"]
+
+# 校验等级
+VERIFY_NONE = "none"  # 不校验
+VERIFY_QUICK = "quick"  # 单次scandir检查文件是否存在以及大小、修改时间是否一致，适合每次启动时执行
+VERIFY_FULL = "full"  # 并行重新计算哈希值，仅报告不一致的文件
+
+# 校验不一致的原因
+MISMATCH_MISSING = "missing"
+MISMATCH_SIZE = "size"
+MISMATCH_MTIME = "mtime"
+MISMATCH_HASH = "hash"
+
+
+def _get_workers(workers=None):
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4)
+    return workers
+
+
+class ManifestItem:
+    def __init__(self, rel_path: str, size: int, mtime: int, file_hash: str = None):
+        self.rel_path = rel_path
+        self.size = size
+        self.mtime = mtime
+        self.file_hash = file_hash
+
+
+def make_manifest(root, save_path, ignore_patterns: List[str] = None, workers=None) -> List[ManifestItem]:
+    """
+    为目录生成完整性清单，哈希值通过线程池并行计算
+    :param root: 需要记录的目录，通常为Release目录
+    :param save_path: 清单保存路径
+    :param ignore_patterns: 额外不记录的文件，gitignore风格的规则
+    :param workers: 计算哈希值的线程数
+    :return: 清单内容
+    """
+    items = list()
+    matcher = IgnoreMatcher(MANIFEST_IGNORE_PATTERNS + (ignore_patterns if ignore_patterns else list()))
+    for rel_path, entry in scan_tree(root, matcher):
+        stat = entry.stat()
+        items.append(ManifestItem(rel_path, stat.st_size, int(stat.st_mtime)))
+
+    progressbar = TProgressBar(msg="正在生成文件清单", max_len=len(items) + 1)
+
+    def hash_item(item):
+        item.file_hash = get_file_hash(os.path.join(root, item.rel_path))
+        progressbar.step(nbytes=item.size)
+
+    with ThreadPoolExecutor(max_workers=_get_workers(workers)) as pool:
+        list(pool.map(hash_item, items))
+
+    with open(save_path, "w", encoding="utf-8") as file:
+        file.write(MANIFEST_HEAD + "\n")
+        for item in items:
+            file.write(f"{item.file_hash}\t{item.size}\t{item.mtime}\t{item.rel_path}\n")
+    return items
+
+
+def load_manifest(manifest_path) -> List[ManifestItem]:
+    """
+    读取完整性清单
+    :param manifest_path: 清单路径
+    :return: 清单内容
+    """
+    items = list()
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line[:1] == "#" or not line.strip():
+                continue
+            file_hash, size, mtime, rel_path = line.rstrip("\n").split("\t", 3)
+            items.append(ManifestItem(rel_path, int(size), int(mtime), file_hash))
+    return items
+
+
+def _mtime_match(expect, actual):
+    """
+    解压软件写入的修改时间精度为2秒，且可能存在时区偏移（以半小时为单位），上述情况均视为一致
+    """
+    diff = abs(int(expect) - int(actual))
+    if diff <= 2:
+        return True
+    offset = diff % 1800
+    return diff <= 14 * 3600 and min(offset, 1800 - offset) <= 2
+
+
+def verify_manifest(root, manifest_path, mode=VERIFY_QUICK, workers=None) -> List[tuple]:
+    """
+    根据完整性清单校验目录
+    :param root: 需要校验的目录
+    :param manifest_path: 清单路径
+    :param mode: 校验等级，VERIFY_QUICK或VERIFY_FULL
+    :param workers: 完整校验时计算哈希值的线程数
+    :return: 不一致的文件列表，元素为(相对路径, 原因)
+    """
+    if mode == VERIFY_NONE:
+        return list()
+    items = load_manifest(manifest_path)
+
+    # 按目录分组，每个目录只需一次scandir
+    dir_items = dict()
+    for item in items:
+        rel_dir, name = os.path.split(item.rel_path.replace("/", os.sep))
+        dir_items.setdefault(rel_dir, dict())[name] = item
+
+    mismatches = list()
+    stat_ok_items = list()
+    for rel_dir, name_items in dir_items.items():
+        stats = dict()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as it:
+                for entry in it:
+                    if entry.name in name_items:
+                        stats[entry.name] = entry.stat()
+        except OSError:
+            pass
+        for name, item in name_items.items():
+            stat = stats.get(name)
+            if stat is None:
+                mismatches.append((item.rel_path, MISMATCH_MISSING))
+            elif stat.st_size != item.size:
+                mismatches.append((item.rel_path, MISMATCH_SIZE))
+            elif mode == VERIFY_QUICK and not _mtime_match(item.mtime, stat.st_mtime):
+                mismatches.append((item.rel_path, MISMATCH_MTIME))
+            else:
+                stat_ok_items.append(item)
+
+    if mode == VERIFY_FULL:
+        def check_hash(item):
+            if get_file_hash(os.path.join(root, item.rel_path)) != item.file_hash:
+                return item.rel_path, MISMATCH_HASH
+            return None
+
+        with ThreadPoolExecutor(max_workers=_get_workers(workers)) as pool:
+            mismatches += [r for r in pool.map(check_hash, stat_ok_items) if r is not None]
+
+    Logging.debug(f"完整性校验[{mode}]完毕，共检查{len(items)}个文件，{len(mismatches)}个文件不一致")
+    return mismatches
@@ -4,10 +4,16 @@ import os
 import sys
 import tempfile
 import io
+import mmap
+import hashlib
+import datetime
+import threading
 from importlib import util
 from typing import List
 
-from qpt.kernel.qlog import Logging, TProgressBar
+from qpt.kernel.qlog import Logging, TProgressBar, AsyncLogWriter
+from qpt.kernel.qevent import emit, is_event_enabled
+from qpt.kernel.qignore import IgnoreMatcher, scan_tree
 from qpt.memory import QPT_MEMORY
 from qpt.version import version
 
@@ -124,28 +130,133 @@ def clean_qpt_cache():
     shutil.rmtree(dir_path)
 
 
+# 后台删除时使用的目录后缀
+TRASH_DIR_FLAG = ".qpt_trash_"
+
+
+def rmtree_background(path):
+    """
+    先重命名目录再交由后台线程删除，避免在删除大目录时阻塞打包流程
+    :param path: 待删除的目录
+    :return: 执行删除的线程，若无需删除则返回None
+    """
+    if not os.path.exists(path):
+        return None
+    trash_path = os.path.abspath(path) + TRASH_DIR_FLAG + datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    try:
+        os.rename(path, trash_path)
+    except OSError as e:
+        # 目录中文件被占用时无法重命名，退化为同步删除
+        Logging.debug(f"{os.path.abspath(path)}无法重命名，将直接删除该目录：{e}")
+        shutil.rmtree(path)
+        return None
+    # 非守护线程，保证进程退出前完成删除
+    thread = threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={"ignore_errors": True})
+    thread.start()
+    return thread
+
+
+def clean_trash_dirs(path):
+    """
+    在后台清理path目录下因意外中断而残留的待删除目录
+    :param path: 待检查的目录
+    """
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        if TRASH_DIR_FLAG in name:
+            thread = threading.Thread(target=shutil.rmtree,
+                                      args=(os.path.join(path, name),),
+                                      kwargs={"ignore_errors": True})
+            thread.start()
+
+
+# 超过该大小的文件使用mmap计算哈希值，避免大DLL反复拷贝至用户态缓冲区
+HASH_MMAP_THRESHOLD = 8 * 1024 * 1024
+
+
+def get_file_hash(file_path, chunk_size=1024 * 1024, algorithm="blake2b"):
+    """
+    计算文件的哈希值，hashlib在计算时会释放GIL，可配合线程池并行计算
+    :param file_path: 文件路径
+    :param chunk_size: 每次读取的字节数
+    :param algorithm: 哈希算法，默认为blake2b，需与PowerShell等外部工具比对时可使用sha256
+    :return: 十六进制哈希字符串
+    """
+    file_hash = hashlib.new(algorithm)
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                file_hash.update(mm)
+        else:
+            chunk = file.read(chunk_size)
+            while chunk:
+                file_hash.update(chunk)
+                chunk = file.read(chunk_size)
+    return file_hash.hexdigest()
+
+
+# copytree默认的复制方式，开启增量模式后仅复制发生变化的文件
+DEFAULT_INCREMENTAL_COPY = False
+DEFAULT_INCREMENTAL_CHECK_HASH = False
+
+
+def set_default_incremental_copy(flag: bool, check_hash: bool = False):
+    """
+    设置copytree默认是否采用增量复制
+    :param flag: 是否增量复制
+    :param check_hash: 是否在大小与修改时间一致时额外比对哈希值
+    """
+    global DEFAULT_INCREMENTAL_COPY, DEFAULT_INCREMENTAL_CHECK_HASH
+    DEFAULT_INCREMENTAL_COPY = flag
+    DEFAULT_INCREMENTAL_CHECK_HASH = check_hash
+
+
+def _is_same_file(src_file, dst_file, check_hash=False):
+    """
+    通过大小+修改时间（可选哈希值）判断目标文件是否与源文件一致
+    """
+    try:
+        dst_stat = os.stat(dst_file)
+    except OSError:
+        return False
+    src_stat = os.stat(src_file)
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    # 比对哈希时不再依赖修改时间，适用于修改时间不可靠的场景（如从git仓库重新检出）
+    if check_hash:
+        return get_file_hash(src_file) == get_file_hash(dst_file)
+    return int(src_stat.st_mtime) == int(dst_stat.st_mtime)
+
+
 class StdOutWrapper(io.TextIOWrapper):
     def __init__(self, container: list = None, do_print=True):
         super().__init__(io.BytesIO(), encoding="utf-8")
-        self.buff = ''
+        # 使用列表暂存输出，避免字符串反复拼接
+        self._buff = list()
         self.ori_stout = sys.stdout
         self.container = container
         self.do_print = do_print
 
+    @property
+    def buff(self):
+        return "".join(self._buff)
+
     def write(self, output_stream):
         if self.do_print:
-            self.buff += output_stream
+            self._buff.append(output_stream)
         if self.container is not None:
             self.container.append(output_stream)
 
     def flush(self):
-        self.buff = ''
+        self._buff.clear()
 
 
 class StdOutLoggerWrapper:
     def __init__(self, log_file_path):
         self.ori_stout = sys.stdout
-        self.log_file = open(log_file_path, "w", encoding="utf-8", buffering=1)
+        # 主程序的输出由后台线程批量写入文件，避免频繁输出时被磁盘写入拖慢
+        self.log_file = AsyncLogWriter(log_file_path)
 
     def write(self, output_stream):
         self.ori_stout.write(output_stream)
@@ -161,7 +272,17 @@ class StdOutLoggerWrapper:
         return True
 
 
-def copytree(src, dst, ignore_dirs: list = None, ignore_files: list = None):
+def copytree(src,
+             dst,
+             ignore_dirs: list = None,
+             ignore_files: list = None,
+             incremental: bool = None,
+             delete_orphans: bool = False,
+             check_hash: bool = None,
+             ignore_matcher: IgnoreMatcher = None,
+             link: bool = False,
+             link_ignore_dirs: list = None,
+             keep_files: list = None):
     """
     复制整个目录树
     最开始是用shutil.copytree()，但奈何Python3.7和3.8差别挺大，算了忽略这点效率吧，反正是在打包过程中，不影响用户
@@ -169,48 +290,111 @@ def copytree(src, dst, ignore_dirs: list = None, ignore_files: list = None):
     :param dst: 目标路径
     :param ignore_dirs: 忽略的文件夹名
     :param ignore_files: 忽略的文件名
+    :param incremental: 是否增量复制，为None时使用DEFAULT_INCREMENTAL_COPY
+    :param delete_orphans: 是否删除目标路径中源路径不存在的文件
+    :param check_hash: 增量复制时是否额外比对文件哈希值，为None时使用DEFAULT_INCREMENTAL_CHECK_HASH
+    :param ignore_matcher: gitignore风格的忽略规则，传入后同时会跳过Python虚拟环境
+    :param link: 是否使用硬链接代替复制，文件系统不支持时自动退化为复制
+    :param link_ignore_dirs: 使用硬链接时，仍需完整复制的文件夹（相对于src），例如会被修改的配置目录
+    :param keep_files: 删除孤立文件时需保留的文件（相对于dst），例如由其它来源写入dst的文件
     """
-    if ignore_dirs is None:
-        rel_ignore_dirs = list()
-    else:
+    if incremental is None:
+        incremental = DEFAULT_INCREMENTAL_COPY
+    if check_hash is None:
+        check_hash = DEFAULT_INCREMENTAL_CHECK_HASH
+    matcher = ignore_matcher.copy() if ignore_matcher is not None else IgnoreMatcher()
+    if ignore_dirs is not None:
         rel_ignore_dirs = list()
         for d in ignore_dirs:
             try:
                 rel_ignore_dirs.append(os.path.relpath(os.path.abspath(d), src))
             except ValueError:
                 continue
-    if ignore_files is None:
-        ignore_files = list()
-    else:
-        ignore_files = [os.path.abspath(os.path.join(src, f)) for f in ignore_files]
+        matcher.add_paths(rel_ignore_dirs, dir_only=True)
+    if ignore_files is not None:
+        matcher.add_paths([os.path.relpath(os.path.abspath(os.path.join(src, f)), src) for f in ignore_files])
     if not os.path.exists(dst):
         os.makedirs(dst)
 
     copy_info = dict()
+    copy_size = dict()
     if os.path.exists(src):
-        dir_cache = "-%NONE-FLAG%-"
-        for root, dirs, files in os.walk(src):
-            rel_path = os.path.relpath(root, src)
-            if rel_path in rel_ignore_dirs:
-                dir_cache = os.path.relpath(root, src)
-                continue
-            if dir_cache in rel_path and rel_path.index(dir_cache) == 0:
-                continue
-            dst_root = os.path.join(os.path.abspath(dst),
-                                    os.path.abspath(root).replace(os.path.abspath(src), "").strip("\\"))
-            for file in files:
-                src_file = os.path.join(root, file)
-                if os.path.abspath(src_file) in ignore_files:
-                    continue
-                dst_file = os.path.join(dst_root, file)
-                if not os.path.exists(dst_root):
-                    os.makedirs(dst_root, exist_ok=True)
-                copy_info[src_file] = dst_file
-
-        progressbar = TProgressBar(msg="正在拷贝文件", max_len=len(copy_info) + 1)
+        dst_dirs = set()
+        for rel_path, entry in scan_tree(src, matcher, skip_venv=ignore_matcher is not None):
+            dst_file = os.path.abspath(os.path.join(dst, rel_path))
+            dst_root = os.path.dirname(dst_file)
+            if dst_root not in dst_dirs:
+                os.makedirs(dst_root, exist_ok=True)
+                dst_dirs.add(dst_root)
+            copy_info[entry.path] = dst_file
+            copy_size[entry.path] = entry.stat().st_size
+        expect_files = list(copy_info.values())
+
+        if incremental:
+            copy_info = dict([(k, v) for k, v in copy_info.items() if not _is_same_file(k, v, check_hash)])
+        if link:
+            link_ignore_dirs = [os.path.abspath(os.path.join(src, d)) + os.sep for d in link_ignore_dirs or list()]
+        progressbar = TProgressBar(msg="正在拷贝文件" if not link else "正在链接文件", max_len=len(copy_info) + 1)
+        if is_event_enabled():
+            # 增量复制时跳过的文件记为缓存命中
+            emit("copy",
+                 src=os.path.abspath(src),
+                 dst=os.path.abspath(dst),
+                 files=len(copy_info),
+                 bytes=sum(copy_size[k] for k in copy_info),
+                 cache_hit=len(expect_files) - len(copy_info),
+                 cache_miss=len(copy_info),
+                 link=link)
         for k_id, k in enumerate(copy_info):
-            shutil.copy(k, copy_info[k])
-            progressbar.step()
+            if link and not any(os.path.abspath(k).startswith(d) for d in link_ignore_dirs):
+                link = _link_file(k, copy_info[k])
+            else:
+                _copy_file(k, copy_info[k])
+            progressbar.step(nbytes=copy_size[k])
+
+        if delete_orphans:
+            keep_files = [os.path.abspath(os.path.join(dst, f)) for f in keep_files or list()]
+            _delete_orphans(dst, set(expect_files + keep_files))
+
+
+def _copy_file(src_file, dst_file):
+    """
+    复制文件并保留修改时间，便于下次增量复制时比对
+    目标文件可能是Debug目录、解释器模板或动作缓存的硬链接，直接覆盖写入会同时修改链接的源文件，需先删除
+    """
+    if os.path.lexists(dst_file):
+        os.remove(dst_file)
+    shutil.copy2(src_file, dst_file)
+
+
+def _link_file(src_file, dst_file):
+    """
+    为src_file创建硬链接，失败时退化为复制
+    :return: 后续文件是否继续尝试使用硬链接
+    """
+    if os.path.exists(dst_file):
+        # 直接覆盖写入会同时修改链接的源文件，需先删除
+        os.remove(dst_file)
+    try:
+        os.link(src_file, dst_file)
+        return True
+    except (OSError, NotImplementedError) as e:
+        Logging.warning(f"当前文件系统无法创建硬链接，已退化为完整复制模式，原始报错如下：\n{e}")
+        _copy_file(src_file, dst_file)
+        return False
+
+
+def _delete_orphans(dst, expect_files: set):
+    """
+    删除dst中不在expect_files内的文件以及因此产生的空目录
+    """
+    for root, dirs, files in os.walk(dst, topdown=False):
+        for file in files:
+            file_path = os.path.abspath(os.path.join(root, file))
+            if file_path not in expect_files:
+                os.remove(file_path)
+        if os.path.abspath(root) != os.path.abspath(dst) and not os.listdir(root):
+            os.rmdir(root)
 
 
 class FileSerialize:
@@ -0,0 +1,158 @@
+"""
+预加载 - 打包时根据冒烟测试的导入记录生成预加载清单，运行时在后台预读模块文件
+可选地在后台线程中提前导入耗时较长的顶层包，此时这些包会在主程序的顶层代码执行前完成初始化，
+若主程序在导入前设置了CUDA_VISIBLE_DEVICES、FLAGS_*等环境变量或调用了matplotlib.use()，这些设置将不再生效
+"""
+
+import os
+import json
+import threading
+import importlib
+
+from qpt.kernel.qlog import Logging
+
+# 预加载清单文件名，保存于configs目录
+PRELOAD_FILE_NAME = "preload.json"
+# 设置为0后运行时不进行预加载
+PRELOAD_ENV = "QPT_PRELOAD"
+# 顶层包被导入的文件总大小超过该值时才会被提前导入
+PRELOAD_MIN_SIZE = 512 * 1024
+# 不会被提前导入的顶层包，QPT运行时本身已导入或在后台线程中导入可能存在问题
+PRELOAD_IGNORE_PACKAGES = ["qpt", "pip", "setuptools", "pkg_resources", "_distutils_hack", "tkinter", "ttkbootstrap"]
+READAHEAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_READAHEAD_WORKERS = 2
+DEFAULT_IMPORT_WORKERS = 2
+
+
+def make_preload_profile(trace_path,
+                         traced_root,
+                         module_path,
+                         save_path,
+                         min_size=PRELOAD_MIN_SIZE,
+                         exclude: list = None,
+                         with_imports=False) -> dict:
+    """
+    根据导入记录生成预加载清单
+    :param trace_path: 导入记录文件，由qpt.kernel.qimport生成
+    :param traced_root: 冒烟测试时的程序根目录，通常为Debug目录
+    :param module_path: 需要生成清单的程序根目录，通常为Release目录，不存在于该目录的文件会被忽略
+    :param save_path: 清单保存路径
+    :param min_size: 顶层包被导入的文件总大小超过该值时才会被提前导入
+    :param exclude: 额外不需要被提前导入的顶层包名
+    :param with_imports: 是否记录需要被提前导入的顶层包，为False时运行时仅预读文件
+    :return: 预加载清单
+    """
+    from qpt.kernel.qimport import load_trace
+    modules, files = load_trace(trace_path)
+    traced_root = os.path.normcase(os.path.abspath(traced_root))
+    lib = os.path.normcase(os.path.join("Python", "Lib")) + os.sep
+    site_packages = os.path.normcase(os.path.join("Python", "Lib", "site-packages")) + os.sep
+    ignore = set(PRELOAD_IGNORE_PACKAGES + (exclude if exclude else list()))
+
+    # 按模块被导入的顺序排列文件，同一顶层包的文件集中在一起
+    order = dict()
+    for module in modules:
+        order.setdefault(module.split(".")[0].lower(), len(order))
+    rel_files = list()
+    top_sizes = dict()
+    for file in files:
+        file = os.path.normcase(os.path.abspath(file))
+        if not file.startswith(traced_root + os.sep):
+            continue
+        rel_path = os.path.relpath(file, traced_root)
+        if not os.path.isfile(os.path.join(module_path, rel_path)):
+            continue
+        top = ""
+        if rel_path.startswith(site_packages):
+            top = rel_path[len(site_packages):].split(os.sep)[0].split(".")[0]
+            top_sizes[top] = top_sizes.get(top, 0) + os.path.getsize(file)
+        elif rel_path.startswith(lib):
+            top = rel_path[len(lib):].split(os.sep)[0].split(".")[0]
+        rel_files.append((order.get(top, len(order)), rel_path.replace("\\", "/")))
+    rel_files.sort()
+
+    imports = list()
+    for module in modules if with_imports else list():
+        top = module.split(".")[0]
+        if top in imports or top in ignore or top_sizes.get(top.lower(), 0) < min_size:
+            continue
+        imports.append(top)
+
+    profile = {"files": [rel_path for _, rel_path in rel_files], "imports": imports}
+    with open(save_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False)
+    Logging.info(f"预加载清单生成完毕，共{len(profile['files'])}个文件，"
+                 f"运行时将提前导入：{', '.join(imports) if imports else '无'}")
+    return profile
+
+
+def load_preload_profile(config_path):
+    """
+    读取预加载清单
+    :param config_path: configs目录
+    :return: 预加载清单，不存在或已通过环境变量关闭时返回None
+    """
+    profile_path = os.path.join(config_path, PRELOAD_FILE_NAME)
+    if os.getenv(PRELOAD_ENV) == "0" or not os.path.exists(profile_path):
+        return None
+    try:
+        with open(profile_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        Logging.debug(f"预加载清单读取失败：{e}")
+        return None
+
+
+def _run_background(name, items, func, workers):
+    # 各线程交错领取任务，使排在前面的文件与包尽早被处理
+    threads = list()
+    for worker_id in range(min(workers, len(items))):
+        def _loop(sub_items=items[worker_id::workers]):
+            for item in sub_items:
+                func(item)
+
+        thread = threading.Thread(target=_loop, name=f"{name}-{worker_id}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _readahead_file(file_path):
+    try:
+        with open(file_path, "rb", buffering=0) as f:
+            while f.read(READAHEAD_CHUNK_SIZE):
+                pass
+    except OSError:
+        pass
+
+
+def start_readahead(module_path, profile: dict, workers=DEFAULT_READAHEAD_WORKERS):
+    """
+    在后台线程中读取清单中的文件，使其进入系统文件缓存，不会执行任何代码
+    :param module_path: 程序根目录
+    :param profile: 预加载清单
+    :param workers: 线程数
+    :return: 后台线程列表
+    """
+    files = [os.path.join(module_path, rel_path) for rel_path in profile.get("files", list())]
+    return _run_background("QPTReadahead", files, _readahead_file, workers)
+
+
+def _import_package(name):
+    try:
+        importlib.import_module(name)
+    except BaseException as e:
+        # 后台导入失败时由主程序重新导入，不影响主程序的行为
+        Logging.debug(f"预加载{name}失败，将由主程序自行导入：{e}")
+
+
+def start_preload_imports(profile: dict, workers=DEFAULT_IMPORT_WORKERS):
+    """
+    在后台线程中提前导入耗时较长的顶层包，主程序导入同一个包时会等待后台导入完成而非重复导入
+    需在环境变量与sys.path已完全设置后调用，仅适用于在当前进程中执行主程序的情况
+    注意：这些包会在主程序的顶层代码执行前完成初始化，主程序在导入前修改的环境变量等设置将不会对其生效
+    :param profile: 预加载清单
+    :param workers: 线程数
+    :return: 后台线程列表
+    """
+    return _run_background("QPTPreload", list(profile.get("imports", list())), _import_package, workers)
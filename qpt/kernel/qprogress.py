@@ -0,0 +1,223 @@
+"""
+进度事件总线 - 生产者仅累加计数，各渲染器由后台线程按固定间隔合并刷新，避免逐文件输出拖慢复制与扫描
+"""
+
+import os
+import json
+import time
+import threading
+
+from qpt.kernel.qlog import Logging
+
+# 渲染间隔（秒）
+PROGRESS_INTERVAL = 0.2
+# 设置后会将进度以NDJSON格式追加写入该文件，便于外部程序读取
+PROGRESS_FILE_ENV = "QPT_PROGRESS_FILE"
+PROGRESS_BLOCK = 20
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressTask:
+    def __init__(self, bus, name, total, info=""):
+        """
+        :param bus: 所属的进度总线
+        :param name: 任务名
+        :param total: 总数
+        :param info: 附加信息
+        """
+        self.bus = bus
+        self.name = name
+        self.total = max(total, 0)
+        self.done = 0
+        self.bytes_done = 0
+        self.info = info
+        self.start = time.perf_counter()
+        # 没有任何步骤的任务视为已完成
+        self.finished = self.total == 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def update(self, n=1, nbytes=0, info=None):
+        """
+        累加进度，不会触发任何输出，可在多个线程中调用
+        :param n: 完成的数量
+        :param nbytes: 完成的字节数
+        :param info: 附加信息
+        """
+        with self._lock:
+            self.done += n
+            self.bytes_done += nbytes
+            if info is not None:
+                self.info = info
+            self.version += 1
+            finished = self.done >= self.total and not self.finished
+            if finished:
+                self.finished = True
+        if finished:
+            self.bus.finish(self)
+
+    def close(self):
+        """
+        提前结束任务，例如部分文件被跳过时
+        """
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        self.bus.finish(self)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            done, bytes_done, info = self.done, self.bytes_done, self.info
+        elapsed = max(time.perf_counter() - self.start, 1e-6)
+        rate = done / elapsed
+        eta = (self.total - done) / rate if rate > 0 and done < self.total else (0 if done >= self.total else None)
+        return {"task": self.name,
+                "done": done,
+                "total": self.total,
+                "bytes": bytes_done,
+                "elapsed": round(elapsed, 3),
+                "rate": round(rate, 2),
+                "byte_rate": round(bytes_done / elapsed, 1),
+                "eta": None if eta is None else round(eta, 1),
+                "info": info}
+
+
+class ProgressRenderer:
+    def render(self, snapshot: dict):
+        raise NotImplementedError(f"{self.__class__.__name__}中未定义render方法")
+
+    def finish(self, snapshot: dict):
+        self.render(snapshot)
+
+
+class TerminalRenderer(ProgressRenderer):
+    """
+    在终端中以单行刷新的方式展示进度、速度与剩余时间
+    """
+
+    def render(self, snapshot: dict):
+        rate = snapshot["done"] / snapshot["total"]
+        block_str = "|" + "".join(['━'] * int(rate * PROGRESS_BLOCK)).ljust(PROGRESS_BLOCK, " ") + "|"
+        speed = f"{snapshot['rate']:.1f}个/s"
+        if snapshot["bytes"]:
+            speed += f" {snapshot['byte_rate'] / 1024 / 1024:.2f}MB/s"
+        Logging.info("\r" + snapshot["task"] +
+                     f"\t{snapshot['done']}/{snapshot['total']} {block_str} {rate * 100:.2f}% "
+                     f"{speed} 剩余{_format_eta(snapshot['eta'])} {snapshot['info']}",
+                     line_feed=False)
+        Logging.flush()
+
+    def finish(self, snapshot: dict):
+        self.render(snapshot)
+        Logging.info("", line_feed=True)
+        Logging.flush()
+
+
+class NDJSONRenderer(ProgressRenderer):
+    """
+    将进度以NDJSON格式追加写入文件，每行一条记录
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def _write(self, snapshot, event):
+        record = dict(snapshot, ts=round(time.time(), 3), event=event)
+        with self._lock:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def render(self, snapshot: dict):
+        self._write(snapshot, "progress")
+
+    def finish(self, snapshot: dict):
+        self._write(snapshot, "finish")
+
+
+class ProgressBus:
+    """
+    进度总线，后台线程每隔PROGRESS_INTERVAL秒将有变化的任务交给各渲染器，任务完成时立即渲染最终状态
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.renderers = list()
+        self.tasks = list()
+        self._rendered = dict()
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._thread = None
+
+    def add_renderer(self, renderer: ProgressRenderer):
+        with self._lock:
+            self.renderers.append(renderer)
+
+    def remove_renderer(self, renderer: ProgressRenderer):
+        with self._lock:
+            if renderer in self.renderers:
+                self.renderers.remove(renderer)
+
+    def open_task(self, name, total, info="", renderers: list = None) -> ProgressTask:
+        """
+        新建进度任务
+        :param name: 任务名
+        :param total: 总数
+        :param info: 附加信息
+        :param renderers: 仅用于该任务的额外渲染器
+        """
+        task = ProgressTask(self, name, total, info)
+        task.renderers = list(renderers) if renderers else list()
+        # 总数为0时不会再收到update，无需注册与渲染
+        if task.finished:
+            return task
+        with self._lock:
+            self.tasks.append(task)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="QPTProgress", daemon=True)
+                self._thread.start()
+        return task
+
+    def finish(self, task: ProgressTask):
+        with self._lock:
+            if task in self.tasks:
+                self.tasks.remove(task)
+            renderers = self.renderers + task.renderers
+        snapshot = task.snapshot()
+        with self._render_lock:
+            for renderer in renderers:
+                renderer.finish(snapshot)
+            self._rendered.pop(id(task), None)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                tasks = list(self.tasks)
+                renderers = list(self.renderers)
+                if not tasks:
+                    self._thread = None
+                    return
+            with self._render_lock:
+                for task in tasks:
+                    if task.finished or self._rendered.get(id(task), 0) == task.version:
+                        continue
+                    self._rendered[id(task)] = task.version
+                    snapshot = task.snapshot()
+                    for renderer in renderers + task.renderers:
+                        renderer.render(snapshot)
+
+
+PROGRESS_BUS = ProgressBus()
+PROGRESS_BUS.add_renderer(TerminalRenderer())
+if os.getenv(PROGRESS_FILE_ENV):
+    PROGRESS_BUS.add_renderer(NDJSONRenderer(os.getenv(PROGRESS_FILE_ENV)))
@@ -197,7 +197,7 @@ class PTerminal(Terminal):
     def _shell_func(self, callback: TerminalCallback = LoggingTerminalCallback()):
         # ToDo 实现Callback
         def closure(closure_shell):
-            Logging.debug(f"SHELL: {closure_shell}")
+            Logging.debug("SHELL: %s", closure_shell)
             if closure_shell[1:3] == ":\\":
                 closure_shell += f"cd {closure_shell[:2]} ;"
             closure_shell = f'{closure_shell} ; echo "---QPT OUTPUT STATUS CODE---" $? \n'
@@ -0,0 +1,116 @@
+"""
+启动耗时记录 - 记录运行时各阶段的耗时，保存为Chrome trace-event格式，可在chrome://tracing或Perfetto中查看
+该文件会在qpt.run的最开始被导入，请勿在此导入其它QPT模块
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+
+# 设置为1后非首次运行也会保存耗时记录
+TRACE_ENV = "QPT_TRACE"
+TRACE_FILE_NAME = "trace.json"
+
+_ORIGIN = time.perf_counter()
+_EVENTS = list()
+_LOCK = threading.Lock()
+_SAVE_PATH = None
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter()
+        event = {"name": self.name,
+                 "cat": self.cat,
+                 "ph": "X",
+                 "ts": round((self.start - _ORIGIN) * 1e6, 1),
+                 "dur": round((end - self.start) * 1e6, 1),
+                 "pid": os.getpid(),
+                 "tid": threading.get_ident()}
+        if self.args:
+            event["args"] = self.args
+        if exc_type is not None:
+            event.setdefault("args", dict())["error"] = exc_type.__name__
+        with _LOCK:
+            _EVENTS.append(event)
+        return False
+
+
+def span(name, cat="qpt", **args):
+    """
+    记录代码块的耗时
+    Example:
+        with span("verify"):
+            ...
+    :param name: 名称
+    :param cat: 分类
+    :param args: 额外信息，会显示在trace查看器中
+    """
+    return _Span(name, cat, args)
+
+
+def instant(name, cat="qpt", **args):
+    """
+    记录一个时间点
+    """
+    event = {"name": name,
+             "cat": cat,
+             "ph": "i",
+             "s": "p",
+             "ts": round((time.perf_counter() - _ORIGIN) * 1e6, 1),
+             "pid": os.getpid(),
+             "tid": threading.get_ident()}
+    if args:
+        event["args"] = args
+    with _LOCK:
+        _EVENTS.append(event)
+
+
+def enable_trace(save_dir):
+    """
+    开启耗时记录文件的保存，进程退出时会再次保存以包含完整的记录
+    :param save_dir: 保存目录，通常为configs/logs
+    """
+    global _SAVE_PATH
+    if _SAVE_PATH is None:
+        atexit.register(dump_trace)
+    _SAVE_PATH = os.path.join(save_dir, TRACE_FILE_NAME)
+
+
+def is_trace_enabled():
+    return _SAVE_PATH is not None
+
+
+def dump_trace():
+    """
+    保存耗时记录，未开启时不执行任何操作
+    """
+    if _SAVE_PATH is None:
+        return
+    with _LOCK:
+        events = list(_EVENTS)
+    # 为各线程命名，便于查看并行部署时的情况
+    names = {t.ident: t.name for t in threading.enumerate()}
+    for tid in set(event["tid"] for event in events):
+        events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                       "args": {"name": names.get(tid, str(tid))}})
+    try:
+        with open(_SAVE_PATH + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        os.replace(_SAVE_PATH + ".tmp", _SAVE_PATH)
+    except OSError:
+        pass
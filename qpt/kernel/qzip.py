@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import zlib
+import struct
+import shutil
+import zipfile
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+
+from qpt.kernel.qlog import Logging, TProgressBar
+
+# 分卷文件名格式
+VOLUME_NAME_FORMAT = "volume-{:03d}.zip"
+# 单个分卷的目标大小，分卷之间相互独立，可被多个线程同时解压
+DEFAULT_VOLUME_SIZE = 32 * 1024 * 1024
+# 默认压缩等级，1~9，数值越大体积越小但压缩越慢，对解压速度影响较小
+DEFAULT_COMPRESS_LEVEL = 6
+
+# 纯Python包压缩后的文件名格式，保存于Python/Lib目录下，编号越小越先被加入sys.path
+SITE_ZIP_NAME_FORMAT = "site-packages-{:03d}.zip"
+
+# 已被压缩过的文件类型，再次压缩几乎无收益，直接存储
+STORED_EXTENSIONS = {".whl", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".lzma", ".7z", ".rar", ".zst",
+                     ".jar", ".egg", ".npz", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp3", ".mp4",
+                     ".avi", ".mkv", ".ogg", ".woff", ".woff2"}
+
+
+# 解释器镜像使用ZipCrypto加密，zipfile逐字节调用函数解密，速度仅约1MB/s
+ZIPCRYPTO_FLAG = 0x1
+ZIP_DATA_DESCRIPTOR_FLAG = 0x8
+# 单次读取并解密的字节数
+ZIPCRYPTO_CHUNK_SIZE = 1024 * 1024
+
+# QPT附带的7-Zip，可用时优先使用其C实现解密
+SEVEN_ZIP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ext", "compile", "7z", "7z.exe")
+
+_CRC_TABLE = None
+_KEYSTREAM_TABLE = None
+
+
+def _init_zipcrypto_tables():
+    global _CRC_TABLE, _KEYSTREAM_TABLE
+    if _CRC_TABLE is None:
+        crc_table = list()
+        for i in range(256):
+            crc = i
+            for _ in range(8):
+                crc = (crc >> 1) ^ 0xEDB88320 if crc & 1 else crc >> 1
+            crc_table.append(crc)
+        _CRC_TABLE = crc_table
+        # 密钥流字节仅与key2的低16位相关，提前计算全部结果
+        _KEYSTREAM_TABLE = bytes(((k | 2) * ((k | 2) ^ 1) >> 8) & 0xFF for k in range(65536))
+
+
+class ZipCryptoDecrypter:
+    def __init__(self, pwd: bytes):
+        """
+        查表实现的ZipCrypto解密器，支持分块解密
+        :param pwd: 密码
+        """
+        _init_zipcrypto_tables()
+        self.key0, self.key1, self.key2 = 305419896, 591751049, 878082192
+        crc_table = _CRC_TABLE
+        for c in pwd:
+            self.key0 = (self.key0 >> 8) ^ crc_table[(self.key0 ^ c) & 0xFF]
+            self.key1 = ((self.key1 + (self.key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+            self.key2 = (self.key2 >> 8) ^ crc_table[(self.key2 ^ (self.key1 >> 24)) & 0xFF]
+
+    def decrypt(self, data: bytes) -> bytes:
+        # 密钥的更新依赖明文，无法向量化，此处将全部运算内联至单个循环并使用局部变量
+        key0, key1, key2 = self.key0, self.key1, self.key2
+        crc_table = _CRC_TABLE
+        keystream = _KEYSTREAM_TABLE
+        result = bytearray(data)
+        for i in range(len(result)):
+            c = result[i] ^ keystream[key2 & 0xFFFF]
+            result[i] = c
+            key0 = (key0 >> 8) ^ crc_table[(key0 ^ c) & 0xFF]
+            key1 = ((key1 + (key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+            key2 = (key2 >> 8) ^ crc_table[(key2 ^ (key1 >> 24)) & 0xFF]
+        self.key0, self.key1, self.key2 = key0, key1, key2
+        return bytes(result)
+
+
+def _get_decompressor(compress_type):
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.decompressobj(-15)
+    # LZMA等格式的头部处理较为复杂，复用zipfile的实现
+    return zipfile._get_decompressor(compress_type)
+
+
+def _get_member_path(dst, name):
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ["", ".", ".."]]
+    return os.path.join(dst, *parts)
+
+
+def _extract_member_fast(file_obj, info: zipfile.ZipInfo, dst, pwd: bytes):
+    """
+    直接读取成员的原始数据，使用ZipCryptoDecrypter解密后解压，并校验CRC
+    """
+    file_obj.seek(info.header_offset)
+    header = struct.unpack("<4s5H3L2H", file_obj.read(30))
+    file_obj.seek(header[-2] + header[-1], os.SEEK_CUR)
+    remain = info.compress_size
+    decrypter = None
+    if info.flag_bits & ZIPCRYPTO_FLAG:
+        decrypter = ZipCryptoDecrypter(pwd)
+        check = decrypter.decrypt(file_obj.read(12))[11]
+        if info.flag_bits & ZIP_DATA_DESCRIPTOR_FLAG:
+            expect = ((info.date_time[3] << 11 | info.date_time[4] << 5 | info.date_time[5] // 2) >> 8) & 0xFF
+        else:
+            expect = (info.CRC >> 24) & 0xFF
+        if check != expect:
+            raise RuntimeError(f"{info.filename}的密码错误")
+        remain -= 12
+    decompressor = _get_decompressor(info.compress_type)
+    crc = 0
+    with open(_get_member_path(dst, info.filename), "wb") as dst_file:
+        while remain > 0:
+            chunk = file_obj.read(min(ZIPCRYPTO_CHUNK_SIZE, remain))
+            if not chunk:
+                raise EOFError(f"{info.filename}的数据不完整")
+            remain -= len(chunk)
+            if decrypter:
+                chunk = decrypter.decrypt(chunk)
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            crc = zlib.crc32(chunk, crc)
+            dst_file.write(chunk)
+        if decompressor and hasattr(decompressor, "flush"):
+            chunk = decompressor.flush()
+            crc = zlib.crc32(chunk, crc)
+            dst_file.write(chunk)
+    if crc != info.CRC:
+        raise zipfile.BadZipFile(f"{info.filename}的CRC校验失败")
+
+
+def _extract_names_fast(zip_path, names: List[str], dst, pwd: bytes):
+    with zipfile.ZipFile(zip_path) as zip_obj, open(zip_path, "rb") as file_obj:
+        for name in names:
+            _extract_member_fast(file_obj, zip_obj.getinfo(name), dst, pwd)
+
+
+def _get_workers(workers=None):
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4)
+    return workers
+
+
+def split_volumes(root, rel_paths: List[str], volume_size=DEFAULT_VOLUME_SIZE) -> List[List[str]]:
+    """
+    按文件大小将文件划分至多个分卷，同一目录下的文件尽可能位于同一分卷中
+    :param root: 文件所在根目录
+    :param rel_paths: 相对于root的文件路径列表
+    :param volume_size: 单个分卷的目标大小
+    :return: 分卷列表，元素为该分卷包含的文件相对路径
+    """
+    volumes = list()
+    current, current_size = list(), 0
+    for rel_path in sorted(rel_paths):
+        size = os.path.getsize(os.path.join(root, rel_path))
+        if current and current_size + size > volume_size:
+            volumes.append(current)
+            current, current_size = list(), 0
+        current.append(rel_path)
+        current_size += size
+    if current:
+        volumes.append(current)
+    return volumes
+
+
+def _write_volume(root, rel_paths, volume_path, compress_level, compression):
+    with zipfile.ZipFile(volume_path, "w", compression=compression, compresslevel=compress_level) as zip_obj:
+        for rel_path in rel_paths:
+            if os.path.splitext(rel_path)[-1].lower() in STORED_EXTENSIONS:
+                zip_obj.write(os.path.join(root, rel_path), arcname=rel_path, compress_type=zipfile.ZIP_STORED)
+            else:
+                zip_obj.write(os.path.join(root, rel_path), arcname=rel_path)
+    return volume_path
+
+
+def make_volumes(root,
+                 rel_paths: List[str],
+                 save_dir,
+                 volume_size=DEFAULT_VOLUME_SIZE,
+                 compress_level=DEFAULT_COMPRESS_LEVEL,
+                 compression=zipfile.ZIP_DEFLATED,
+                 workers=None) -> List[str]:
+    """
+    将文件压缩为多个相互独立的zip分卷，各分卷通过线程池并行压缩
+    :param root: 文件所在根目录，压缩包内的路径相对于该目录
+    :param rel_paths: 待压缩的文件相对路径列表
+    :param save_dir: 分卷保存目录
+    :param volume_size: 单个分卷的目标大小，单个文件超过该大小时会独占一个分卷
+    :param compress_level: 压缩等级
+    :param compression: 压缩算法，如zipfile.ZIP_DEFLATED、zipfile.ZIP_LZMA
+    :param workers: 线程数
+    :return: 分卷路径列表
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    volumes = split_volumes(root, rel_paths, volume_size=volume_size)
+    progressbar = TProgressBar(msg="正在压缩分卷", max_len=len(volumes) + 1)
+    volume_paths = list()
+    with ThreadPoolExecutor(max_workers=_get_workers(workers)) as pool:
+        tasks = list()
+        for volume_id, volume in enumerate(volumes):
+            volume_path = os.path.join(save_dir, VOLUME_NAME_FORMAT.format(volume_id))
+            tasks.append(pool.submit(_write_volume, root, volume, volume_path, compress_level, compression))
+        for task in tasks:
+            volume_paths.append(task.result())
+            progressbar.step()
+    return volume_paths
+
+
+def _extract_volume(volume_path, dst):
+    with zipfile.ZipFile(volume_path) as zip_obj:
+        zip_obj.extractall(dst)
+    return volume_path
+
+
+def extract_volumes(volume_paths: List[str], dst, workers=None, callback=None):
+    """
+    使用线程池并行解压多个zip分卷，解压时会校验CRC
+    :param volume_paths: 分卷路径列表
+    :param dst: 解压目录
+    :param workers: 线程数
+    :param callback: 每解压完一个分卷后调用，参数为分卷路径
+    """
+    # 大分卷优先提交，减少最后只剩单个线程工作的时间
+    volume_paths = sorted(volume_paths, key=lambda p: os.path.getsize(p), reverse=True)
+    with ThreadPoolExecutor(max_workers=_get_workers(workers)) as pool:
+        tasks = [pool.submit(_extract_volume, volume_path, dst) for volume_path in volume_paths]
+        for task in as_completed(tasks):
+            volume_path = task.result()
+            Logging.debug(f"{os.path.basename(volume_path)}解压完毕")
+            if callback:
+                callback(volume_path)
+
+
+def _extract_by_7z(zip_path, dst, pwd: bytes) -> bool:
+    if os.name != "nt" or not os.path.exists(SEVEN_ZIP_PATH):
+        return False
+    result = subprocess.run([SEVEN_ZIP_PATH, "x", "-y", "-mmt=on", f"-p{pwd.decode('utf-8')}", f"-o{dst}", zip_path],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        Logging.debug(f"7-Zip解压失败，将使用Python解压：\n{result.stdout.decode('utf-8', errors='ignore')[-1000:]}")
+        return False
+    return True
+
+
+def extract_members(zip_path, dst, pwd: bytes = None, workers=None):
+    """
+    并行解压单个zip中的成员，成员按大小均衡分配至各个工作单元
+    未加密时使用线程池，ZipCrypto加密时解密为纯Python运算，改为使用多个子进程
+    :param zip_path: zip文件路径
+    :param dst: 解压目录
+    :param pwd: 解压密码
+    :param workers: 线程数，使用子进程时为进程数
+    """
+    with zipfile.ZipFile(zip_path) as zip_obj:
+        infos = zip_obj.infolist()
+    # 提前创建全部目录，避免多个线程同时创建同一目录
+    for info in infos:
+        dir_name = info.filename if info.is_dir() else os.path.dirname(info.filename)
+        os.makedirs(_get_member_path(dst, dir_name), exist_ok=True)
+    encrypted = any(info.flag_bits & ZIPCRYPTO_FLAG for info in infos)
+    if encrypted:
+        assert pwd, f"{zip_path}已被加密，请提供解压密码"
+        workers = workers if workers else os.cpu_count() or 1
+    else:
+        workers = _get_workers(workers)
+    groups = [list() for _ in range(workers)]
+    group_sizes = [0] * workers
+    for info in sorted([i for i in infos if not i.is_dir()], key=lambda i: i.compress_size, reverse=True):
+        group_id = group_sizes.index(min(group_sizes))
+        groups[group_id].append(info.filename)
+        group_sizes[group_id] += info.compress_size
+    groups = [group for group in groups if group]
+
+    if encrypted and _extract_by_7z(zip_path, dst, pwd):
+        return
+    if encrypted and len(groups) > 1:
+        # 使用独立的子进程而非multiprocessing，避免Windows下spawn方式重新执行用户的打包脚本
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            processes = list()
+            for group_id, group in enumerate(groups):
+                names_path = os.path.join(tmp_dir, f"{group_id}.json")
+                with open(names_path, "w", encoding="utf-8") as names_file:
+                    json.dump(group, names_file)
+                processes.append(subprocess.Popen([sys.executable, "-m", "qpt.kernel.qzip", "extract",
+                                                   zip_path, dst, pwd.hex(), names_path],
+                                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+            for process in processes:
+                output = process.communicate()[0]
+                if process.returncode != 0:
+                    raise RuntimeError(f"{zip_path}解压失败，报错如下：\n"
+                                       f"{output.decode('utf-8', errors='ignore')[-2000:]}")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    def _extract_group(group):
+        _extract_names_fast(zip_path, group, dst, pwd)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for task in [pool.submit(_extract_group, group) for group in groups]:
+            task.result()
+
+
+def convert_image(src_zip, dst_zip, pwd: bytes = None, compress_level=DEFAULT_COMPRESS_LEVEL, workers=None):
+    """
+    将ZipCrypto加密的解释器镜像转换为未加密的zip，转换后的镜像解压速度仅受限于硬盘
+    :param src_zip: 原镜像路径
+    :param dst_zip: 转换后的镜像路径
+    :param pwd: 原镜像的密码
+    :param compress_level: 压缩等级
+    :param workers: 解压时的进程数
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        extract_members(src_zip, tmp_dir, pwd=pwd, workers=workers)
+        with zipfile.ZipFile(src_zip) as src_obj:
+            names = [info.filename for info in src_obj.infolist() if not info.is_dir()]
+        tmp_zip = dst_zip + ".tmp"
+        with zipfile.ZipFile(tmp_zip, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compress_level) as zip_obj:
+            for name in names:
+                zip_obj.write(_get_member_path(tmp_dir, name), arcname=name)
+        os.replace(tmp_zip, dst_zip)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    Logging.info(f"已将{src_zip}转换为未加密的镜像{dst_zip}")
+
+
+def get_volume_paths(save_dir) -> List[str]:
+    """
+    获取目录下的全部分卷路径
+    :param save_dir: 分卷保存目录
+    """
+    if not os.path.exists(save_dir):
+        return list()
+    return [os.path.join(save_dir, name) for name in sorted(os.listdir(save_dir))
+            if name.startswith("volume-") and name.endswith(".zip")]
+
+
+def get_site_zip_paths(lib_path) -> List[str]:
+    """
+    获取Python/Lib目录下由ZipPurePackages生成的全部压缩包路径，需按顺序加入sys.path
+    :param lib_path: Python/Lib目录
+    """
+    if not os.path.exists(lib_path):
+        return list()
+    return [os.path.join(lib_path, name) for name in sorted(os.listdir(lib_path))
+            if name.startswith("site-packages-") and name.endswith(".zip")]
+
+
+if __name__ == '__main__':
+    # python -m qpt.kernel.qzip convert 原镜像.zip 转换后的镜像.zip [密码]
+    if sys.argv[1] == "extract":
+        with open(sys.argv[5], "r", encoding="utf-8") as f:
+            _extract_names_fast(sys.argv[2], json.load(f), sys.argv[3], bytes.fromhex(sys.argv[4]))
+    elif sys.argv[1] == "convert":
+        convert_image(sys.argv[2], sys.argv[3], pwd=sys.argv[4].encode("utf-8") if len(sys.argv) > 4 else None)
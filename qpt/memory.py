@@ -148,17 +148,19 @@ def get_env_vars(work_dir="."):
                        "%SystemRoot%/system32/WindowsPowerShell/v1.0/Modules;" + \
                        f"{os.path.join(os.path.abspath(work_dir), 'opt/CUDA')};"
 
-    # Set PYTHON PATH ENV
+    # Set PYTHON PATH ENV - 纯Python包压缩后的zip需位于site-packages之后
+    from qpt.kernel.qzip import get_site_zip_paths
     env_vars["PYTHONPATH"] = os.path.abspath("./Python/Lib/site-packages") + ";" + \
+                             "".join([zip_path + ";" for zip_path in get_site_zip_paths(os.path.abspath("./Python/Lib"))]) + \
                              work_dir + ";" + \
                              os.path.abspath("./Python")
     os_env = os.environ.copy()
     os_env.update(env_vars)
 
     if QPT_MODE and QPT_MODE.lower() == "debug":
-        Logging.debug(msg="Python所识别到的环境变量如下：\n" +
-                          "".join([_ek + ":" + _e_v + " \n" for _ek, _ev in env_vars.items()
-                                   for _e_v in _ev.split(";")]))
+        Logging.debug(lambda: "Python所识别到的环境变量如下：\n" +
+                              "".join([_ek + ":" + _e_v + " \n" for _ek, _ev in env_vars.items()
+                                       for _e_v in _ev.split(";")]))
 
     return os_env
 
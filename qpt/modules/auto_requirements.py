@@ -10,6 +10,7 @@ from qpt.kernel.qinterpreter import display_flag, DISPLAY_IGNORE, DISPLAY_COPY,
     DISPLAY_LOCAL_INSTALL, DISPLAY_SETUP_INSTALL, DISPLAY_ONLINE_INSTALL
 from qpt.modules.package import _RequirementsPackage, DEFAULT_DEPLOY_MODE, CustomPackage, CopyWhl2Packages
 from qpt.modules.paddle_family import PaddlePaddlePackage, PaddleOCRPackage
+from qpt.modules.trim import add_trim_keep
 from qpt.memory import QPT_MEMORY
 
 
@@ -46,6 +47,10 @@ class AutoRequirementsPackage(_RequirementsPackage):
                                                "QPT_Flag": False})
                                          for _r in flatten_requirements])
         flatten_requirements_fix.update(requirements)
+        # 记录裁剪时需要保留的包
+        for requirement, requirement_info in requirements.items():
+            if requirement_info.get("trim_keep") is not None:
+                add_trim_keep(requirement, requirement_info["trim_keep"])
         pre_add_module = list()
         for requirement in dict(flatten_requirements_fix):
             requirement, version, display, qpt_flag = requirement, \
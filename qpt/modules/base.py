@@ -9,7 +9,10 @@ import datetime
 from distutils.sysconfig import get_python_lib
 
 from qpt.kernel.qlog import Logging
-from qpt.memory import QPT_MODE, CheckRun, QPT_MEMORY
+from qpt.kernel.qtrace import span
+from qpt.kernel.qevent import phase
+from qpt.kernel.qcache import get_default_action_cache
+from qpt.memory import CheckRun, QPT_MEMORY
 
 # 定义优先级 优先级越高执行顺序越考前，一般设置为GENERAL_LEVEL
 TOP_LEVEL = 5.  # 底层高优先级
@@ -23,11 +26,50 @@ LOW_LEVEL_REDUCE = 1.5  # 紧随低优先级 - PaddlePaddleCheckAVX
 BOTTOM_LEVEL = 1.  # 系统级低优先级
 BOTTOM_LEVEL_REDUCE = 0.5  # 底层低优先级
 
+# 资源标记 - 使用相同资源的Module在运行时不会被并行部署
+RESOURCE_SITE_PACKAGES = "site-packages"  # 安装、卸载Python包
+RESOURCE_ENVIRON = "environ"  # 修改环境变量与sys.path
+
+# 打包资源标记 - 打包时无依赖关系的Pack OP会被并行执行，同时执行的数量受DEFAULT_PACK_LIMITS限制
+PACK_RESOURCE_CPU = "cpu"
+PACK_RESOURCE_DISK = "disk"
+PACK_RESOURCE_NET = "net"
+PACK_RESOURCE_PIP = "pip"  # pip在QPT所在进程中执行，不可并行
+DEFAULT_PACK_LIMITS = {PACK_RESOURCE_CPU: os.cpu_count() or 1,
+                       PACK_RESOURCE_DISK: 2,
+                       PACK_RESOURCE_NET: 4,
+                       PACK_RESOURCE_PIP: 1}
+
+# 打包产物标记 - 读写相同产物的Pack OP会按优先级顺序执行
+ARTIFACT_PYTHON = "Python"  # Release中的Python目录，包含site-packages
+ARTIFACT_SITE_PACKAGES = "site-packages"
+ARTIFACT_RESOURCES = "resources"
+ARTIFACT_PACKAGES = "packages"  # 下载的依赖包
+ARTIFACT_CUDA = "CUDA"
+# 子目录产物与其所在目录的产物同样视为冲突
+ARTIFACT_PARENTS = {ARTIFACT_SITE_PACKAGES: ARTIFACT_PYTHON}
+# 产物相对于Module目录的路径
+ARTIFACT_RELATIVE_PATHS = {ARTIFACT_PYTHON: "Python",
+                           ARTIFACT_SITE_PACKAGES: "Python/Lib/site-packages",
+                           ARTIFACT_RESOURCES: "resources",
+                           ARTIFACT_PACKAGES: "opt/packages",
+                           ARTIFACT_CUDA: "opt/CUDA"}
+
 
 class SubModuleOpt:
     """
     自定义子模块操作，用于子模块封装时和封装后的操作流程设置，支持shell操作和Python原生语言操作
     """
+    # OP使用的资源标记，Module的资源标记为其全部Unpack OP的资源标记之和
+    resources = list()
+    # 打包时读取与写入的产物标记，为None时视为读写全部产物，即需等待之前的全部OP，之后的OP也均需等待该OP
+    pack_inputs = None
+    pack_outputs = None
+    # 打包时使用的资源标记
+    pack_resources = list()
+    # 打包时是否使用动作缓存，仅当执行结果完全由OP参数、get_cache_inputs中的文件与当前Python环境决定，
+    # 且仅向Module目录写入文件时才可开启，此时OP会在临时的Module目录中执行
+    cacheable = False
 
     def __init__(self, disposable=False):
         """
@@ -49,6 +91,12 @@ class SubModuleOpt:
         # 工作目录占位 - 创建Module时的工作目录（待打包的目录）/执行Module时的resources目录
         self._work_dir = "./"
 
+    def get_cache_inputs(self) -> list:
+        """
+        动作缓存需额外计算哈希值的输入文件或目录，例如requirements.txt
+        """
+        return list()
+
     def act(self) -> None:
         """
         使用Python语句和终端来执行操作
@@ -75,7 +123,7 @@ class SubModuleOpt:
     def run(self, op_path):
         inactive_file = op_path + ".inactive"
         if (self.disposable and os.path.exists(inactive_file)) and CheckRun.check_run_file(self.config_path):
-            Logging.debug(f"找到该OP状态文件{self.name}.inactive，故跳过该OP")
+            Logging.debug("找到该OP状态文件%s.inactive，故跳过该OP", self.name)
         else:
             self.act()
         if self.disposable and os.path.exists(os.path.dirname(op_path)):
@@ -127,11 +175,27 @@ class SubModuleOpt:
 
 
 class SubModule:
-    def __init__(self, name=None, level: int = GENERAL_LEVEL):
+    def __init__(self,
+                 name=None,
+                 level: int = GENERAL_LEVEL,
+                 depends: list = None,
+                 resources: list = None,
+                 pack_depends: list = None):
+        """
+        :param name: Module名
+        :param level: 优先级
+        :param depends: 运行时需在该Module之前部署的Module名，为None时需等待优先级在其之前的全部Module部署完毕，
+                        传入列表（可为空）后仅等待列表中的Module，从而与其它Module并行部署
+        :param resources: 资源标记，使用相同资源标记的Module不会被并行部署
+        :param pack_depends: 打包时需在该Module的Pack OP之前执行完毕的Module名，其余依赖由Pack OP声明的读写产物推导
+        """
         if name is None:
             name = self.__class__.__name__
         self.name = name
         self.level = level
+        self.depends = depends
+        self.resources = list(resources) if resources else list()
+        self.pack_depends = list(pack_depends) if pack_depends else list()
 
         # 占位OP
         self.pack_opts = list()
@@ -164,6 +228,12 @@ class SubModule:
         self._module_path = module_path
         self._terminal = terminal
 
+    def get_resources(self) -> list:
+        resources = set(self.resources)
+        for opt in self.unpack_opts:
+            resources.update(opt.resources)
+        return sorted(resources)
+
     def add_pack_opt(self, opt: SubModuleOpt):
         self.details["Pack"].append(opt.__class__.__name__)
         self.pack_opts.append(opt)
@@ -177,15 +247,37 @@ class SubModule:
         在撰写该Module时，开发侧需要的操作
         """
         assert self._module_path, "SubModule的out_dir未设置！"
-        for opt in self.pack_opts:
-            Logging.info(f"正在加载{self.name}-{opt.name}OP")
-            op_path = os.path.join(self._module_path, "opt", self.name, opt.name)
-            opt.prepare(interpreter_path=self._interpreter_path,
-                        module_path=self._module_path,
+        with phase(self.name, kind="module", level=self.level):
+            for opt in self.pack_opts:
+                self.run_pack_opt(opt)
+            self.serialize_unpack_opts()
+
+    def run_pack_opt(self, opt: SubModuleOpt):
+        """
+        执行单个Pack OP，打包调度器会使用该方法并行执行不同Module的OP
+        """
+        Logging.info(f"正在加载{self.name}-{opt.name}OP")
+        op_path = os.path.join(self._module_path, "opt", self.name, opt.name)
+
+        def _run(module_path):
+            interpreter_path = self._interpreter_path if module_path == self._module_path \
+                else os.path.join(module_path, "Python")
+            opt.prepare(interpreter_path=interpreter_path,
+                        module_path=module_path,
                         terminal=self._terminal,
                         work_dir=self._work_dir)
             opt.run(op_path)
 
+        with phase(opt.name, kind="op", module=self.name):
+            cache = get_default_action_cache()
+            if cache is not None and opt.cacheable:
+                output_dirs = [ARTIFACT_RELATIVE_PATHS[tag] for tag in opt.pack_outputs or list()
+                               if tag in ARTIFACT_RELATIVE_PATHS]
+                cache.run(opt, _run, self._module_path, output_dirs=output_dirs, inputs=opt.get_cache_inputs())
+            else:
+                _run(self._module_path)
+
+    def serialize_unpack_opts(self):
         for opt in self.unpack_opts:
             Logging.info(f"正在封装{self.name}-{opt.name}OP")
             self._serialize_op(opt)
@@ -206,14 +298,13 @@ class SubModule:
             op_name = str(op_name)
             if os.path.splitext(op_name)[-1] == ".op":
                 op_path = os.path.join(self._module_path, "opt", self.name, op_name)
-                with open(op_path, "rb") as file:
+                with span(f"{self.name}/{op_name}", cat="op"), open(op_path, "rb") as file:
                     opt = pickle.load(file)
                     opt.prepare(interpreter_path=self._interpreter_path,
                                 module_path=self._module_path,
                                 terminal=self._terminal,
                                 work_dir=self._work_dir)
-                    if QPT_MODE != "Run":
-                        Logging.debug(f"正在加载{self.name}-{opt.name}OP")
+                    Logging.debug("正在加载%s-%sOP", self.name, opt.name)
                     opt.run(op_path)
 
     # ToDo:做序列化来保存
@@ -0,0 +1,118 @@
+import os
+import re
+import sys
+import subprocess
+
+from qpt.modules.base import SubModule, SubModuleOpt, BOTTOM_LEVEL_REDUCE
+from qpt.kernel.qlog import Logging
+
+# pyc的校验方式，详见PEP 552
+INVALIDATION_TIMESTAMP = "timestamp"  # 每次导入时比对源码的修改时间，源码被复制后修改时间变化会导致重新编译
+INVALIDATION_CHECKED_HASH = "checked-hash"  # 每次导入时计算源码哈希值
+INVALIDATION_UNCHECKED_HASH = "unchecked-hash"  # 不校验源码，导入最快，适合发布后不会被修改的源码
+
+
+def get_target_version(interpreter_path):
+    """
+    获取打包后解释器的版本号，嵌入式Python目录下存在形如python38.dll的文件
+    :param interpreter_path: Release/Python目录
+    :return: 形如38的版本号，未找到时返回None
+    """
+    if os.path.exists(interpreter_path):
+        for name in os.listdir(interpreter_path):
+            match = re.fullmatch(r"python(3\d+)\.dll", name.lower())
+            if match:
+                return match.group(1)
+    return None
+
+
+def get_compile_interpreter(interpreter_path):
+    """
+    获取可生成目标解释器magic number的Python解释器，版本一致时优先使用当前解释器
+    :param interpreter_path: Release/Python目录
+    :return: 解释器路径，均不可用时返回None
+    """
+    if get_target_version(interpreter_path) == f"{sys.version_info[0]}{sys.version_info[1]}":
+        return sys.executable
+    target_python = os.path.join(interpreter_path, "python.exe")
+    if os.path.exists(target_python):
+        return target_python
+    return None
+
+
+class CompileBytecodeOpt(SubModuleOpt):
+    def __init__(self, invalidation_mode=INVALIDATION_UNCHECKED_HASH, sourceless=False, workers=0,
+                 launcher_py_path=None):
+        """
+        :param invalidation_mode: pyc的校验方式
+        :param sourceless: 是否删除resources中的源码，仅保留pyc（主程序文件除外）
+        :param workers: 编译进程数，0表示使用全部CPU核心
+        :param launcher_py_path: 主程序文件相对于resources的路径，该文件需以源码形式被启动器调用
+        """
+        super().__init__()
+        self.invalidation_mode = invalidation_mode
+        self.sourceless = sourceless
+        self.workers = workers
+        self.launcher_py_path = launcher_py_path
+
+    def _compile(self, python, path, legacy=False):
+        # 在子进程中使用compileall的进程池，避免Windows下spawn方式重新执行用户的打包脚本
+        cmd = [python, "-m", "compileall", "-q", "-j", str(self.workers),
+               "--invalidation-mode", self.invalidation_mode]
+        if legacy:
+            # 将pyc与源码放置于同一目录，删除源码后仍可被导入
+            cmd.append("-b")
+        cmd.append(path)
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            output = result.stdout.decode("utf-8", errors="ignore").strip()
+            Logging.warning(f"{path}中存在无法被编译的文件，这些文件将在运行时从源码导入：\n{output[-2000:]}")
+
+    def act(self) -> None:
+        python = get_compile_interpreter(self.interpreter_path)
+        if python is None:
+            Logging.warning("未找到与打包后解释器版本一致的Python解释器，已跳过预编译")
+            return
+        Logging.info(f"正在使用{python}预编译字节码，校验方式为{self.invalidation_mode}")
+
+        resources_path = os.path.join(self.module_path, "resources")
+        if os.path.exists(resources_path):
+            self._compile(python, resources_path, legacy=self.sourceless)
+            if self.sourceless:
+                self._remove_sources(resources_path)
+        # 第三方包可能通过inspect等方式读取自身源码，故始终保留源码
+        if os.path.exists(self.module_site_package_path):
+            self._compile(python, self.module_site_package_path)
+
+    def _remove_sources(self, resources_path):
+        launcher_py_path = os.path.abspath(os.path.join(resources_path, self.launcher_py_path)) \
+            if self.launcher_py_path else None
+        count = 0
+        for root, dirs, files in os.walk(resources_path):
+            for file in files:
+                if not file.endswith(".py"):
+                    continue
+                file_path = os.path.join(root, file)
+                if os.path.abspath(file_path) == launcher_py_path or not os.path.exists(file_path + "c"):
+                    continue
+                os.remove(file_path)
+                count += 1
+        Logging.info(f"已删除resources中{count}个已被编译的源码文件")
+
+
+class CompileBytecode(SubModule):
+    def __init__(self, invalidation_mode=INVALIDATION_UNCHECKED_HASH, sourceless=False, workers=0,
+                 launcher_py_path=None):
+        """
+        打包时使用进程池将resources与site-packages预编译为目标解释器的pyc，减少首次启动及只读目录下每次启动的编译耗时
+        :param invalidation_mode: pyc的校验方式，默认为unchecked-hash
+        :param sourceless: 是否删除resources中的源码，仅保留pyc（主程序文件除外）
+        :param workers: 编译进程数，0表示使用全部CPU核心
+        :param launcher_py_path: 主程序文件相对于resources的路径
+        """
+        # 需在依赖安装、纯Python包压缩等操作完成后执行
+        super().__init__(level=BOTTOM_LEVEL_REDUCE)
+        self.add_pack_opt(CompileBytecodeOpt(invalidation_mode=invalidation_mode,
+                                             sourceless=sourceless,
+                                             workers=workers,
+                                             launcher_py_path=launcher_py_path))
@@ -7,7 +7,7 @@ import os
 import sys
 
 from qpt.kernel.qos import copytree
-from qpt.modules.base import SubModule, SubModuleOpt
+from qpt.modules.base import SubModule, SubModuleOpt, RESOURCE_ENVIRON, PACK_RESOURCE_DISK, ARTIFACT_CUDA
 
 
 class SearchCUDA:
@@ -30,10 +30,22 @@ class SearchCUDA:
 
 
 class CopyCUDADLL(SubModuleOpt):
+    pack_inputs = list()
+    pack_outputs = [ARTIFACT_CUDA]
+    pack_resources = [PACK_RESOURCE_DISK]
+    cacheable = True
+
     def __init__(self, cuda_version):
         super(CopyCUDADLL, self).__init__()
         self.cuda_version = cuda_version
 
+    def get_cache_inputs(self) -> list:
+        if self.cuda_version is None:
+            return list()
+        version = self.cuda_version.split(".")
+        base_path = os.environ.get(f"CUDA_PATH_V{version[0]}_{version[-1]}")
+        return [os.path.join(base_path, "bin")] if base_path else list()
+
     def act(self) -> None:
         if self.cuda_version is None:
             raise Exception("暂不接受不指定版本的情况")
@@ -50,6 +62,8 @@ class CopyCUDADLL(SubModuleOpt):
 
 
 class SetCUDAEnv(SubModuleOpt):
+    resources = [RESOURCE_ENVIRON]
+
     def __init__(self):
         super(SetCUDAEnv, self).__init__()
 
@@ -61,6 +75,7 @@ class SetCUDAEnv(SubModuleOpt):
 
 class CopyCUDAPackage(SubModule):
     def __init__(self, cuda_version):
-        super().__init__()
+        # 仅设置环境变量，无需等待其它Module
+        super().__init__(depends=list())
         self.add_pack_opt(CopyCUDADLL(cuda_version=cuda_version))
         self.add_unpack_opt(SetCUDAEnv())
@@ -7,7 +7,9 @@ import os
 import shutil
 
 from qpt.version import version as qpt_version
-from qpt.modules.base import SubModule, SubModuleOpt, TOP_LEVEL_REDUCE, LOW_LEVEL, GENERAL_LEVEL
+from qpt.modules.base import SubModule, SubModuleOpt, TOP_LEVEL_REDUCE, LOW_LEVEL, GENERAL_LEVEL, \
+    RESOURCE_SITE_PACKAGES, PACK_RESOURCE_DISK, PACK_RESOURCE_NET, PACK_RESOURCE_PIP, ARTIFACT_SITE_PACKAGES, \
+    ARTIFACT_PACKAGES
 from qpt.kernel.qos import FileSerialize, ArgManager
 from qpt.kernel.qlog import Logging
 from qpt.kernel.qcode import PythonPackages
@@ -23,6 +25,78 @@ PACKAGE_FOR_PYTHON38_VERSION = "3.8"
 DEFAULT_PACKAGE_FOR_PYTHON_VERSION = None  # None表示不设置
 
 
+def _get_requirement_files(opts: ArgManager, find_links: str = None) -> list:
+    """
+    获取pip参数中引用的本地文件，作为动作缓存的输入
+    """
+    args = str(opts).split(" ")
+    files = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg in ["-r", "--requirement", "-c", "--constraint"]]
+    if find_links and os.path.exists(find_links):
+        files.append(find_links)
+    return files
+
+
+def _read_requirement_lines(file_path) -> list:
+    """
+    读取requirements文件，合并续行并去除注释，嵌套的-r文件会被展开
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read().replace("\\\n", " ")
+    lines = list()
+    for line in text.splitlines():
+        line = line.split(" #")[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        for flag in ["-r ", "--requirement "]:
+            if line.startswith(flag):
+                nested = line[len(flag):].strip()
+                lines += _read_requirement_lines(os.path.join(os.path.dirname(file_path), nested))
+                break
+        else:
+            lines.append(line)
+    return lines
+
+
+def _is_pinned(package: str, version: str, no_dependent, opts: ArgManager) -> bool:
+    """
+    判断需要安装的依赖是否已完全固定版本，仅此时pip的执行结果完全由参数决定，可使用动作缓存
+    需满足全部依赖均使用==指定版本，且不安装子依赖或使用pip的哈希校验模式（该模式要求子依赖同样被固定）
+    """
+    if FLAG_FILE_SERIALIZE in package[:32]:
+        return False
+    args = str(opts).split(" ")
+    requirements = list()
+    if package:
+        if version:
+            requirements.append(package + (version if version.startswith("==") else "==" + version))
+        else:
+            requirements.append(package)
+    try:
+        for i, arg in enumerate(args[:-1]):
+            if arg in ["-r", "--requirement"]:
+                requirements += _read_requirement_lines(args[i + 1])
+    except OSError:
+        return False
+
+    require_hashes = "--require-hashes" in args or "--require-hashes" in requirements
+    hashes = bool(requirements)
+    for line in requirements:
+        if line.startswith("-"):
+            # -e等可编辑安装无法固定版本，其它选项不影响依赖版本
+            if line.startswith("-e") or line.startswith("--editable"):
+                return False
+            continue
+        hashes = hashes and "--hash" in line
+        spec = line.split(";")[0].split("--hash")[0].strip()
+        if "==" not in spec or "@" in spec:
+            return False
+        pinned_version = spec.split("==", 1)[1].lstrip("=")
+        if not pinned_version or any(c in pinned_version for c in "*,<>!~="):
+            return False
+    closed = no_dependent or "--no-deps" in args or require_hashes or hashes
+    return bool(requirements) and closed
+
+
 def set_default_deploy_mode(mode):
     """
     设置全局部署方式
@@ -42,6 +116,10 @@ def set_default_package_for_python_version(version):
 
 
 class DownloadWhlOpt(SubModuleOpt):
+    pack_inputs = list()
+    pack_outputs = [ARTIFACT_PACKAGES]
+    pack_resources = [PACK_RESOURCE_PIP, PACK_RESOURCE_NET]
+
     def __init__(self,
                  package: str = "",
                  version: str = None,
@@ -58,9 +136,17 @@ class DownloadWhlOpt(SubModuleOpt):
         self.package = package
         self.no_dependent = no_dependent
         self.find_links = find_links
+        if find_links:
+            # find_links可能指向已下载的依赖包，需等待下载完毕
+            self.pack_inputs = [ARTIFACT_PACKAGES]
         self.opts = opts
         self.version = version
         self.python_version = python_version
+        # 未固定版本时每次解析的结果可能不同，不使用动作缓存
+        self.cacheable = _is_pinned(package, version, no_dependent, opts)
+
+    def get_cache_inputs(self) -> list:
+        return _get_requirement_files(self.opts, self.find_links)
 
     def act(self) -> None:
         # 对固化的Requirement文件进行解冻
@@ -78,6 +164,8 @@ class DownloadWhlOpt(SubModuleOpt):
 
 
 class LocalInstallWhlOpt(SubModuleOpt):
+    resources = [RESOURCE_SITE_PACKAGES]
+
     def __init__(self,
                  package: str = "",
                  version: str = None,
@@ -120,6 +208,11 @@ class LocalInstallWhlOpt(SubModuleOpt):
 
 
 class OnlineInstallWhlOpt(SubModuleOpt):
+    resources = [RESOURCE_SITE_PACKAGES]
+    pack_inputs = list()
+    pack_outputs = [ARTIFACT_SITE_PACKAGES]
+    pack_resources = [PACK_RESOURCE_PIP, PACK_RESOURCE_NET]
+
     def __init__(self,
                  package: str = "",
                  version: str = None,
@@ -138,6 +231,9 @@ class OnlineInstallWhlOpt(SubModuleOpt):
         self.to_module_env = to_module_env_path
         self.no_dependent = no_dependent
         self.find_links = find_links
+        if find_links:
+            # find_links可能指向已下载的依赖包，需等待下载完毕
+            self.pack_inputs = [ARTIFACT_PACKAGES]
         self.opts = opts
         self.version = version
         self.to_python_env_version = to_python_env_version
@@ -145,6 +241,11 @@ class OnlineInstallWhlOpt(SubModuleOpt):
             assert to_module_env_path, "安装在当前环境则不需要设置Python版本号参数to_python_env_version。" \
                                        "若需要安装其它位置，请设置to_module_env_path参数使包安装在其它位置。"
             self.to_python_env_version = DEFAULT_PACKAGE_FOR_PYTHON_VERSION
+        # 安装至当前环境时不产生Module目录中的文件，无法缓存；未固定版本时每次解析的结果可能不同，同样不缓存
+        self.cacheable = bool(to_module_env_path) and _is_pinned(package, version, no_dependent, opts)
+
+    def get_cache_inputs(self) -> list:
+        return _get_requirement_files(self.opts, self.find_links)
 
     def act(self) -> None:
         if FLAG_FILE_SERIALIZE in self.package[:32]:
@@ -163,6 +264,11 @@ class OnlineInstallWhlOpt(SubModuleOpt):
 
 
 class CopyLocalWhlAllFileOpt(SubModuleOpt):
+    resources = [RESOURCE_SITE_PACKAGES]
+    pack_inputs = list()
+    pack_outputs = [ARTIFACT_SITE_PACKAGES]
+    pack_resources = [PACK_RESOURCE_DISK]
+
     def __init__(self, package: str):
         super().__init__(disposable=True)
         self.package = package
@@ -176,6 +282,8 @@ class CopyLocalWhlAllFileOpt(SubModuleOpt):
 
 
 class BatchInstallationOpt(SubModuleOpt):
+    resources = [RESOURCE_SITE_PACKAGES]
+
     def __init__(self, path=None):
         super(BatchInstallationOpt, self).__init__(disposable=True)
         self.path = path
@@ -311,6 +419,12 @@ class BatchInstallation(SubModule):
 
 
 class CopyWhl2PackagesOpt(SubModuleOpt):
+    resources = [RESOURCE_SITE_PACKAGES]
+    pack_inputs = list()
+    pack_outputs = [ARTIFACT_PACKAGES]
+    pack_resources = [PACK_RESOURCE_DISK]
+    cacheable = True
+
     def __init__(self, whl_path):
         """
         适用于安装额外且单一的whl包，将whl包移动至打包后的opt/packages目录，在首次运行EXE时会自动对该包进行安装。
@@ -319,6 +433,9 @@ class CopyWhl2PackagesOpt(SubModuleOpt):
         super().__init__(disposable=True)
         self.whl_path = whl_path
 
+    def get_cache_inputs(self) -> list:
+        return [self.whl_path]
+
     def act(self) -> None:
         shutil.copy(src=self.whl_path, dst=self.packages_path)
 
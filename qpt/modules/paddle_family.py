@@ -8,13 +8,16 @@ import sys
 
 from qpt.kernel.qos import download
 from qpt.kernel.qlog import Logging
-from qpt.modules.base import SubModule, SubModuleOpt, GENERAL_LEVEL_REDUCE, LOW_LEVEL_REDUCE, HIGH_LEVEL_REDUCE
+from qpt.modules.base import SubModule, SubModuleOpt, GENERAL_LEVEL_REDUCE, LOW_LEVEL_REDUCE, HIGH_LEVEL_REDUCE, \
+    RESOURCE_ENVIRON
 from qpt.modules.package import CustomPackage, DEFAULT_DEPLOY_MODE, CopyWhl2Packages, ArgManager
 from qpt.modules.cuda import CopyCUDAPackage
 from qpt.memory import QPT_MEMORY
 
 
 class SetPaddleFamilyEnvValueOpt(SubModuleOpt):
+    resources = [RESOURCE_ENVIRON]
+
     def __init__(self):
         super(SetPaddleFamilyEnvValueOpt, self).__init__()
 
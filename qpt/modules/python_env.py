@@ -1,10 +1,19 @@
 import os
 import sys
+import json
+import hashlib
+import shutil
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-from qpt.modules.base import SubModule, SubModuleOpt, TOP_LEVEL
-from qpt.kernel.qlog import Logging
-from qpt.kernel.qos import download, get_qpt_tmp_path, copytree
+from qpt.modules.base import SubModule, SubModuleOpt, TOP_LEVEL, BOTTOM_LEVEL_REDUCE, PACK_RESOURCE_NET, \
+    PACK_RESOURCE_DISK, ARTIFACT_PYTHON
+from qpt.kernel.qlog import Logging, TProgressBar
+from qpt.kernel.qos import download, get_qpt_tmp_path, copytree, get_file_hash
+from qpt.kernel.qzip import make_volumes, extract_volumes, extract_members, get_volume_paths, \
+    DEFAULT_VOLUME_SIZE, DEFAULT_COMPRESS_LEVEL
+from qpt.kernel.qmanifest import make_manifest, verify_manifest, VERIFY_QUICK
+from qpt.kernel.qfetch import fetch_online_release, ONLINE_MANIFEST_NAME, HASH_ALGORITHM
 from qpt.memory import QPT_MEMORY
 
 """
@@ -16,8 +25,8 @@ Python镜像打包指南
 """
 
 PYTHON_ENV_MODE_SPEED_FIRST = "预先解压好Python环境，占用部分硬盘资源但能减少用户使用时速度损失"
-PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST = "[暂不支持]封装后保留压缩的Python环境以减少硬盘资源占用"
-PYTHON_ENV_MODE_ONLINE_INSTALLATION = "[暂不支持]不封装Python环境，用户使用时在线进行下载并部署"
+PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST = "封装后保留压缩的Python环境以减少硬盘资源占用，首次运行时并行解压"
+PYTHON_ENV_MODE_ONLINE_INSTALLATION = "不封装Python环境与依赖包，用户首次使用时在线进行下载并部署"
 DEFINE_PYTHON_ENV_MODE = PYTHON_ENV_MODE_SPEED_FIRST
 
 # 增加Key时，需要维护
@@ -41,34 +50,75 @@ RESOURCES_URLS = {"Python3.7Env-Win": "https://bj.bcebos.com/v1/ai-studio-online
 
 DEFAULT_PYTHON_IMAGE_VERSION = "3.8"
 
+# 解压后的解释器模板缓存目录，模板以Python.zip的哈希值命名，以硬链接的方式放入Release目录
+PYTHON_TEMPLATE_DIR_NAME = "PythonTemplate"
+# 模板解压完毕后写入的清单，同时作为模板完整的标记
+TEMPLATE_MANIFEST_NAME = "template_manifest.txt"
+PYTHON_IMAGE_PASSWORD = "gt_qpt"
+
+# PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST模式下分卷的保存目录（相对于Release目录）
+PYTHON_VOLUME_RELATIVE_PATH = "opt/python_volume"
+# PYTHON_ENV_MODE_ONLINE_INSTALLATION模式下待上传文件的保存目录（相对于打包的保存目录）
+ONLINE_RELATIVE_PATH = "Online"
+# PYTHON_ENV_MODE_ONLINE_INSTALLATION模式下下载进度条每一步对应的字节数
+DOWNLOAD_PROGRESS_UNIT = 1024 * 1024
+
+
+def get_python_template(zip_path) -> str:
+    """
+    获取解压后的解释器模板，模板不存在或与解压时不一致时重新解压
+    :param zip_path: Python.zip路径
+    :return: 模板中Python目录的路径
+    """
+    template_path = get_qpt_tmp_path(os.path.join(PYTHON_TEMPLATE_DIR_NAME, get_file_hash(zip_path)[:16]))
+    python_path = os.path.join(template_path, "Python")
+    manifest_path = os.path.join(template_path, TEMPLATE_MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        # 模板中的文件与Release目录中的文件互为硬链接，修改后会同时改变大小与修改时间
+        mismatches = verify_manifest(python_path, manifest_path, mode=VERIFY_QUICK)
+        if not mismatches:
+            Logging.info(f"已找到解释器模板{template_path}")
+            return python_path
+        Logging.warning(f"解释器模板{template_path}中有{len(mismatches)}个文件与解压时不一致，正在重新解压")
+        os.remove(manifest_path)
+
+    # 解压至临时目录后再重命名，中断后不会留下不完整的模板
+    tmp_path = f"{python_path}.{os.getpid()}.tmp"
+    for path in [python_path, tmp_path]:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    Logging.info(f"正在解压Python解释器至{template_path}")
+    extract_members(zip_path, tmp_path, pwd=PYTHON_IMAGE_PASSWORD.encode("utf-8"))
+    os.replace(tmp_path, python_path)
+    make_manifest(python_path, manifest_path)
+    return python_path
+
 
 class PackPythonEnvOpt(SubModuleOpt):
+    pack_inputs = list()
+    pack_outputs = [ARTIFACT_PYTHON]
+    pack_resources = [PACK_RESOURCE_NET, PACK_RESOURCE_DISK]
+    cacheable = True
+
     def __init__(self, url: str = None, mode=PYTHON_ENV_MODE_SPEED_FIRST):
         super().__init__()
         self.url = url
         self.mode = mode
 
     def act(self) -> None:
-        if self.mode == PYTHON_ENV_MODE_SPEED_FIRST:
-            dir_name = get_qpt_tmp_path(os.path.join("Python", "".join(list(filter(str.isdigit, self.url)))[-10:]))
-            cache_path = get_qpt_tmp_path(
-                os.path.join("Python", "".join(list(filter(str.isdigit, self.url)))[-10:]
-                             , "unzip"))
+        # 启动器需要直接调用Python/python.exe，故解释器本身始终以解压后的形式封装，
+        # PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST模式下由PythonEnvVolume压缩后续安装至Python目录中的文件
+        # PYTHON_ENV_MODE_ONLINE_INSTALLATION模式下打包时同样需要解释器安装依赖，Debug目录生成后再由make_online_release移出
+        if self.mode in [PYTHON_ENV_MODE_SPEED_FIRST,
+                         PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST,
+                         PYTHON_ENV_MODE_ONLINE_INSTALLATION]:
+            url_key = hashlib.md5(self.url.encode("utf-8")).hexdigest()[:16]
+            dir_name = get_qpt_tmp_path(os.path.join("Python", url_key))
             Logging.info(f"正在加载Python解释器原文件至{dir_name}")
-            d_result, _ = download(self.url, "Python.zip", dir_name)
-            if d_result:
-                zip_path = os.path.join(dir_name, "Python.zip")
-                # 解压至输出文件夹
-                with zipfile.ZipFile(zip_path) as zip_obj:
-                    zip_obj.extractall(cache_path, pwd="gt_qpt".encode("utf-8"))
-            copytree(cache_path, os.path.join(self.module_path, "Python"))
-
-        # ToDo 后续支持
-        elif self.mode == PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST:
-            Logging.info(f"正在加载Python解释器原文件")
-            download(self.url, "Python.zip", self.module_path)
-        elif self.mode == PYTHON_ENV_MODE_ONLINE_INSTALLATION:
-            pass
+            download(self.url, "Python.zip", dir_name)
+            template_path = get_python_template(os.path.join(dir_name, "Python.zip"))
+            # 后续操作均通过删除后新建的方式修改Python目录中的文件，不会影响模板
+            copytree(template_path, os.path.join(self.module_path, "Python"), link=True)
 
 
 class UnPackPythonEnvOpt(SubModuleOpt):
@@ -78,21 +128,28 @@ class UnPackPythonEnvOpt(SubModuleOpt):
         self.mode = mode
 
     def act(self) -> None:
-        if self.mode == PYTHON_ENV_MODE_SPEED_FIRST:
+        if self.mode in [PYTHON_ENV_MODE_SPEED_FIRST, PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST]:
             pass
-        elif self.mode == PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST:
-            zip_path = os.path.join(self.module_path, "Python.zip")
-            # 解压至输出文件夹
-            with zipfile.ZipFile(zip_path) as zip_obj:
-                zip_obj.extractall(os.path.join(self.module_path, "Python"), pwd="gt_qpt".encode("utf-8"))
         elif self.mode == PYTHON_ENV_MODE_ONLINE_INSTALLATION:
-            dir_name = get_qpt_tmp_path(os.path.join("Python", "".join(list(filter(str.isdigit, self.url)))[-10:]))
-            Logging.debug(f"正在下载Python解释器原文件至{dir_name}")
-            download(self.url, "Python.zip", dir_name)
-            zip_path = os.path.join(dir_name, "Python.zip")
-            # 解压至输出文件夹
-            with zipfile.ZipFile(zip_path) as zip_obj:
-                zip_obj.extractall(os.path.join(self.module_path, "Python"), pwd="gt_qpt".encode("utf-8"))
+            # 解释器已由configs/bootstrap.ps1在启动前下载，此处下载其余依赖包
+            # 进度条以MB为单位，由进度总线合并输出，避免每个分段输出一行日志
+            progress = {"bar": None, "done": 0}
+
+            def callback(done, total):
+                if progress["bar"] is None:
+                    progress["bar"] = TProgressBar("下载依赖", max_len=-(-total // DOWNLOAD_PROGRESS_UNIT) + 1)
+                bar = progress["bar"]
+                count = bar.max_len if done >= total else done // DOWNLOAD_PROGRESS_UNIT
+                bar.step(add_end_info=f"{done / 1024 / 1024:.2f}/{total / 1024 / 1024:.2f}MB",
+                         nbytes=done - progress["done"],
+                         n=max(count - bar.count, 0))
+                progress["done"] = done
+
+            try:
+                fetch_online_release(self.module_path, callback=callback)
+            finally:
+                if progress["bar"] is not None:
+                    progress["bar"].close()
 
         # 添加Python以及Python/lib/python/site_packages_path下的包到环境变量/工作目录
         python_path = self.interpreter_path
@@ -103,6 +160,148 @@ class UnPackPythonEnvOpt(SubModuleOpt):
         sys.path.append(script_path)
 
 
+class PackPythonVolumeOpt(SubModuleOpt):
+    def __init__(self, volume_size=DEFAULT_VOLUME_SIZE, compress_level=DEFAULT_COMPRESS_LEVEL):
+        super().__init__()
+        self.volume_size = volume_size
+        self.compress_level = compress_level
+        # 打包时由PythonEnvVolume.take_snapshot设置，其中的文件保持解压状态
+        self.keep_files = set()
+
+    def act(self) -> None:
+        python_path = os.path.join(self.module_path, "Python")
+        rel_paths = list()
+        for root, dirs, files in os.walk(python_path):
+            for file in files:
+                rel_path = os.path.relpath(os.path.join(root, file), self.module_path).replace("\\", "/")
+                # ZipPurePackages生成的压缩包需在解压分卷前加入sys.path，且本身已被压缩，故不放入分卷
+                if rel_path in self.keep_files or (file.startswith("site-packages-") and file.endswith(".zip")):
+                    continue
+                rel_paths.append(rel_path)
+        if not rel_paths:
+            Logging.info("Python环境中没有需要压缩的文件，已跳过压缩")
+            return
+
+        save_dir = os.path.join(self.module_path, PYTHON_VOLUME_RELATIVE_PATH)
+        Logging.info(f"正在将Python环境中的{len(rel_paths)}个文件压缩至{os.path.abspath(save_dir)}")
+        volume_paths = make_volumes(self.module_path,
+                                    rel_paths,
+                                    save_dir,
+                                    volume_size=self.volume_size,
+                                    compress_level=self.compress_level)
+        for rel_path in rel_paths:
+            os.remove(os.path.join(self.module_path, rel_path))
+        # 清理压缩后遗留的空目录
+        for root, dirs, files in os.walk(python_path, topdown=False):
+            if not os.listdir(root):
+                os.rmdir(root)
+        raw_size = sum([os.path.getsize(p) for p in volume_paths])
+        Logging.info(f"Python环境压缩完毕，共{len(volume_paths)}个分卷，总大小为{raw_size / 1024 / 1024:.2f}MB")
+
+
+class UnPackPythonVolumeOpt(SubModuleOpt):
+    def __init__(self, workers=None):
+        super().__init__(disposable=True)
+        self.workers = workers
+
+    def act(self) -> None:
+        save_dir = os.path.join(self.module_path, PYTHON_VOLUME_RELATIVE_PATH)
+        volume_paths = get_volume_paths(save_dir)
+        if not volume_paths:
+            return
+        Logging.info(f"正在解压Python环境，共{len(volume_paths)}个分卷")
+        tp = TProgressBar("解压进度", max_len=len(volume_paths) + 1)
+
+        def callback(volume_path):
+            tp.step(add_end_info=os.path.basename(volume_path))
+            # 解压后删除分卷，避免占用双倍硬盘空间
+            os.remove(volume_path)
+
+        extract_volumes(volume_paths, self.module_path, workers=self.workers, callback=callback)
+
+
+def make_online_release(module_path, online_path, base_url, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """
+    PYTHON_ENV_MODE_ONLINE_INSTALLATION模式下将Python环境与依赖包移出Release目录，Release中仅保留清单
+    :param module_path: Release目录
+    :param online_path: 待上传文件的保存目录，需将该目录中的文件上传至base_url
+    :param base_url: 用户使用时的下载地址
+    :param compress_level: Python环境的压缩等级
+    """
+    os.makedirs(online_path, exist_ok=True)
+    files = list()
+
+    # Python环境 - 压缩包内路径以Python/开头，由bootstrap.ps1在启动前下载并解压至Release目录
+    python_path = os.path.join(module_path, "Python")
+    tmp_zip_path = os.path.join(online_path, "Python.zip.tmp")
+    with zipfile.ZipFile(tmp_zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compress_level) as zip_obj:
+        for root, dirs, names in os.walk(python_path):
+            for name in names:
+                file_path = os.path.join(root, name)
+                zip_obj.write(file_path, arcname=os.path.relpath(file_path, module_path).replace("\\", "/"))
+    python_hash = get_file_hash(tmp_zip_path, algorithm=HASH_ALGORITHM)
+    python_zip_name = f"Python-{python_hash[:12]}.zip"
+    os.replace(tmp_zip_path, os.path.join(online_path, python_zip_name))
+    files.append({"name": python_zip_name,
+                  "sha256": python_hash,
+                  "size": os.path.getsize(os.path.join(online_path, python_zip_name)),
+                  "dst": ".",
+                  "check": "Python/python.exe",
+                  "extract": True,
+                  "bootstrap": True})
+
+    # 依赖包 - 由UnPackPythonEnvOpt在部署其它SubModule前下载
+    packages_rel_path = QPT_MEMORY.get_down_packages_relative_path
+    packages_path = os.path.join(module_path, packages_rel_path)
+    names = sorted(name for name in os.listdir(packages_path)
+                   if os.path.isfile(os.path.join(packages_path, name))) if os.path.exists(packages_path) else list()
+    with ThreadPoolExecutor() as pool:
+        hashes = list(pool.map(lambda n: get_file_hash(os.path.join(packages_path, n), algorithm=HASH_ALGORITHM),
+                               names))
+    for name, file_hash in zip(names, hashes):
+        rel_path = packages_rel_path + "/" + name
+        files.append({"name": name,
+                      "sha256": file_hash,
+                      "size": os.path.getsize(os.path.join(packages_path, name)),
+                      "dst": rel_path,
+                      "check": rel_path,
+                      "extract": False,
+                      "bootstrap": False})
+        shutil.move(os.path.join(packages_path, name), os.path.join(online_path, name))
+
+    with open(os.path.join(module_path, "configs", ONLINE_MANIFEST_NAME), "w", encoding="utf-8") as manifest_file:
+        json.dump({"base_url": base_url, "files": files}, manifest_file, ensure_ascii=False, indent=1)
+    shutil.rmtree(python_path)
+    total = sum(item["size"] for item in files)
+    Logging.info(f"已将Python环境与{len(names)}个依赖包移至{os.path.abspath(online_path)}，"
+                 f"共{total / 1024 / 1024:.2f}MB，请将该目录中的文件上传至{base_url}")
+
+
+class PythonEnvVolume(SubModule):
+    def __init__(self, volume_size=DEFAULT_VOLUME_SIZE, compress_level=DEFAULT_COMPRESS_LEVEL):
+        """
+        PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST模式下将Python环境中的文件压缩为多个独立分卷，首次运行时使用线程池并行解压
+        :param volume_size: 单个分卷的目标大小
+        :param compress_level: 压缩等级，1~9
+        """
+        # 需在其余SubModule均安装完毕后再压缩
+        super().__init__(level=BOTTOM_LEVEL_REDUCE)
+        self.pack_volume_opt = PackPythonVolumeOpt(volume_size=volume_size, compress_level=compress_level)
+        self.add_pack_opt(self.pack_volume_opt)
+        self.add_unpack_opt(UnPackPythonVolumeOpt())
+
+    def take_snapshot(self, module_path):
+        """
+        记录当前Python目录中的文件，这些文件为QPT运行时所必须的文件，不会被压缩
+        :param module_path: Release目录
+        """
+        keep_files = set()
+        for root, dirs, files in os.walk(os.path.join(module_path, "Python")):
+            for file in files:
+                keep_files.add(os.path.relpath(os.path.join(root, file), module_path).replace("\\", "/"))
+        self.pack_volume_opt.keep_files = keep_files
+
+
 class BasePythonEnv(SubModule):
     def __init__(self, name, version=None, mode=DEFINE_PYTHON_ENV_MODE, url=None):
         if version:
@@ -129,6 +328,7 @@ class BasePythonEnv(SubModule):
             url = RESOURCES_URLS[resources_name]
         assert url and version, "请至少设置url和version中任一字段"
         super().__init__(name, level=TOP_LEVEL)
+        self.mode = mode
         self.add_pack_opt(PackPythonEnvOpt(url=url, mode=mode))
         self.add_unpack_opt(UnPackPythonEnvOpt(url=url, mode=mode))
         self.python_version = "非标准的PythonSubModule，需指定版本号"
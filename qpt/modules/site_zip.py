@@ -0,0 +1,226 @@
+import os
+import re
+import csv
+import sys
+import shutil
+import zipfile
+import tempfile
+import py_compile
+from typing import List
+
+from qpt.modules.base import SubModule, SubModuleOpt, BOTTOM_LEVEL
+from qpt.modules.bytecode import get_target_version
+from qpt.kernel.qlog import Logging
+from qpt.kernel.qcode import PythonPackages, PACKAGE_FLAG
+from qpt.kernel.qzip import SITE_ZIP_NAME_FORMAT
+
+# 以下包会通过__file__拼接路径的方式读取自身的数据文件，或为QPT运行时所必须的包，始终保持解压状态
+DEFAULT_UNZIP_PACKAGES = ["qpt", "pip", "setuptools", "wheel", "pywin32", "wget", "ttkbootstrap",
+                          "certifi", "pytz", "tzdata", "jieba", "nltk", "matplotlib", "streamlit", "gradio",
+                          "pyinstaller", "babel", "faker", "pygments", "jinja2", "django", "flask"]
+
+# 以下类型的文件无法被zipimport加载，或依赖site模块处理，包含该类文件的包保持解压状态
+NATIVE_EXTENSIONS = {".pyd", ".dll", ".so", ".exe", ".pth", ".manifest"}
+# 源码文件，除此之外的文件均视为数据文件
+SOURCE_EXTENSIONS = {".py", ".pyi", ".typed"}
+
+FILE_ACCESS_PATTERN = re.compile(r"\b__file__\b")
+
+
+def _normalize(name):
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+class Distribution:
+    def __init__(self, site_packages_path, dist_info):
+        self.dist_info = dist_info
+        self.name = _normalize(dist_info[:-len(PACKAGE_FLAG)].rsplit("-", 1)[0])
+        self.purelib = False
+        self.files = list()
+        self.tops = set()
+
+        dist_info_path = os.path.join(site_packages_path, dist_info)
+        wheel_path = os.path.join(dist_info_path, "WHEEL")
+        if os.path.exists(wheel_path):
+            with open(wheel_path, "r", encoding="utf-8") as wheel_file:
+                for line in wheel_file:
+                    if line.lower().startswith("root-is-purelib:"):
+                        self.purelib = line.split(":", 1)[1].strip().lower() == "true"
+
+        record_path = os.path.join(dist_info_path, "RECORD")
+        if os.path.exists(record_path):
+            with open(record_path, "r", encoding="utf-8", newline="") as record_file:
+                for row in csv.reader(record_file):
+                    if not row:
+                        continue
+                    rel_path = row[0].replace("\\", "/")
+                    # 位于site-packages之外的文件（例如Scripts目录下的入口）以及缓存文件不参与压缩
+                    if rel_path.startswith("../") or "__pycache__" in rel_path:
+                        continue
+                    self.files.append(rel_path)
+                    top = rel_path.split("/")[0]
+                    if top != dist_info:
+                        self.tops.add(os.path.splitext(top)[0].lower())
+        else:
+            self.purelib = False
+
+    def get_native_reason(self, site_packages_path):
+        """
+        判断该包是否需要保持解压状态
+        :return: 原因，若可被压缩则返回None
+        """
+        if not self.files:
+            return "缺少RECORD文件"
+        if not self.purelib:
+            return "Root-Is-Purelib不为true"
+        for rel_path in self.files:
+            if os.path.splitext(rel_path)[-1].lower() in NATIVE_EXTENSIONS:
+                return f"包含{rel_path}"
+        # 存在数据文件且源码中使用了__file__时，大概率会通过拼接路径的方式读取数据文件
+        data_files = [p for p in self.files
+                      if not p.startswith(self.dist_info + "/") and
+                      os.path.splitext(p)[-1].lower() not in SOURCE_EXTENSIONS]
+        if data_files:
+            for rel_path in self.files:
+                if os.path.splitext(rel_path)[-1] != ".py":
+                    continue
+                with open(os.path.join(site_packages_path, rel_path), "r", encoding="utf-8", errors="ignore") as f:
+                    if FILE_ACCESS_PATTERN.search(f.read()):
+                        return f"包含数据文件且{rel_path}中使用了__file__"
+        return None
+
+
+class ZipPurePackagesOpt(SubModuleOpt):
+    def __init__(self, unzip_packages: List[str] = None, compile_pyc=True):
+        super().__init__()
+        self.unzip_packages = set(_normalize(p) for p in DEFAULT_UNZIP_PACKAGES + (unzip_packages or list()))
+        self.compile_pyc = compile_pyc
+
+    def act(self) -> None:
+        site_packages_path = self.module_site_package_path
+        lib_path = os.path.dirname(site_packages_path)
+        if not os.path.exists(site_packages_path):
+            return
+        dists = [Distribution(site_packages_path, name) for name in os.listdir(site_packages_path)
+                 if name.endswith(PACKAGE_FLAG)]
+        if not dists:
+            Logging.info("site-packages中没有已安装的包，已跳过压缩纯Python包")
+            return
+
+        # 分类
+        keep = dict()
+        for dist in dists:
+            if dist.name in self.unzip_packages:
+                keep[dist.name] = "位于保持解压的名单中"
+            else:
+                reason = dist.get_native_reason(site_packages_path)
+                if reason:
+                    keep[dist.name] = reason
+        # 多个包共用同一顶层目录（命名空间包）时，只要其中一个保持解压，其余包同样需要保持解压
+        top_dists = dict()
+        for dist in dists:
+            for top in dist.tops:
+                top_dists.setdefault(top, list()).append(dist)
+        changed = True
+        while changed:
+            changed = False
+            for top, same_top_dists in top_dists.items():
+                if len(same_top_dists) > 1 and any(d.name in keep for d in same_top_dists):
+                    for d in same_top_dists:
+                        if d.name not in keep:
+                            keep[d.name] = f"与其它包共用{top}目录"
+                            changed = True
+        for name, reason in keep.items():
+            Logging.debug(f"{name}将保持解压状态：{reason}")
+        pure_dists = [dist for dist in dists if dist.name not in keep]
+        if not pure_dists:
+            Logging.info("未找到可被压缩的纯Python包")
+            return
+
+        # 用户代码直接导入的包为热点包，放置在第一个压缩包中并最先加入sys.path
+        hot_tops = PythonPackages.search_import_in_dir(self.work_dir) if os.path.exists(self.work_dir) else set()
+        hot_dists = [dist for dist in pure_dists if dist.tops & hot_tops]
+        cold_dists = [dist for dist in pure_dists if not dist.tops & hot_tops]
+
+        compile_pyc = self.compile_pyc
+        target_version = get_target_version(self.interpreter_path)
+        if compile_pyc and target_version != f"{sys.version_info[0]}{sys.version_info[1]}":
+            Logging.warning(f"当前解释器版本与打包后的解释器版本{target_version}不一致，压缩包中将不包含预编译的pyc文件")
+            compile_pyc = False
+
+        zip_id = 0
+        file_count = 0
+        for group in [hot_dists, cold_dists]:
+            if not group:
+                continue
+            zip_path = os.path.join(lib_path, SITE_ZIP_NAME_FORMAT.format(zip_id))
+            file_count += self._write_zip(site_packages_path, group, zip_path, compile_pyc)
+            zip_id += 1
+        for dist in pure_dists:
+            self._remove_dist(site_packages_path, dist)
+        Logging.info(f"已将{len(pure_dists)}个纯Python包共{file_count}个文件压缩至{zip_id}个压缩包中，"
+                     f"{len(keep)}个包保持解压状态")
+
+    @staticmethod
+    def _write_zip(site_packages_path, dists, zip_path, compile_pyc):
+        # __init__.py等浅层文件优先写入，使导入时读取的数据在文件中尽可能连续
+        files = list()
+        for dist in dists:
+            files += [p for p in dist.files if os.path.exists(os.path.join(site_packages_path, p))]
+        files.sort(key=lambda p: (p.count("/"), not p.endswith("__init__.py"), p))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_obj:
+                for rel_path in files:
+                    src_path = os.path.join(site_packages_path, rel_path)
+                    zip_obj.write(src_path, arcname=rel_path)
+                    if compile_pyc and rel_path.endswith(".py"):
+                        # zipimport只会读取与源码同目录的pyc，使用无需校验源码的hash-based pyc避免时区导致的时间戳不一致
+                        pyc_path = os.path.join(tmp_dir, rel_path + "c")
+                        try:
+                            py_compile.compile(src_path,
+                                               cfile=pyc_path,
+                                               dfile=os.path.join(os.path.basename(zip_path), rel_path),
+                                               doraise=True,
+                                               invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                            zip_obj.write(pyc_path, arcname=rel_path + "c")
+                        except py_compile.PyCompileError as e:
+                            Logging.debug(f"{rel_path}编译失败，将在运行时从源码导入：{e.msg}")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return len(files)
+
+    @staticmethod
+    def _remove_dist(site_packages_path, dist):
+        dirs = set()
+        for rel_path in dist.files:
+            path = os.path.join(site_packages_path, rel_path)
+            if os.path.exists(path):
+                os.remove(path)
+            dirs.add(os.path.dirname(path))
+        for top in dist.tops:
+            pycache = os.path.join(site_packages_path, top, "__pycache__")
+            if os.path.exists(pycache):
+                shutil.rmtree(pycache)
+        # 由深至浅清理空目录
+        for dir_path in sorted(dirs, key=len, reverse=True):
+            while os.path.normpath(dir_path) != os.path.normpath(site_packages_path) and os.path.exists(dir_path):
+                pycache = os.path.join(dir_path, "__pycache__")
+                if os.path.exists(pycache):
+                    shutil.rmtree(pycache)
+                if os.listdir(dir_path):
+                    break
+                os.rmdir(dir_path)
+                dir_path = os.path.dirname(dir_path)
+
+
+class ZipPurePackages(SubModule):
+    def __init__(self, unzip_packages: List[str] = None, compile_pyc=True):
+        """
+        将site-packages中的纯Python包压缩为少量zip文件并通过zipimport加载，以减少Release目录中的文件数量
+        :param unzip_packages: 额外需要保持解压状态的包名，适用于通过__file__读取数据文件的包
+        :param compile_pyc: 是否在压缩包中加入预编译的pyc文件，仅在当前解释器与打包后的解释器版本一致时生效
+        """
+        # 需在其余依赖安装完毕后执行
+        super().__init__(level=BOTTOM_LEVEL)
+        self.add_pack_opt(ZipPurePackagesOpt(unzip_packages=unzip_packages, compile_pyc=compile_pyc))
@@ -0,0 +1,258 @@
+import os
+import shutil
+from typing import List
+
+from qpt.modules.base import SubModule, SubModuleOpt, LOW_LEVEL_REDUCE
+from qpt.modules.site_zip import Distribution, _normalize
+from qpt.kernel.qlog import Logging
+from qpt.kernel.qcode import PythonPackages, PACKAGE_FLAG
+from qpt.kernel.qignore import IgnoreMatcher
+
+# 裁剪方案
+TRIM_NONE = None
+TRIM_CONSERVATIVE = "conservative"  # 仅删除测试、文档中的数据文件以及类型存根等不可被导入的文件
+TRIM_AGGRESSIVE = "aggressive"  # 额外删除C源码、调试符号、示例以及未被使用的tkinter等组件
+
+# site-packages中的裁剪规则，gitignore风格，路径相对于各包的顶层目录，.dist-info中的文件则相对于site-packages
+# 规则仅作用于RECORD中记录的文件，顶层包本身（例如名为tests或docs的包）不会被匹配
+# 出于许可证要求，LICENSE等文件始终保留
+CONSERVATIVE_SITE_RULES = ["tests/",
+                           "docs/",
+                           "doc/",
+                           "*.pyi",
+                           "py.typed",
+                           "*" + PACKAGE_FLAG + "/REQUESTED",
+                           "*" + PACKAGE_FLAG + "/direct_url.json"]
+# 部分包（如tensorflow）会在导入时加载名为test的模块，故test目录仅在aggressive方案中删除
+AGGRESSIVE_SITE_RULES = CONSERVATIVE_SITE_RULES + ["test/",
+                                                   "examples/",
+                                                   "benchmarks/",
+                                                   "include/",
+                                                   "*.pdb",
+                                                   "*.lib",
+                                                   "*.c",
+                                                   "*.cpp",
+                                                   "*.h",
+                                                   "*.hpp",
+                                                   "*.pyx",
+                                                   "*.pxd",
+                                                   "*.md",
+                                                   "*.rst"]
+
+# 解释器中的裁剪规则，路径相对于Python目录
+CONSERVATIVE_PYTHON_RULES = ["/Lib/idlelib/",
+                             "/Lib/lib2to3/",
+                             "/Lib/test/",
+                             "/Lib/unittest/test/",
+                             "/Lib/tkinter/test/",
+                             "/Lib/turtledemo/",
+                             "/Lib/ensurepip/",
+                             "/Doc/",
+                             "*.chm"]
+AGGRESSIVE_PYTHON_RULES = CONSERVATIVE_PYTHON_RULES + ["*.pdb",
+                                                       "/include/",
+                                                       "/libs/"]
+# tkinter相关组件，仅在确认未被使用时于aggressive方案中删除
+TKINTER_RULES = ["/tcl/",
+                 "/Lib/tkinter/",
+                 "_tkinter.pyd",
+                 "tcl86t.dll",
+                 "tk86t.dll"]
+# 依赖tkinter的包，安装了这些包时保留tkinter
+TKINTER_USERS = ["tkinter", "matplotlib", "ttkbootstrap", "customtkinter", "pysimplegui", "turtle"]
+
+TRIM_PROFILES = {TRIM_CONSERVATIVE: (CONSERVATIVE_SITE_RULES, CONSERVATIVE_PYTHON_RULES),
+                 TRIM_AGGRESSIVE: (AGGRESSIVE_SITE_RULES, AGGRESSIVE_PYTHON_RULES)}
+# 可被导入的文件，conservative方案中即使被规则匹配也不会删除
+IMPORTABLE_EXTENSIONS = {".py", ".pyc", ".pyd", ".so"}
+
+# 通过requirements中的#$QPT_FLAG$ trim_keep指令设置的保留规则，格式{包名: 规则列表}，规则列表为空表示不裁剪该包
+TRIM_KEEP_RULES = dict()
+
+
+def add_trim_keep(package, patterns: List[str] = None):
+    """
+    设置某个包在裁剪时需要保留的文件
+    :param package: 包名
+    :param patterns: gitignore风格的规则，路径相对于该包的顶层目录，为空时该包不会被裁剪
+    """
+    TRIM_KEEP_RULES[_normalize(package)] = list(patterns) if patterns else list()
+
+
+def _get_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            size += os.path.getsize(os.path.join(root, file))
+    return size
+
+
+def trim_dir(root, matcher: IgnoreMatcher, skip_dirs: List[str] = None) -> dict:
+    """
+    删除目录中被规则匹配的文件与目录
+    :param root: 根目录
+    :param matcher: 裁剪规则
+    :param skip_dirs: 不进入的目录，相对于root
+    :return: 被删除的路径及其大小，格式{相对路径: 大小}
+    """
+    skip_dirs = set(p.replace("\\", "/").strip("/") for p in (skip_dirs or list()))
+    removed = dict()
+    for dir_path, dirs, files in os.walk(root):
+        rel_dir = os.path.relpath(dir_path, root).replace("\\", "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        for name in list(dirs):
+            rel_path = rel_dir + "/" + name if rel_dir else name
+            if rel_path in skip_dirs:
+                dirs.remove(name)
+            elif matcher.match(rel_path, is_dir=True):
+                dirs.remove(name)
+                removed[rel_path] = _get_size(os.path.join(dir_path, name))
+                shutil.rmtree(os.path.join(dir_path, name))
+        for name in files:
+            rel_path = rel_dir + "/" + name if rel_dir else name
+            if matcher.match(rel_path, is_dir=False):
+                removed[rel_path] = os.path.getsize(os.path.join(dir_path, name))
+                os.remove(os.path.join(dir_path, name))
+    return removed
+
+
+def get_trim_files(dist: Distribution, matcher: IgnoreMatcher, keep_importable=True) -> List[str]:
+    """
+    获取包中需要被裁剪的文件
+    :param dist: Distribution对象，仅其RECORD中记录的文件会被匹配
+    :param matcher: 裁剪规则
+    :param keep_importable: 是否保留可被导入的Python模块
+    :return: 相对于site-packages的文件路径列表
+    """
+    files = list()
+    for rel_path in dist.files:
+        if keep_importable and os.path.splitext(rel_path)[-1].lower() in IMPORTABLE_EXTENSIONS:
+            continue
+        parts = rel_path.split("/")
+        if parts[0] == dist.dist_info:
+            if matcher.match(rel_path):
+                files.append(rel_path)
+        # 顶层的模块与目录本身不参与匹配，规则仅作用于顶层包内部的路径
+        elif len(parts) > 1 and matcher.match("/".join(parts[1:])):
+            files.append(rel_path)
+    return files
+
+
+def _remove_files(root, rel_paths: List[str]) -> dict:
+    """
+    删除文件及其__pycache__中的缓存，并清理因此产生的空目录
+    :return: 被删除的路径及其大小，格式{相对路径: 大小}
+    """
+    removed = dict()
+    dirs = set()
+    for rel_path in rel_paths:
+        file_path = os.path.join(root, rel_path)
+        if not os.path.isfile(file_path):
+            continue
+        removed[rel_path] = os.path.getsize(file_path)
+        os.remove(file_path)
+        dir_path, name = os.path.split(file_path)
+        dirs.add(dir_path)
+        if name.endswith(".py"):
+            cache_dir = os.path.join(dir_path, "__pycache__")
+            for cache_name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else list():
+                if cache_name.startswith(name[:-3] + ".") and cache_name.endswith(".pyc"):
+                    os.remove(os.path.join(cache_dir, cache_name))
+            dirs.add(cache_dir)
+    # 由深至浅清理空目录
+    root = os.path.abspath(root)
+    for dir_path in sorted(dirs, key=len, reverse=True):
+        dir_path = os.path.abspath(dir_path)
+        while dir_path != root and os.path.isdir(dir_path) and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+            dir_path = os.path.dirname(dir_path)
+    return removed
+
+
+def trim_site_packages(site_packages_path, rules: List[str], keep_importable=True) -> dict:
+    """
+    按照规则裁剪site-packages，仅删除各包RECORD中记录的文件
+    :param site_packages_path: site-packages目录
+    :param rules: 裁剪规则，见CONSERVATIVE_SITE_RULES
+    :param keep_importable: 是否保留可被导入的Python模块
+    :return: 各包减少的大小，格式{包名: 字节数}
+    """
+    report = dict()
+    if not os.path.exists(site_packages_path):
+        return report
+    dists = [Distribution(site_packages_path, name) for name in os.listdir(site_packages_path)
+             if name.endswith(PACKAGE_FLAG)]
+    for dist in dists:
+        patterns = TRIM_KEEP_RULES.get(dist.name)
+        if patterns is not None and not patterns:
+            continue
+        matcher = IgnoreMatcher(rules)
+        if patterns:
+            matcher.add_patterns(["!" + p for p in patterns])
+        removed = _remove_files(site_packages_path, get_trim_files(dist, matcher, keep_importable))
+        if removed:
+            report[dist.name] = sum(removed.values())
+    return report
+
+
+class TrimOpt(SubModuleOpt):
+    def __init__(self, profile=TRIM_CONSERVATIVE, keep_tkinter=False, keep_patterns: List[str] = None):
+        """
+        :param profile: 裁剪方案，TRIM_CONSERVATIVE或TRIM_AGGRESSIVE
+        :param keep_tkinter: 是否保留tkinter组件
+        :param keep_patterns: 额外需要保留的文件，gitignore风格的规则，路径相对于Python目录
+        """
+        super().__init__()
+        assert profile in TRIM_PROFILES, f"trim_profile需为TRIM_CONSERVATIVE或TRIM_AGGRESSIVE，当前为{profile}"
+        self.profile = profile
+        self.keep_tkinter = keep_tkinter
+        self.keep_patterns = keep_patterns if keep_patterns else list()
+
+    def _get_keep_tkinter(self):
+        if self.keep_tkinter or self.profile != TRIM_AGGRESSIVE:
+            return True
+        if os.path.exists(self.work_dir) and \
+                set(TKINTER_USERS) & PythonPackages.search_import_in_dir(self.work_dir):
+            return True
+        site_packages = [n.lower() for n in os.listdir(self.module_site_package_path)] \
+            if os.path.exists(self.module_site_package_path) else list()
+        return any(user in site_packages for user in TKINTER_USERS)
+
+    def act(self) -> None:
+        site_rules, python_rules = TRIM_PROFILES[self.profile]
+
+        # site-packages - conservative方案不删除可被导入的模块
+        report = trim_site_packages(self.module_site_package_path,
+                                    site_rules,
+                                    keep_importable=self.profile != TRIM_AGGRESSIVE)
+
+        # 解释器
+        python_rules = list(python_rules)
+        if not self._get_keep_tkinter():
+            python_rules += TKINTER_RULES
+        matcher = IgnoreMatcher(python_rules)
+        matcher.add_patterns(["!" + p for p in self.keep_patterns])
+        removed = trim_dir(self.interpreter_path, matcher, skip_dirs=["Lib/site-packages"])
+        if removed:
+            report["Python"] = sum(removed.values())
+
+        total = sum(report.values())
+        Logging.info(f"[{self.profile}]裁剪完毕，共减少{total / 1024 / 1024:.2f}MB，各包减少的大小如下：")
+        for name, size in sorted(report.items(), key=lambda x: x[1], reverse=True):
+            Logging.info(f"{name.ljust(30)}\t{size / 1024:.1f}KB")
+
+
+class TrimPackages(SubModule):
+    def __init__(self, profile=TRIM_CONSERVATIVE, keep_tkinter=False, keep_patterns: List[str] = None):
+        """
+        按照规则裁剪Python环境中运行时不会被使用的文件
+        可在requirements文件中使用#$QPT_FLAG$ trim_keep指令保留某个包，或使用trim_keep=规则1,规则2保留该包中的部分文件
+        :param profile: 裁剪方案，TRIM_CONSERVATIVE或TRIM_AGGRESSIVE
+        :param keep_tkinter: 是否保留tkinter组件，仅对TRIM_AGGRESSIVE生效
+        :param keep_patterns: 解释器中额外需要保留的文件，gitignore风格的规则，路径相对于Python目录
+        """
+        # 需在依赖安装完毕后、压缩与预编译之前执行
+        super().__init__(level=LOW_LEVEL_REDUCE - 0.1)
+        self.add_pack_opt(TrimOpt(profile=profile, keep_tkinter=keep_tkinter, keep_patterns=keep_patterns))
@@ -1,8 +1,11 @@
 import os
 import sys
 
+from qpt.kernel.qtrace import span
 
-from qpt.memory import QPT_MEMORY
+with span("import.memory"):
+    from qpt.memory import QPT_MEMORY
+    from qpt.kernel.qboot import load_boot, apply_boot_env
 
 IGNORE_ENV_FIELD = ["conda", "Conda", "Python", "python"]
 interpreter_dir = os.path.dirname(sys.executable)
@@ -18,8 +21,16 @@ for sp in sys_p:
 
 sys.path = new_sys_p
 ROOT_PATH = os.path.abspath("./")
-os.environ.update(QPT_MEMORY.get_env_vars(ROOT_PATH))
-from qpt.executor import RunExecutableModule
+# 优先使用打包时生成的启动配置，旧版本的程序仍在运行时计算环境变量
+with span("env.setup"):
+    boot = load_boot(ROOT_PATH)
+    if boot is not None:
+        apply_boot_env(boot)
+    else:
+        os.environ.update(QPT_MEMORY.get_env_vars(ROOT_PATH))
+with span("import.executor"):
+    from qpt.executor import RunExecutableModule
 
-module = RunExecutableModule("./")
+with span("runtime.init"):
+    module = RunExecutableModule("./")
 module.run()
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from qpt.kernel.qcache import ActionCache
+from qpt.kernel.qos import ArgManager
+from qpt.modules.base import SubModuleOpt
+from qpt.modules.package import _is_pinned
+
+SITE_PACKAGES = "Python/Lib/site-packages"
+# OP的执行次数，OP的成员变量会参与缓存键计算，故记录于此
+CALLS = list()
+
+
+class FakeInstallOpt(SubModuleOpt):
+    cacheable = True
+
+    def __init__(self, package, version):
+        super().__init__()
+        self.package = package
+        self.version = version
+
+    def install(self, module_path):
+        """
+        模拟pip --target，已存在的同名包会被替换
+        """
+        CALLS.append(self.name)
+        site_packages = os.path.join(module_path, SITE_PACKAGES)
+        for name in os.listdir(site_packages) if os.path.exists(site_packages) else list():
+            if name.startswith(self.package + "-") and name.endswith(".dist-info"):
+                shutil.rmtree(os.path.join(site_packages, name))
+        os.makedirs(os.path.join(site_packages, self.package), exist_ok=True)
+        os.makedirs(os.path.join(site_packages, f"{self.package}-{self.version}.dist-info"), exist_ok=True)
+        with open(os.path.join(site_packages, self.package, "__init__.py"), "w") as f:
+            f.write(f"version = '{self.version}'")
+        with open(os.path.join(site_packages, f"{self.package}-{self.version}.dist-info", "RECORD"), "w") as f:
+            f.write(f"{self.package}/__init__.py")
+
+
+class ActionCacheTest(unittest.TestCase):
+    def setUp(self):
+        CALLS.clear()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.release = os.path.join(self.tmp_dir, "Release")
+        self.cache = ActionCache(os.path.join(self.tmp_dir, "cache"))
+        self.input_path = os.path.join(self.tmp_dir, "requirements.txt")
+        with open(self.input_path, "w") as f:
+            f.write("a==1.0")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _run(self, opt, release=None):
+        return self.cache.run(opt, opt.install, release if release else self.release,
+                              output_dirs=[SITE_PACKAGES], inputs=[self.input_path])
+
+    def _read(self, rel_path, release=None):
+        with open(os.path.join(release if release else self.release, SITE_PACKAGES, rel_path)) as f:
+            return f.read()
+
+    def test_hit_and_invalidation(self):
+        opt = FakeInstallOpt("a", "1.0")
+        self.assertFalse(self._run(opt))
+        self.assertTrue(self._run(opt))
+        self.assertEqual(len(CALLS), 1)
+        # 参数变化
+        self.assertFalse(self._run(FakeInstallOpt("b", "1.0"), os.path.join(self.tmp_dir, "Other")))
+        # 输入文件变化
+        with open(self.input_path, "w") as f:
+            f.write("a==1.1")
+        self.assertFalse(self._run(opt))
+        self.assertEqual(len(CALLS), 3)
+
+    def test_release_edit(self):
+        opt = FakeInstallOpt("a", "1.0")
+        self._run(opt)
+        file_path = os.path.join(self.release, SITE_PACKAGES, "a", "__init__.py")
+        # 修改Release中的文件不应影响缓存
+        with open(file_path, "a") as f:
+            f.write("\nedited = True")
+        other = os.path.join(self.tmp_dir, "Other")
+        self.assertTrue(self._run(opt, other))
+        self.assertEqual(self._read("a/__init__.py", other), "version = '1.0'")
+
+    def test_corrupted_object(self):
+        opt = FakeInstallOpt("a", "1.0")
+        self._run(opt)
+        for root, _, names in os.walk(self.cache.objects_dir):
+            for name in names:
+                with open(os.path.join(root, name), "r+") as f:
+                    data = f.read()
+                    f.seek(0)
+                    f.write("x" * len(data))
+        other = os.path.join(self.tmp_dir, "Other")
+        self.assertFalse(self._run(opt, other))
+        self.assertEqual(len(CALLS), 2)
+        self.assertEqual(self._read("a/__init__.py", other), "version = '1.0'")
+        # 损坏的对象已被替换
+        self.assertTrue(self._run(opt, os.path.join(self.tmp_dir, "Third")))
+
+    def test_conflict(self):
+        self._run(FakeInstallOpt("a", "1.0"))
+        # 另一个OP安装了同一个包的其它版本，此时不可逐文件覆盖
+        opt = FakeInstallOpt("a", "2.0")
+        self.assertFalse(self._run(opt))
+        # 在临时目录中执行后发现冲突，再于目标目录中执行一次
+        self.assertEqual(len(CALLS), 3)
+        dist_infos = [n for n in os.listdir(os.path.join(self.release, SITE_PACKAGES)) if n.endswith(".dist-info")]
+        self.assertEqual(dist_infos, ["a-2.0.dist-info"])
+        self.assertEqual(self._read("a/__init__.py"), "version = '2.0'")
+
+    def test_pinned(self):
+        requirements = os.path.join(self.tmp_dir, "pinned.txt")
+        with open(requirements, "w") as f:
+            f.write("# comment\na==1.0\nb[extra]==2.0 ; python_version >= '3.6'\n")
+        hashed = os.path.join(self.tmp_dir, "hashed.txt")
+        with open(hashed, "w") as f:
+            f.write("a==1.0 \\\n    --hash=sha256:00\nb==2.0 --hash=sha256:01\n")
+        loose = os.path.join(self.tmp_dir, "loose.txt")
+        with open(loose, "w") as f:
+            f.write("a==1.0\nb>=2.0\n")
+        cases = [(("a", "1.0", True, ArgManager()), True),
+                 (("a", "==1.0", True, ArgManager()), True),
+                 (("a==1.0", None, True, ArgManager()), True),
+                 (("a", "1.0", False, ArgManager()), False),
+                 (("a", ">=1.0", True, ArgManager()), False),
+                 (("a", "1.*", True, ArgManager()), False),
+                 (("a", None, True, ArgManager()), False),
+                 (("", None, True, ArgManager() + ("-r " + requirements)), True),
+                 (("", None, False, ArgManager() + ("-r " + requirements)), False),
+                 (("", None, False, ArgManager() + ("-r " + requirements) + "--no-deps"), True),
+                 (("", None, False, ArgManager() + ("-r " + hashed)), True),
+                 (("", None, True, ArgManager() + ("-r " + loose)), False),
+                 (("", None, True, ArgManager()), False),
+                 (("[FLAG-FileSerialize]data", None, True, ArgManager()), False)]
+        for args, expected in cases:
+            self.assertEqual(_is_pinned(*args), expected, args)
+
+
+if __name__ == '__main__':
+    unittest.main()
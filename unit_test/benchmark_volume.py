@@ -0,0 +1,62 @@
+"""
+对比PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST模式下不同压缩等级的分卷体积与解压耗时
+用法：python benchmark_volume.py [待压缩目录，默认为当前解释器的site-packages]
+"""
+
+import os
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+
+from qpt.kernel.qzip import make_volumes, extract_volumes
+from qpt.memory import QPT_MEMORY
+
+# (名称, 压缩算法, 压缩等级)
+CASES = [("STORED", zipfile.ZIP_STORED, None),
+         ("DEFLATED-1", zipfile.ZIP_DEFLATED, 1),
+         ("DEFLATED-6", zipfile.ZIP_DEFLATED, 6),
+         ("DEFLATED-9", zipfile.ZIP_DEFLATED, 9),
+         ("LZMA", zipfile.ZIP_LZMA, None)]
+WORKERS = [1, os.cpu_count() or 1]
+
+
+def get_size(paths):
+    return sum([os.path.getsize(p) for p in paths])
+
+
+def main(src):
+    rel_paths = list()
+    for root, dirs, files in os.walk(src):
+        for file in files:
+            rel_paths.append(os.path.relpath(os.path.join(root, file), src))
+    raw_size = get_size([os.path.join(src, p) for p in rel_paths])
+    print(f"待压缩目录：{src}，文件数：{len(rel_paths)}，原始大小：{raw_size / 1024 / 1024:.2f}MB")
+    print("压缩方式\t\t体积(MB)\t压缩率\t压缩耗时(s)\t" + "\t".join([f"解压耗时-{w}线程(s)" for w in WORKERS]))
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for name, compression, level in CASES:
+            volume_dir = os.path.join(tmp_dir, name)
+            start = time.time()
+            volume_paths = make_volumes(src, rel_paths, volume_dir, compress_level=level, compression=compression)
+            pack_time = time.time() - start
+            size = get_size(volume_paths)
+
+            unpack_times = list()
+            for workers in WORKERS:
+                dst = os.path.join(tmp_dir, name + "-out")
+                start = time.time()
+                extract_volumes(volume_paths, dst, workers=workers)
+                unpack_times.append(time.time() - start)
+                shutil.rmtree(dst)
+            shutil.rmtree(volume_dir)
+            print(f"{name}\t\t{size / 1024 / 1024:.2f}\t\t{size / raw_size:.2%}\t{pack_time:.2f}\t\t" +
+                  "\t\t".join([f"{t:.2f}" for t in unpack_times]))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else QPT_MEMORY.site_packages_path)
@@ -0,0 +1,103 @@
+"""
+对比ZipCrypto加密镜像在zipfile、查表解密+多进程以及转换为未加密镜像后的解压耗时
+用法：python benchmark_zipcrypto.py [Python.zip 密码]，未指定镜像时使用当前解释器的标准库生成加密镜像
+"""
+
+import os
+import sys
+import time
+import zlib
+import struct
+import shutil
+import zipfile
+import tempfile
+
+from qpt.kernel import qzip
+from qpt.kernel.qzip import extract_members, convert_image, ZipCryptoDecrypter
+
+
+def encrypt(data: bytes, pwd: bytes) -> bytes:
+    # 复用解密器的密钥，加密时使用明文更新密钥
+    decrypter = ZipCryptoDecrypter(pwd)
+    key0, key1, key2 = decrypter.key0, decrypter.key1, decrypter.key2
+    crc_table = qzip._CRC_TABLE
+    keystream = qzip._KEYSTREAM_TABLE
+    result = bytearray(data)
+    for i in range(len(result)):
+        c = result[i]
+        result[i] = c ^ keystream[key2 & 0xFFFF]
+        key0 = (key0 >> 8) ^ crc_table[(key0 ^ c) & 0xFF]
+        key1 = ((key1 + (key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        key2 = (key2 >> 8) ^ crc_table[(key2 ^ (key1 >> 24)) & 0xFF]
+    return bytes(result)
+
+
+def make_encrypted_zip(src, zip_path, pwd: bytes):
+    """
+    生成与QPT解释器镜像相同格式的ZipCrypto加密zip
+    """
+    central = list()
+    with open(zip_path, "wb") as f:
+        for root, dirs, files in os.walk(src):
+            dirs[:] = [d for d in dirs if d not in ["__pycache__", "site-packages"]]
+            for file in files:
+                file_path = os.path.join(root, file)
+                name = os.path.relpath(file_path, src).replace("\\", "/").encode("utf-8")
+                with open(file_path, "rb") as src_file:
+                    data = src_file.read()
+                crc = zlib.crc32(data)
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                comp = compressor.compress(data) + compressor.flush()
+                comp = encrypt(os.urandom(11) + bytes([crc >> 24]) + comp, pwd)
+                offset = f.tell()
+                head = (20, 0x801, 8, 0, 0x21, crc, len(comp), len(data), len(name), 0)
+                f.write(struct.pack("<4s5H3L2H", b"PK\x03\x04", *head) + name + comp)
+                central.append(struct.pack("<4s6H3L5H2L", b"PK\x01\x02", 20, *head, 0, 0, 0, 0, offset) + name)
+        start = f.tell()
+        for item in central:
+            f.write(item)
+        f.write(struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, len(central), len(central),
+                            f.tell() - start, start, 0))
+
+
+def run_case(name, func, raw_size):
+    start = time.time()
+    func()
+    cost = time.time() - start
+    print(f"{name}\t\t{cost:.2f}\t\t{raw_size / 1024 / 1024 / cost:.2f}")
+
+
+def main(zip_path=None, pwd=b"gt_qpt"):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if zip_path is None:
+            zip_path = os.path.join(tmp_dir, "Python.zip")
+            print("正在生成加密镜像...")
+            make_encrypted_zip(os.path.dirname(os.__file__), zip_path, pwd)
+        with zipfile.ZipFile(zip_path) as zip_obj:
+            raw_size = sum(info.file_size for info in zip_obj.infolist())
+        print(f"镜像：{zip_path}，大小：{os.path.getsize(zip_path) / 1024 / 1024:.2f}MB，"
+              f"解压后：{raw_size / 1024 / 1024:.2f}MB")
+        print("解压方式\t\t\t耗时(s)\t\t速度(MB/s)")
+
+        def baseline():
+            with zipfile.ZipFile(zip_path) as zip_obj:
+                zip_obj.extractall(os.path.join(tmp_dir, "baseline"), pwd=pwd)
+
+        plain_zip = os.path.join(tmp_dir, "Python-plain.zip")
+        run_case("zipfile.extractall", baseline, raw_size)
+        run_case("查表解密-1进程", lambda: extract_members(zip_path, os.path.join(tmp_dir, "fast-1"),
+                                                      pwd=pwd, workers=1), raw_size)
+        run_case(f"查表解密-{os.cpu_count()}进程", lambda: extract_members(zip_path, os.path.join(tmp_dir, "fast-n"),
+                                                                   pwd=pwd), raw_size)
+        run_case("转换为未加密镜像", lambda: convert_image(zip_path, plain_zip, pwd=pwd), raw_size)
+        run_case("未加密镜像-多线程", lambda: extract_members(plain_zip, os.path.join(tmp_dir, "plain")), raw_size)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        main(sys.argv[1], sys.argv[2].encode("utf-8"))
+    else:
+        main()
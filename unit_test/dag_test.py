@@ -0,0 +1,120 @@
+import time
+import threading
+import unittest
+
+from qpt.kernel.qdag import DAGNode, run_dag
+from qpt.executor import CreateExecutableModule, _PackStep
+from qpt.modules.base import SubModule, ARTIFACT_PYTHON, ARTIFACT_SITE_PACKAGES, ARTIFACT_PACKAGES, \
+    ARTIFACT_RESOURCES
+
+
+class Recorder:
+    """
+    记录各节点的起止顺序与各资源的最大并发数
+    """
+
+    def __init__(self, resources=None):
+        self.resources = resources if resources else dict()
+        self.events = list()
+        self.running = dict()
+        self.max_running = dict()
+        self._lock = threading.Lock()
+
+    def node(self, name, depends=None, resources=None, cost=0.05):
+        def _func():
+            with self._lock:
+                self.events.append(("start", name))
+                for r in (resources or list()) + ["*"]:
+                    self.running[r] = self.running.get(r, 0) + 1
+                    self.max_running[r] = max(self.max_running.get(r, 0), self.running[r])
+            time.sleep(cost)
+            with self._lock:
+                for r in (resources or list()) + ["*"]:
+                    self.running[r] -= 1
+                self.events.append(("end", name))
+
+        return DAGNode(name, _func, depends=depends, resources=resources)
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+
+class RunDAGTest(unittest.TestCase):
+    def test_depends(self):
+        rec = Recorder()
+        nodes = [rec.node("a"), rec.node("b", depends=["a"]), rec.node("c", depends=["a"]),
+                 rec.node("d", depends=["b", "c"])]
+        run_dag(nodes, workers=4)
+        self.assertLess(rec.index("end", "a"), rec.index("start", "b"))
+        self.assertLess(rec.index("end", "a"), rec.index("start", "c"))
+        self.assertLess(rec.index("end", "b"), rec.index("start", "d"))
+        self.assertLess(rec.index("end", "c"), rec.index("start", "d"))
+        # 无依赖关系的b与c并行执行
+        self.assertEqual(rec.max_running["*"], 2)
+
+    def test_resource_limits(self):
+        rec = Recorder()
+        nodes = [rec.node(f"pip{i}", resources=["pip"]) for i in range(3)] + \
+                [rec.node(f"net{i}", resources=["net"]) for i in range(4)]
+        run_dag(nodes, workers=8, limits={"net": 2})
+        self.assertEqual(rec.max_running["pip"], 1)
+        self.assertEqual(rec.max_running["net"], 2)
+
+    def test_workers(self):
+        rec = Recorder()
+        run_dag([rec.node(str(i)) for i in range(6)], workers=2)
+        self.assertEqual(rec.max_running["*"], 2)
+        self.assertEqual(len(rec.events), 12)
+
+    def test_error(self):
+        rec = Recorder()
+
+        def _fail():
+            raise RuntimeError("fail")
+
+        nodes = [DAGNode("fail", _fail), rec.node("next", depends=["fail"])]
+        with self.assertRaises(RuntimeError):
+            run_dag(nodes)
+        self.assertEqual(rec.events, list())
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            run_dag([DAGNode("a", print, depends=["b"]), DAGNode("b", print, depends=["a"])])
+
+
+class CustomPackModule(SubModule):
+    def pack(self):
+        pass
+
+
+class PackNodesTest(unittest.TestCase):
+    def _get_depends(self, steps):
+        return {node.name: set(node.depends) for node in CreateExecutableModule._get_pack_nodes(steps)}
+
+    def test_hazards(self):
+        steps = [_PackStep("copy_resources", None, inputs=list(), outputs=[ARTIFACT_RESOURCES]),
+                 _PackStep("python", None, module="env", inputs=list(), outputs=[ARTIFACT_PYTHON]),
+                 _PackStep("download", None, module="a", inputs=list(), outputs=[ARTIFACT_PACKAGES]),
+                 _PackStep("install", None, module="b", inputs=[ARTIFACT_PACKAGES],
+                           outputs=[ARTIFACT_SITE_PACKAGES]),
+                 _PackStep("a-second", None, module="a", inputs=list(), outputs=list()),
+                 _PackStep("after-b", None, module="c", inputs=list(), outputs=list(), depends=["b"]),
+                 _PackStep("barrier", None, module="d")]
+        depends = self._get_depends(steps)
+        self.assertEqual(depends["python"], set())
+        self.assertEqual(depends["download"], set())
+        # 读取packages（RAW），写入site-packages即写入Python（WAW）
+        self.assertEqual(depends["install"], {"python", "download"})
+        # 同一Module内按顺序执行
+        self.assertEqual(depends["a-second"], {"download"})
+        self.assertEqual(depends["after-b"], {"install"})
+        # 未声明读写产物的步骤需等待之前的全部步骤
+        self.assertEqual(depends["barrier"], {s.name for s in steps[:-1]})
+
+    def test_custom_pack(self):
+        self.assertFalse(CreateExecutableModule._is_custom_pack(SubModule(name="base")))
+        self.assertTrue(CreateExecutableModule._is_custom_pack(CustomPackModule(name="custom")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+from qpt.kernel.qignore import IgnoreMatcher
+
+# (规则, 路径, 是否为文件夹, 是否忽略)
+MATCH_CASES = [
+    # 不含/的规则可匹配任意层级
+    (["*.log"], "a.log", False, True),
+    (["*.log"], "a/b/c.log", False, True),
+    (["*.log"], "a.log.txt", False, False),
+    (["build"], "build", True, True),
+    (["build"], "a/build", False, True),
+    (["build"], "a/build/b.txt", False, True),
+    (["?.txt"], "a.txt", False, True),
+    (["?.txt"], "ab.txt", False, False),
+    (["[ab].txt"], "b.txt", False, True),
+    (["[!ab].txt"], "b.txt", False, False),
+    (["[!ab].txt"], "c.txt", False, True),
+    # 含有/的规则相对于根目录
+    (["/build"], "build", True, True),
+    (["/build"], "a/build", True, False),
+    (["doc/*.md"], "doc/a.md", False, True),
+    (["doc/*.md"], "doc/sub/a.md", False, False),
+    (["doc/*.md"], "a/doc/a.md", False, False),
+    # **
+    (["**/cache"], "cache", True, True),
+    (["**/cache"], "a/b/cache", True, True),
+    (["a/**/b"], "a/b", True, True),
+    (["a/**/b"], "a/x/y/b", True, True),
+    (["a/**/b"], "x/a/b", True, False),
+    (["logs/**"], "logs/a/b.log", False, True),
+    # 以/结尾的规则只匹配文件夹，以及文件夹中的全部文件
+    (["tmp/"], "tmp", True, True),
+    (["tmp/"], "tmp", False, False),
+    (["tmp/"], "a/tmp", True, True),
+    (["tmp/"], "a/tmp/b.txt", False, True),
+    (["tmp/"], "a/tmp/c/d", True, True),
+    # 取反，以最后一条匹配的规则为准
+    (["*.log", "!keep.log"], "keep.log", False, False),
+    (["*.log", "!keep.log"], "a/drop.log", False, True),
+    (["!keep.log", "*.log"], "keep.log", False, True),
+    (["tmp/", "!tmp/keep.txt"], "tmp/keep.txt", False, False),
+    (["tmp/", "!tmp/keep.txt"], "tmp/drop.txt", False, True),
+    (["out/", "!out/"], "out", True, False),
+    # 注释、空行、转义与结尾空格
+    (["# comment"], "# comment", False, False),
+    (["\\#a"], "#a", False, True),
+    (["\\!a"], "!a", False, True),
+    (["a.txt  "], "a.txt", False, True),
+    ([""], "a", False, False),
+]
+
+
+class IgnoreMatcherTest(unittest.TestCase):
+    def test_match(self):
+        for patterns, rel_path, is_dir, expected in MATCH_CASES:
+            matcher = IgnoreMatcher(patterns)
+            self.assertEqual(matcher.match(rel_path, is_dir=is_dir), expected, (patterns, rel_path, is_dir))
+
+    def test_base(self):
+        # 子目录中的规则文件仅作用于该目录
+        cases = [("sub/a.log", False, True),
+                 ("a.log", False, False),
+                 ("sub/build", True, True),
+                 ("sub/x/build", True, False),
+                 ("build", True, False)]
+        matcher = IgnoreMatcher()
+        matcher.add_patterns(["*.log", "/build/"], base="sub")
+        for rel_path, is_dir, expected in cases:
+            self.assertEqual(matcher.match(rel_path, is_dir=is_dir), expected, rel_path)
+
+    def test_paths(self):
+        cases = [("a/b", True, True),
+                 ("a/b/c.txt", False, True),
+                 ("x/a/b", True, False),
+                 ("a/b.txt", False, True),
+                 ("a/b.txt.bak", False, False)]
+        matcher = IgnoreMatcher()
+        matcher.add_paths(["a\\b"], dir_only=True)
+        matcher.add_paths(["a/b.txt"])
+        for rel_path, is_dir, expected in cases:
+            self.assertEqual(matcher.match(rel_path, is_dir=is_dir), expected, rel_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from qpt.kernel.qfetch import fetch_online_release, STORE_ENV, ONLINE_MANIFEST_NAME
+from qpt.modules.python_env import make_online_release
+from qpt.memory import QPT_MEMORY
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    支持单段Range请求的静态文件服务，用于模拟对象存储
+    """
+    range_count = 0
+
+    def send_head(self):
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+        RangeRequestHandler.range_count += 1
+        size = os.path.getsize(path)
+        start, end = int(match.group(1)), min(int(match.group(2)), size - 1)
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.range_end = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        length = getattr(self, "range_end", None)
+        if length is None:
+            return super().copyfile(source, outputfile)
+        outputfile.write(source.read(length))
+
+    def log_message(self, *args):
+        pass
+
+
+class OnlineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.release = os.path.join(self.tmp_dir, "Release")
+        self.online = os.path.join(self.tmp_dir, "Online")
+        os.environ[STORE_ENV] = os.path.join(self.tmp_dir, "store")
+        # 模拟打包后的Release目录
+        os.makedirs(os.path.join(self.release, "Python", "Lib"))
+        os.makedirs(os.path.join(self.release, "configs"))
+        with open(os.path.join(self.release, "Python", "python.exe"), "wb") as f:
+            f.write(os.urandom(9 * 1024 * 1024))
+        packages_path = os.path.join(self.release, QPT_MEMORY.get_down_packages_relative_path)
+        os.makedirs(packages_path)
+        for name in ["a-1.0-py3-none-any.whl", "b-2.0-py3-none-any.whl"]:
+            with open(os.path.join(packages_path, name), "wb") as f:
+                f.write(os.urandom(1024))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RangeRequestHandler, directory=self.online))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.environ.pop(STORE_ENV, None)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_online_release(self):
+        with open(os.path.join(self.release, "Python", "python.exe"), "rb") as f:
+            python_data = f.read()
+        make_online_release(self.release, self.online, self.base_url, compress_level=0)
+        self.assertFalse(os.path.exists(os.path.join(self.release, "Python")))
+        with open(os.path.join(self.release, "configs", ONLINE_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["files"]), 3)
+
+        # 首次运行 - 分段下载并校验
+        self.assertEqual(fetch_online_release(self.release, workers=4), 3)
+        with open(os.path.join(self.release, "Python", "python.exe"), "rb") as f:
+            self.assertEqual(f.read(), python_data)
+        self.assertGreater(RangeRequestHandler.range_count, 3)
+
+        # 再次运行 - 文件已存在，无需下载
+        self.assertEqual(fetch_online_release(self.release), 0)
+
+        # 其它程序使用相同的文件时直接从共享缓存中获取
+        shutil.rmtree(os.path.join(self.release, "Python"))
+        self.server.shutdown()
+        self.assertEqual(fetch_online_release(self.release), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.release, "Python", "python.exe")))
+
+    def test_hash_mismatch(self):
+        make_online_release(self.release, self.online, self.base_url, compress_level=0)
+        with open(os.path.join(self.online, "a-1.0-py3-none-any.whl"), "wb") as f:
+            f.write(os.urandom(1024))
+        with self.assertRaises(IOError):
+            fetch_online_release(self.release)
+
+
+if __name__ == '__main__':
+    unittest.main()
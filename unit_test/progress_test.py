@@ -0,0 +1,44 @@
+import unittest
+
+from qpt.kernel.qprogress import ProgressBus, ProgressRenderer
+
+
+class RecordRenderer(ProgressRenderer):
+    def __init__(self):
+        self.finished = list()
+
+    def render(self, snapshot: dict):
+        pass
+
+    def finish(self, snapshot: dict):
+        self.finished.append(snapshot["task"])
+
+
+class ProgressBusTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = ProgressBus(interval=0.01)
+        self.renderer = RecordRenderer()
+        self.bus.add_renderer(self.renderer)
+
+    def test_finish(self):
+        task = self.bus.open_task("copy", 2)
+        task.update()
+        self.assertEqual(len(self.bus.tasks), 1)
+        task.update()
+        self.assertEqual(self.bus.tasks, list())
+        self.assertEqual(self.renderer.finished, ["copy"])
+
+    def test_empty(self):
+        # 没有任何步骤的任务不会被注册，也不会启动渲染线程
+        for _ in range(3):
+            task = self.bus.open_task("empty", 0)
+            self.assertTrue(task.finished)
+            task.update()
+            task.close()
+        self.assertEqual(self.bus.tasks, list())
+        self.assertIsNone(self.bus._thread)
+        self.assertEqual(self.renderer.finished, list())
+
+
+if __name__ == '__main__':
+    unittest.main()
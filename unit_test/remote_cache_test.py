@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from qpt.kernel.qcache import ActionCache, RemoteCache
+from qpt.kernel.qcache_server import make_cache_server
+from qpt.modules.base import SubModuleOpt
+
+
+class WriteFileOpt(SubModuleOpt):
+    cacheable = True
+
+    def __init__(self, content):
+        super().__init__()
+        self.content = content
+        self.count = 0
+
+    def write(self, module_path):
+        self.count += 1
+        os.makedirs(os.path.join(module_path, "Python", "Lib"), exist_ok=True)
+        with open(os.path.join(module_path, "Python", "python.exe"), "wb") as f:
+            f.write(self.content)
+        with open(os.path.join(module_path, "Python", "Lib", "os.py"), "wb") as f:
+            f.write(self.content[:1024])
+
+
+class RemoteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server_dir = os.path.join(self.tmp_dir, "server")
+        self.server = make_cache_server(self.server_dir, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.content = os.urandom(3 * 1024 * 1024)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _run(self, name, token=None):
+        """
+        模拟另一台机器 - 使用独立的本地缓存与Release目录执行OP
+        """
+        cache = ActionCache(os.path.join(self.tmp_dir, name, "cache"), remote=RemoteCache(self.base_url, token=token))
+        opt = WriteFileOpt(self.content)
+        release = os.path.join(self.tmp_dir, name, "Release")
+        hit = cache.run(opt, opt.write, release, output_dirs=["Python"])
+        with open(os.path.join(release, "Python", "python.exe"), "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        return hit, opt.count
+
+    def test_remote_hit(self):
+        # 首次执行 - 未命中，输出上传至远程
+        self.assertEqual(self._run("a"), (False, 1))
+        self.assertTrue(os.listdir(os.path.join(self.server_dir, "ac")))
+        # 新的本地缓存 - 从远程下载后直接复用，无需执行OP
+        self.assertEqual(self._run("b"), (True, 0))
+        # 本地已有缓存时不再访问远程
+        self.server.shutdown()
+        self.assertEqual(self._run("b"), (True, 0))
+
+    def test_tampered_object(self):
+        self._run("a")
+        for root, _, names in os.walk(os.path.join(self.server_dir, "cas")):
+            for name in names:
+                with open(os.path.join(root, name), "wb") as f:
+                    f.write(b"tampered")
+        # 校验失败时视为未命中，重新执行OP
+        self.assertEqual(self._run("b"), (False, 1))
+
+    def test_token(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = make_cache_server(self.server_dir, port=0, token="secret")
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        # 未携带口令时无法写入动作记录
+        self.assertEqual(self._run("a"), (False, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.server_dir, "ac")))
+        self.assertEqual(self._run("b", token="secret"), (False, 1))
+        self.assertEqual(self._run("c", token="secret"), (True, 0))
+
+    def test_read_only(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = make_cache_server(self.server_dir, port=0, read_only=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.assertEqual(self._run("a"), (False, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.server_dir, "ac")))
+
+    def test_server_unavailable(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.base_url = "http://127.0.0.1:1"
+        self.assertEqual(self._run("a"), (False, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,7 @@ import os
 os.environ["QPT_Action"] = "True"
 
 from qpt.executor import CreateExecutableModule
-from qpt.modules.package import DISPLAY_ONLINE_INSTALL
+from qpt.modules.package import DISPLAY_ONLINE_INSTALL, DISPLAY_SETUP_INSTALL
 from qpt.modules.python_env import *
 
 # from qpt.kernel.tools.interpreter import set_default_pip_source
@@ -108,3 +108,15 @@ class LogTest(unittest.TestCase):
                                         hidden_terminal=False,
                                         deploy_mode=DISPLAY_ONLINE_INSTALL)
         module.make()
+
+    def test_module_volume_first(self):
+        # 验证压缩Python环境
+        module = CreateExecutableModule(work_dir="./sandbox_m",
+                                        launcher_py_path="./sandbox_m/run.py",
+                                        save_path=os.path.join(OUT_DIR_ROOT, sys._getframe().f_code.co_name),
+                                        requirements_file="sandbox_m/requirements_with_opt.txt",
+                                        interpreter_module=AutoPythonEnv(mode=PYTHON_ENV_MODE_PACKAGE_VOLUME_FIRST),
+                                        with_debug=True,
+                                        hidden_terminal=False,
+                                        deploy_mode=DISPLAY_SETUP_INSTALL)
+        module.make()
@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from qpt.kernel.qimport import shake_site_packages
+
+FIXTURE_FILES = ["pkg_a/__init__.py",
+                 "pkg_a/core.py",
+                 "pkg_a/__pycache__/core.cpython-38.pyc",
+                 "pkg_a/unused.py",
+                 "pkg_a/data.json",
+                 "pkg_a/lib.dll",
+                 "pkg_b/__init__.py",
+                 "pkg_b/sub/mod.py",
+                 "pkg_c/__init__.py",
+                 "pkg_c/other.py",
+                 "pkg_c/data/a.txt",
+                 "runtime/__init__.py",
+                 "runtime/unused.py",
+                 "single.py",
+                 "extra.pth",
+                 "pkg_a-1.0.dist-info/RECORD"]
+
+
+class TreeShakingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.release = os.path.join(self.tmp_dir, "Release", "Python", "Lib", "site-packages")
+        self.debug = os.path.join(self.tmp_dir, "Debug", "Python", "Lib", "site-packages")
+        for root in [self.release, self.debug]:
+            for rel_path in FIXTURE_FILES:
+                file_path = os.path.join(root, rel_path)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, "w") as f:
+                    f.write(rel_path)
+        # 冒烟测试在Debug目录中运行，记录中的路径均位于Debug目录
+        self.trace_path = os.path.join(self.tmp_dir, "trace.json")
+        used = ["pkg_a/__init__.py", "pkg_a/__pycache__/core.cpython-38.pyc", "pkg_c/__init__.py"]
+        with open(self.trace_path, "w", encoding="utf-8") as f:
+            json.dump({"modules": ["pkg_a", "pkg_a.core", "pkg_c"],
+                       "files": [os.path.join(self.debug, p) for p in used]}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _get_files(self, root):
+        files = set()
+        for dir_path, _, names in os.walk(root):
+            files |= {os.path.relpath(os.path.join(dir_path, n), root).replace("\\", "/") for n in names}
+        return files
+
+    def test_shake(self):
+        removed = shake_site_packages(self.release,
+                                      self.debug,
+                                      self.trace_path,
+                                      keep_entries=["runtime"],
+                                      keep_patterns=["pkg_c/data/*.txt"],
+                                      report_path=os.path.join(self.tmp_dir, "report.txt"))
+        self.assertEqual(self._get_files(self.release),
+                         {"pkg_a/__init__.py",
+                          "pkg_a/core.py",
+                          "pkg_a/__pycache__/core.cpython-38.pyc",
+                          "pkg_a/lib.dll",
+                          "pkg_c/__init__.py",
+                          "pkg_c/data/a.txt",
+                          "runtime/__init__.py",
+                          "runtime/unused.py",
+                          "extra.pth",
+                          "pkg_a-1.0.dist-info/RECORD"})
+        self.assertFalse(os.path.exists(os.path.join(self.release, "pkg_b")))
+        self.assertEqual(set(removed), {"pkg_a", "pkg_b", "pkg_c", "single"})
+        # 仅裁剪Release目录，冒烟测试所使用的Debug目录保持不变
+        self.assertEqual(self._get_files(self.debug), set(FIXTURE_FILES))
+
+
+if __name__ == '__main__':
+    unittest.main()
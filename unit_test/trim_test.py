@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from qpt.kernel.qinterpreter import analysis_trim_keep
+from qpt.modules.trim import trim_site_packages, add_trim_keep, TRIM_KEEP_RULES, CONSERVATIVE_SITE_RULES, \
+    AGGRESSIVE_SITE_RULES
+
+# 各包RECORD中记录的文件
+FIXTURE_DISTS = {"tests-1.0.dist-info": ["tests/__init__.py",
+                                         "tests/data.txt",
+                                         "tests/docs/index.html"],
+                 "foo-1.0.dist-info": ["foo/__init__.py",
+                                       "foo/core.pyi",
+                                       "foo/py.typed",
+                                       "foo/tests/__init__.py",
+                                       "foo/tests/test_a.py",
+                                       "foo/tests/__pycache__/test_a.cpython-38.pyc",
+                                       "foo/tests/data/big.bin",
+                                       "foo/docs/index.html",
+                                       "foo/doc/__init__.py",
+                                       "foo-1.0.dist-info/REQUESTED",
+                                       "foo-1.0.dist-info/LICENSE"],
+                 "bar-1.0.dist-info": ["bar/__init__.py",
+                                       "bar/tests/keep.txt",
+                                       "bar/tests/drop.txt"],
+                 "baz-1.0.dist-info": ["baz/__init__.py",
+                                       "baz/tests/data.txt"]}
+# 未记录于RECORD中的文件，例如运行时生成的文件
+UNRECORDED_FILES = ["foo/tests/generated.txt"]
+
+
+class TrimSitePackagesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        for dist_info, files in FIXTURE_DISTS.items():
+            os.makedirs(os.path.join(self.tmp_dir, dist_info), exist_ok=True)
+            with open(os.path.join(self.tmp_dir, dist_info, "RECORD"), "w") as f:
+                f.write("\n".join(f"{p},," for p in files))
+            for rel_path in files + UNRECORDED_FILES:
+                file_path = os.path.join(self.tmp_dir, rel_path)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, "w") as f:
+                    f.write(rel_path)
+        add_trim_keep("bar", ["tests/keep.txt"])
+        add_trim_keep("baz")
+
+    def tearDown(self):
+        TRIM_KEEP_RULES.clear()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _get_files(self):
+        files = set()
+        for dir_path, _, names in os.walk(self.tmp_dir):
+            files |= {os.path.relpath(os.path.join(dir_path, n), self.tmp_dir).replace("\\", "/") for n in names}
+        return files
+
+    def _get_all_files(self):
+        files = {f"{dist_info}/RECORD" for dist_info in FIXTURE_DISTS} | set(UNRECORDED_FILES)
+        for dist_files in FIXTURE_DISTS.values():
+            files |= set(dist_files)
+        return files
+
+    def test_conservative(self):
+        report = trim_site_packages(self.tmp_dir, CONSERVATIVE_SITE_RULES, keep_importable=True)
+        removed = {"tests/docs/index.html",
+                   "foo/core.pyi",
+                   "foo/py.typed",
+                   "foo/tests/data/big.bin",
+                   "foo/docs/index.html",
+                   "foo-1.0.dist-info/REQUESTED",
+                   "bar/tests/drop.txt"}
+        self.assertEqual(self._get_files(), self._get_all_files() - removed)
+        self.assertEqual(set(report), {"tests", "foo", "bar"})
+        # 清理空目录
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "foo", "docs")))
+
+    def test_aggressive(self):
+        trim_site_packages(self.tmp_dir, AGGRESSIVE_SITE_RULES, keep_importable=False)
+        files = self._get_files()
+        # 名为tests的顶层包不受规则影响
+        self.assertIn("tests/__init__.py", files)
+        self.assertIn("tests/data.txt", files)
+        for rel_path in ["foo/tests/__init__.py",
+                         "foo/tests/test_a.py",
+                         "foo/tests/__pycache__/test_a.cpython-38.pyc",
+                         "foo/doc/__init__.py"]:
+            self.assertNotIn(rel_path, files)
+        self.assertIn("foo/__init__.py", files)
+        self.assertIn("foo/tests/generated.txt", files)
+        self.assertIn("foo-1.0.dist-info/LICENSE", files)
+        self.assertIn("bar/tests/keep.txt", files)
+        self.assertIn("baz/tests/data.txt", files)
+
+
+class AnalysisTrimKeepTest(unittest.TestCase):
+    def test_analysis(self):
+        cases = [("copy trim_keep=tests/,*.pyi", ("copy", ["tests/", "*.pyi"])),
+                 ("trim_keep", (None, list())),
+                 ("trim_keep=", (None, list())),
+                 ("copy", ("copy", None)),
+                 ("trim_keeper", ("trim_keeper", None)),
+                 ("trim_keep_all=tests/", ("trim_keep_all=tests/", None))]
+        for display, expected in cases:
+            self.assertEqual(analysis_trim_keep(display), expected, display)
+
+
+if __name__ == '__main__':
+    unittest.main()